@@ -6,31 +6,83 @@ This module handles CSV uploads and creates sessions in the database
 import os
 import csv
 import io
-from datetime import datetime, timezone
-from fastapi import FastAPI, UploadFile, File, HTTPException, Header, Depends, Cookie
+import codecs
+import base64
+import gzip
+import hashlib
+import json
+import pickle
+import tempfile
+import time
+import random
+import asyncio
+import functools
+import contextlib
+import threading
+import re
+import sqlite3
+import uuid
+import difflib
+import zipfile
+import multiprocessing
+import httpx
+import jwt
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime, date, timedelta, timezone
+from fastapi import FastAPI, UploadFile, File, HTTPException, Header, Depends, Cookie, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from postgrest.exceptions import APIError
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable, Iterator, AsyncIterator
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# orjson encodes large responses several times faster; fall back to json without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    logger.warning("orjson not installed, encoding responses with json")
+
+# Data access settings - the pool bounds both HTTP connections and DB worker threads
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_TIMEOUT_SECONDS = float(os.environ.get("DB_TIMEOUT_SECONDS", "30"))
+DB_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("DB_CONNECT_TIMEOUT_SECONDS", "5"))
+DB_MAX_RETRIES = int(os.environ.get("DB_MAX_RETRIES", "3"))
+DB_RETRY_BACKOFF_SECONDS = float(os.environ.get("DB_RETRY_BACKOFF_SECONDS", "0.2"))
+
 # Import the Supabase client from main.py if available
 try:
     from main import SB, require_user
 except ImportError:
     logger.warning("Could not import from main.py, using standalone configuration")
     from dotenv import load_dotenv
-    from supabase import create_client, Client
+    from supabase import create_client, Client, ClientOptions
 
     load_dotenv()
     SUPABASE_URL = os.environ.get("SUPABASE_URL", "")
     SUPABASE_SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY", "")
 
     if SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY:
-        SB: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+        # One keep-alive connection pool shared by every Supabase API call
+        HTTP_CLIENT = httpx.Client(
+            limits=httpx.Limits(max_connections=DB_POOL_SIZE, max_keepalive_connections=DB_POOL_SIZE),
+            timeout=httpx.Timeout(DB_TIMEOUT_SECONDS, connect=DB_CONNECT_TIMEOUT_SECONDS),
+            follow_redirects=True,
+            http2=True,
+        )
+        SB: Client = create_client(
+            SUPABASE_URL,
+            SUPABASE_SERVICE_ROLE_KEY,
+            options=ClientOptions(httpx_client=HTTP_CLIENT),
+        )
     else:
         logger.error("Supabase credentials not found in environment variables")
         SB = None
@@ -44,8 +96,450 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Change-Cursor", "ETag"],
 )
 
+# --- Metrics ----------------------------------------------------------------
+
+# Prometheus text-format metrics served at /metrics. Set METRICS_TOKEN to
+# require "Authorization: Bearer <token>" from the scraper.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+IMPORT_STAGE_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class CounterMetric:
+    """Monotonic counter per label set"""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name, self.help_text, self.labels = name, help_text, labels
+        self.values: Dict[tuple, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value:g}")
+        return lines
+
+class HistogramMetric:
+    """Cumulative-bucket histogram per label set"""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help_text, self.labels, self.buckets = name, help_text, labels, buckets
+        self.values: Dict[tuple, List[float]] = {}  # label values -> bucket counts + [count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, *label_values, value: float):
+        with self.lock:
+            counts = self.values.get(label_values)
+            if counts is None:
+                counts = self.values[label_values] = [0] * len(self.buckets) + [0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label_values, counts in sorted(self.values.items()):
+                bucket_labels = self.labels + ("le",)
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(bucket_labels, label_values + (f'{bound:g}',))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels, label_values + ('+Inf',))} {counts[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {counts[-2]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {counts[-1]:.6f}")
+        return lines
+
+HTTP_REQUEST_SECONDS = HistogramMetric(
+    "http_request_duration_seconds", "API request latency by route", ("method", "route", "status"))
+SUPABASE_REQUEST_SECONDS = HistogramMetric(
+    "supabase_request_duration_seconds", "Supabase call latency by table and operation", ("table", "op"))
+SUPABASE_ERRORS = CounterMetric(
+    "supabase_request_errors_total", "Failed Supabase calls (including retried attempts)", ("table", "op"))
+IMPORT_STAGE_SECONDS = HistogramMetric(
+    "import_stage_seconds", "Time per import run spent in each stage", ("stage",), IMPORT_STAGE_BUCKETS)
+IMPORT_ROWS = CounterMetric(
+    "import_rows_total", "Imported CSV rows by outcome", ("outcome",))
+IMPORT_RUNS = CounterMetric(
+    "import_runs_total", "Finished import runs by status", ("status",))
+RESPONSE_CACHE_LOOKUPS = CounterMetric(
+    "response_cache_lookups_total", "Conditional GETs by outcome (not_modified, hit, miss, bypass)", ("route", "outcome"))
+
+METRICS = (HTTP_REQUEST_SECONDS, SUPABASE_REQUEST_SECONDS, SUPABASE_ERRORS,
+           IMPORT_STAGE_SECONDS, IMPORT_ROWS, IMPORT_RUNS, RESPONSE_CACHE_LOOKUPS)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template (/api/imports/{run_id}), not the raw path
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            request.method, getattr(route, "path", "unmatched"), str(status),
+            value=time.perf_counter() - started
+        )
+
+# Blocking supabase-py calls run here so they never stall the event loop
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+
+# Gateway statuses worth retrying for requests that are safe to repeat
+RETRYABLE_STATUS_CODES = {502, 503, 504, 520}
+
+def _is_idempotent(query) -> bool:
+    """GET/PATCH/DELETE and upserts can be replayed; plain inserts cannot"""
+    request = getattr(query, "request", None)
+    if request is None:
+        return False
+    if request.http_method != "POST":
+        return True
+    return "resolution=" in request.headers.get("Prefer", "")
+
+def _query_labels(query) -> tuple[str, str]:
+    """(table, operation) metric labels for a PostgREST query"""
+    request = getattr(query, "request", None)
+    if request is None:
+        return "unknown", "unknown"
+
+    path = str(request.path).rstrip("/")
+    if "/rpc/" in path:
+        return path.rsplit("/", 1)[-1], "rpc"
+
+    table = path.rsplit("/", 1)[-1]
+    if request.http_method == "POST":
+        return table, "upsert" if "resolution=" in request.headers.get("Prefer", "") else "insert"
+    return table, {"GET": "select", "HEAD": "select", "PATCH": "update", "DELETE": "delete"}.get(request.http_method, request.http_method.lower())
+
+def execute(query):
+    """
+    Execute a PostgREST query, retrying transient failures with exponential
+    backoff and jitter. Connection failures are always retried (the request
+    never reached the server); timeouts and gateway errors only for
+    idempotent requests. Blocking - call `db()` from async code.
+    """
+    labels = _query_labels(query)
+    attempt = 0
+    while True:
+        started = time.perf_counter()
+        try:
+            result = query.execute()
+            SUPABASE_REQUEST_SECONDS.observe(*labels, value=time.perf_counter() - started)
+            return result
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            retryable, error = True, e
+        except (httpx.ReadTimeout, httpx.ReadError, httpx.RemoteProtocolError) as e:
+            retryable, error = _is_idempotent(query), e
+        except APIError as e:
+            retryable, error = e.code in RETRYABLE_STATUS_CODES and _is_idempotent(query), e
+        except Exception:
+            SUPABASE_ERRORS.inc(*labels)
+            raise
+
+        SUPABASE_REQUEST_SECONDS.observe(*labels, value=time.perf_counter() - started)
+        SUPABASE_ERRORS.inc(*labels)
+
+        if not retryable or attempt >= DB_MAX_RETRIES:
+            raise error
+
+        delay = DB_RETRY_BACKOFF_SECONDS * (2 ** attempt) * (1 + random.random())
+        logger.warning(f"Retrying Supabase call in {delay:.2f}s after {type(error).__name__}: {error}")
+        time.sleep(delay)
+        attempt += 1
+
+async def db(query):
+    """Execute a PostgREST query on the DB thread pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(DB_EXECUTOR, execute, query)
+
+def timed_call(fn, *args, **kwargs):
+    """Call a non-PostgREST Supabase API (auth, storage), recording its latency"""
+    module = getattr(fn, "__module__", "") or ""
+    target = "auth" if "auth" in module or "gotrue" in module else "storage" if "storage" in module else "other"
+    labels = (target, getattr(fn, "__name__", "call"))
+
+    started = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        SUPABASE_ERRORS.inc(*labels)
+        raise
+    finally:
+        SUPABASE_REQUEST_SECONDS.observe(*labels, value=time.perf_counter() - started)
+
+async def run_db(fn, *args, **kwargs):
+    """Run any other blocking Supabase call (auth, storage) on the DB thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(DB_EXECUTOR, functools.partial(timed_call, fn, *args, **kwargs))
+
+# --- Auth -------------------------------------------------------------------
+
+# Bearer tokens are verified locally: HS256 tokens against the project's JWT
+# secret, asymmetric ones against the project's published signing keys.
+# Without either, verification falls back to a Supabase auth round trip.
+SUPABASE_JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET", "")
+JWT_AUDIENCE = "authenticated"
+JWT_ALGORITHMS = ("HS256", "RS256", "ES256")
+
+# Resolved auth contexts are cached per token for a short time
+AUTH_CACHE_TTL_SECONDS = float(os.environ.get("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "1024"))
+
+class TTLCache:
+    """Small LRU cache whose entries also expire after a per-entry TTL"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_where(self, predicate) -> int:
+        """Drop every entry whose value matches predicate; returns how many"""
+        with self._lock:
+            stale = [key for key, (_, value) in self._data.items() if predicate(value)]
+            for key in stale:
+                del self._data[key]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class AuthContext:
+    """Who is calling: the verified user plus their profile role and provider link"""
+
+    def __init__(self, user_id: str, email: Optional[str], role: str,
+                 full_name: Optional[str] = None, provider_id: Optional[str] = None,
+                 has_profile: bool = True):
+        self.user_id = user_id
+        self.email = email
+        self.role = role
+        self.full_name = full_name
+        self.provider_id = provider_id
+        self.has_profile = has_profile
+
+    def effective_role(self, impersonated_role: Optional[str] = None) -> str:
+        """Admins may act as another role via the impersonated_role cookie"""
+        if self.role == "admin" and impersonated_role:
+            logger.info(f"Admin impersonating as: {impersonated_role}")
+            return impersonated_role
+        return self.role
+
+AUTH_CACHE = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL_SECONDS)
+
+_jwks_client: Optional[jwt.PyJWKClient] = None
+
+def _signing_key(token: str, algorithm: str):
+    """Key to verify a token with, or None when it can only be checked remotely"""
+    global _jwks_client
+    if algorithm == "HS256":
+        return SUPABASE_JWT_SECRET or None
+
+    supabase_url = os.environ.get("SUPABASE_URL", "")
+    if not supabase_url:
+        return None
+    if _jwks_client is None:
+        _jwks_client = jwt.PyJWKClient(f"{supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json")
+    return _jwks_client.get_signing_key_from_jwt(token).key
+
+def verify_access_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Verify a Supabase access token locally and return its claims.
+    Returns None when no local key is available for the token's algorithm;
+    raises jwt.InvalidTokenError for tokens that fail verification and
+    jwt.PyJWKClientError when the signing keys can't be fetched or none
+    matches the token.
+    """
+    algorithm = jwt.get_unverified_header(token).get("alg")
+    if algorithm not in JWT_ALGORITHMS:
+        raise jwt.InvalidAlgorithmError(f"Unsupported token algorithm: {algorithm}")
+
+    key = _signing_key(token, algorithm)
+    if key is None:
+        return None
+    return jwt.decode(token, key, algorithms=[algorithm], audience=JWT_AUDIENCE)
+
+async def _load_auth_context(token: str) -> tuple[AuthContext, float]:
+    """Verify a token and load the caller's role; returns the context and its max cache lifetime"""
+    try:
+        claims = await run_db(verify_access_token, token)
+    except jwt.InvalidTokenError as e:
+        logger.warning(f"Rejected bearer token: {e}")
+        raise HTTPException(status_code=401, detail="Invalid token")
+    except jwt.PyJWKClientConnectionError as e:
+        # The signing keys couldn't be fetched - not the caller's fault
+        logger.error(f"Could not fetch the JWT signing keys: {e}")
+        raise HTTPException(status_code=503, detail="Authentication temporarily unavailable")
+    except jwt.PyJWKClientError as e:
+        # e.g. the token's kid matches none of the published keys
+        logger.warning(f"Rejected bearer token: {e}")
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    if claims is not None:
+        user_id = claims["sub"]
+        email = claims.get("email")
+        lifetime = claims.get("exp", time.time() + AUTH_CACHE_TTL_SECONDS) - time.time()
+    else:
+        # No local key for this token - verify it with Supabase
+        auth_response = await run_db(SB.auth.get_user, token)
+        if not auth_response or not auth_response.user:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        user_id = auth_response.user.id
+        email = auth_response.user.email
+        lifetime = AUTH_CACHE_TTL_SECONDS
+
+    profile_result, provider_result = await asyncio.gather(
+        db(SB.table("profiles").select("role, full_name").eq("id", user_id).limit(1)),
+        db(SB.table("providers").select("id").eq("user_id", user_id).limit(1)),
+    )
+
+    profile = profile_result.data[0] if profile_result.data else None
+    context = AuthContext(
+        user_id=user_id,
+        email=email,
+        role=(profile or {}).get("role") or "billing",  # Default role
+        full_name=(profile or {}).get("full_name"),
+        provider_id=provider_result.data[0]["id"] if provider_result.data else None,
+        has_profile=profile is not None,
+    )
+    return context, lifetime
+
+async def get_auth_context(authorization: str = Header(None)) -> Optional[AuthContext]:
+    """
+    Dependency resolving the bearer token to a cached AuthContext.
+    Returns None when no token was sent; raises 401 for a bad one.
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+
+    token = authorization.replace("Bearer ", "")
+    context = AUTH_CACHE.get(token)
+    if context is not None:
+        return context
+
+    if not SB:
+        logger.error("Database connection not available")
+        raise HTTPException(status_code=500, detail="Database connection error")
+
+    context, lifetime = await _load_auth_context(token)
+    if lifetime > 0:
+        AUTH_CACHE.set(token, context, min(AUTH_CACHE_TTL_SECONDS, lifetime))
+    return context
+
+async def require_user(auth: Optional[AuthContext] = Depends(get_auth_context)) -> AuthContext:
+    """Dependency for routes that need a signed-in caller"""
+    if auth is None:
+        raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
+    return auth
+
+def invalidate_auth_context(user_id: str):
+    """Forget cached contexts for a user, e.g. after their role changes"""
+    dropped = AUTH_CACHE.discard_where(lambda context: context.user_id == user_id)
+    logger.info(f"Invalidated {dropped} cached auth contexts for user {user_id}")
+
+# --- Conditional GETs -------------------------------------------------------
+
+# Read endpoints tag responses with an ETag built from per-table data versions
+# and the caller's role scope, answer If-None-Match with 304 and keep hot
+# bodies in RESPONSE_CACHE. Versions come from the database (data_versions()
+# in sql/essential/2026-10-18-data-versions.sql), so writes made anywhere -
+# another instance, the SQL editor, cron - change the ETag on the next request.
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "256"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "300"))
+RESPONSE_CACHE = TTLCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL_SECONDS)
+
+async def data_versions() -> Dict[str, int]:
+    """Current version of each tracked table, read from the database"""
+    result = await db(SB.rpc("data_versions"))
+    return {row["table_name"]: row["version"] or 0 for row in result.data or []}
+
+def data_etag(request: Request, versions: Dict[str, int], tables: Iterable[str], scope: Any) -> str:
+    """Weak ETag for this route + query, the tables' versions and the caller's scope"""
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    stamp = ".".join(f"{t}={versions.get(t, 0)}" for t in tables)
+    raw = f"{request.url.path}?{query}|{stamp}|{scope!r}"
+    return f'W/"{hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()}"'
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))
+
+def dump_json(payload: Any) -> bytes:
+    """Encode a response body - orjson when available, else json via FastAPI's encoder"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=jsonable_encoder)
+    return json.dumps(jsonable_encoder(payload), separators=(",", ":")).encode("utf-8")
+
+async def conditional_json(request: Request, tables: Iterable[str], scope: Any, build) -> Response:
+    """
+    Serve build()'s (payload, headers) as JSON with an ETag: 304 when the
+    client already has it, the cached body when another caller with the same
+    scope asked recently, else build it and cache it.
+    """
+    route = request.scope["route"].path if request.scope.get("route") else request.url.path
+    try:
+        versions = await data_versions()
+    except Exception as e:
+        # Without versions nothing can be validated - serve it fresh, untagged
+        logger.error(f"Could not read data versions: {e}")
+        RESPONSE_CACHE_LOOKUPS.inc(route, "bypass")
+        payload, extra_headers = await build()
+        return Response(content=dump_json(payload), media_type="application/json", headers=extra_headers)
+
+    etag = data_etag(request, versions, tables, scope)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if _etag_matches(request, etag):
+        RESPONSE_CACHE_LOOKUPS.inc(route, "not_modified")
+        return Response(status_code=304, headers=headers)
+
+    cached = RESPONSE_CACHE.get(etag)
+    RESPONSE_CACHE_LOOKUPS.inc(route, "hit" if cached else "miss")
+    if cached is None:
+        payload, extra_headers = await build()
+        cached = (dump_json(payload), extra_headers)
+        RESPONSE_CACHE.set(etag, cached)
+
+    body, extra_headers = cached
+    return Response(content=body, media_type="application/json", headers={**extra_headers, **headers})
+
 class ImportResult(BaseModel):
     """Result of CSV import operation"""
     success: bool
@@ -58,8 +552,21 @@ class ImportResult(BaseModel):
     errors: int = 0
     flagged_preview: List[Dict[str, Any]] = []
     errors_detail: List[Dict[str, Any]] = []
+    report_rows: int = 0
+    skipped: int = 0
+    unchanged: int = 0
+    already_imported: bool = False
+    child_runs: List[Dict[str, Any]] = []  # Per-file results of a batch import
+    dry_run: bool = False
+    new_entities: Dict[str, List[str]] = {}  # Dry run: providers/clients/payers that would be created
+    samples: Dict[str, List[Dict[str, Any]]] = {}  # Dry run: example sessions per outcome
     message: str = ""
+    status: Optional[str] = None
 
+# Distinct dates, times and insurance strings per file are few, so their parsing is memoized
+PARSE_CACHE_SIZE = 4096
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
 def parse_insurance_info(insurance_string: str) -> tuple[str, Optional[str]]:
     """
     Parse insurance string to extract company name and ID
@@ -76,6 +583,7 @@ def parse_insurance_info(insurance_string: str) -> tuple[str, Optional[str]]:
 
     return (insurance_string.strip(), None)
 
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
 def parse_time_to_minutes(start_time: str, end_time: str) -> Optional[int]:
     """Convert start and end times to minutes"""
     if not start_time or not end_time:
@@ -93,6 +601,38 @@ def parse_time_to_minutes(start_time: str, end_time: str) -> Optional[int]:
         logger.warning(f"Could not parse times {start_time} - {end_time}: {e}")
         return None
 
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def normalize_start_time(start_time: str) -> str:
+    """Normalize a start time to HH:MM ("9" -> "09:00"), defaulting to 09:00"""
+    try:
+        # Try to parse various time formats
+        if ":" in start_time:
+            time_parts = start_time.split(":")
+            if len(time_parts) >= 2:
+                hour = int(time_parts[0])
+                minute = int(time_parts[1])
+                return f"{hour:02d}:{minute:02d}"
+            return start_time
+        # If no colon, assume it's just hours
+        hour = int(start_time)
+        return f"{hour:02d}:00"
+    except (ValueError, IndexError):
+        # If parsing fails, use default
+        return "09:00"
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_service_date(service_date: str) -> Optional[str]:
+    """Convert MM/DD/YYYY (or YYYY-MM-DD) to YYYY-MM-DD; None if unparseable"""
+    try:
+        return datetime.strptime(service_date, "%m/%d/%Y").strftime("%Y-%m-%d")
+    except ValueError:
+        # Try other date formats
+        try:
+            datetime.strptime(service_date, "%Y-%m-%d")
+            return service_date
+        except ValueError:
+            return None
+
 def find_or_create_provider(name: str) -> Optional[dict]:
     """Find provider or create if doesn't exist"""
     if not name:
@@ -107,7 +647,7 @@ def find_or_create_provider(name: str) -> Optional[dict]:
         logger.info(f"Searching for provider: {name}")
 
         # Try to find existing provider - use eq for exact match first
-        result = SB.table("providers").select("id").eq("name", name.strip()).limit(1).execute()
+        result = execute(SB.table("providers").select("id").eq("name", name.strip()).limit(1))
 
         if result.data and len(result.data) > 0:
             logger.info(f"✓ Found existing provider: {name} (ID: {result.data[0]['id']})")
@@ -115,7 +655,7 @@ def find_or_create_provider(name: str) -> Optional[dict]:
 
         # Not found, create new provider
         logger.info(f"Provider '{name}' not found, creating new...")
-        new_provider = SB.table("providers").insert({"name": name.strip()}).execute()
+        new_provider = execute(SB.table("providers").insert({"name": name.strip()}))
 
         if new_provider.data and len(new_provider.data) > 0:
             logger.info(f"✓ Created new provider: {name} (ID: {new_provider.data[0]['id']})")
@@ -148,7 +688,7 @@ def find_or_create_client(name: str) -> Optional[dict]:
         logger.info(f"Searching for client: {name}")
 
         # Try to find existing client - use eq for exact match first
-        result = SB.table("clients").select("id").eq("name", name.strip()).limit(1).execute()
+        result = execute(SB.table("clients").select("id").eq("name", name.strip()).limit(1))
 
         if result.data and len(result.data) > 0:
             logger.info(f"✓ Found existing client: {name} (ID: {result.data[0]['id']})")
@@ -156,7 +696,7 @@ def find_or_create_client(name: str) -> Optional[dict]:
 
         # Not found, create new client
         logger.info(f"Client '{name}' not found, creating new...")
-        new_client = SB.table("clients").insert({"name": name.strip()}).execute()
+        new_client = execute(SB.table("clients").insert({"name": name.strip()}))
 
         if new_client.data and len(new_client.data) > 0:
             logger.info(f"✓ Created new client: {name} (ID: {new_client.data[0]['id']})")
@@ -175,34 +715,32 @@ def find_or_create_client(name: str) -> Optional[dict]:
     logger.error(f"✗ Fell through - client '{name}' failed for unknown reason")
     return None
 
+# Payer index kept between find_or_create_payer calls. A name it doesn't know
+# reloads it first, so a payer added elsewhere since is matched, not duplicated.
+_payer_resolver: Optional["ReferenceResolver"] = None
+_payer_resolver_lock = threading.Lock()
+
 def find_or_create_payer(insurance_string: str, billing_route: str = "simplepractice") -> Optional[str]:
     """Find or create payer and return UUID"""
+    global _payer_resolver
     if not insurance_string or not SB:
         return None
 
-    payer_name, payer_id = parse_insurance_info(insurance_string)
+    payer_name, external_id = parse_insurance_info(insurance_string)
 
     try:
-        # Try to find existing payer by name (case-insensitive)
-        result = SB.table("payers").select("id").ilike("name", payer_name).limit(1).execute()
-        if result.data:
-            logger.info(f"✓ Found existing payer: {payer_name}")
-            return result.data[0]['id']
-
-        # Create new payer (payers table uses 'id' not 'uuid')
-        logger.info(f"Creating new payer: {payer_name}")
-        new_payer = SB.table("payers").insert({
-            "name": payer_name,
-            "billing_route": billing_route,
-            "status": "Active"
-        }).execute()
-
-        if new_payer.data:
-            logger.info(f"✓ Created new payer: {payer_name} (ID: {new_payer.data[0]['id']})")
-            return new_payer.data[0]['id']
+        # Same matching (external id, normalized name, near-misses) as imports
+        with _payer_resolver_lock:
+            resolver = _payer_resolver
+            if resolver is None or resolver.payers is None or resolver.payers.match(payer_name, external_id) is None:
+                resolver = _payer_resolver = ReferenceResolver()
+            resolver.resolve_payers({(payer_name, external_id): billing_route})
+            payer_id = resolver.payer_id(insurance_string)
+        if payer_id:
+            logger.info(f"✓ Resolved payer: {payer_name} (ID: {payer_id})")
         else:
             logger.error(f"✗ Failed to create payer: {payer_name}")
-            return None
+        return payer_id
     except Exception as e:
         logger.error(f"✗ Error with payer {payer_name}: {e}")
         import traceback
@@ -210,530 +748,3245 @@ def find_or_create_payer(insurance_string: str, billing_route: str = "simpleprac
 
     return None
 
-@app.post("/api/imports/simplepractice", response_model=ImportResult)
-async def import_simplepractice(file: UploadFile = File(...)):
+# Names per PostgREST in.() filter - keeps request URLs well under proxy limits
+IN_FILTER_CHUNK_SIZE = 100
+
+# Minimum difflib ratio for a payer name to count as a spelling variant of a known one
+PAYER_MATCH_THRESHOLD = float(os.environ.get("PAYER_MATCH_THRESHOLD", "0.9"))
+
+def normalize_payer_name(name: str) -> str:
+    """Payer name key with case, whitespace and punctuation folded"""
+    return " ".join(re.sub(r"[\W_]+", " ", name.casefold()).split())
+
+class PayerIndex:
     """
-    Fixed version of the SimplePractice CSV import handler
+    Payer ids by external payer ID (the number in "Horizon NJ Health (22356)")
+    and by normalized name. Names that match neither fall back to the
+    closest known name at or above the similarity threshold.
     """
-    logger.info(f"Starting CSV import: {file.filename}")
 
-    # Check database connection
-    if not SB:
-        logger.error("Database connection not available")
-        return ImportResult(
-            success=False,
-            message="Database connection error. Please check configuration.",
-            errors=1
-        )
+    def __init__(self, threshold: float = PAYER_MATCH_THRESHOLD):
+        self.threshold = threshold
+        self.by_external_id: Dict[str, str] = {}
+        self.by_key: Dict[str, str] = {}
+        self.external_ids: Dict[str, Optional[str]] = {}  # payer id -> stored external id
 
-    # Validate file
-    if not file.filename or not file.filename.lower().endswith(".csv"):
-        return ImportResult(
-            success=False,
-            message="Please upload a valid CSV file",
-            errors=1
-        )
+    def add(self, row: Dict[str, Any]):
+        external_id = row.get("external_id")
+        if external_id:
+            self.by_external_id.setdefault(str(external_id), row["id"])
+        self.by_key.setdefault(normalize_payer_name(row["name"]), row["id"])
+        self.external_ids.setdefault(row["id"], external_id)
 
-    # Create import run record
-    try:
-        run_data = SB.table("import_runs").insert({
-            "source": "simplepractice",
-            "file_name": file.filename,
-            "started_at": datetime.now(timezone.utc).isoformat()
-        }).execute()
+    def match(self, name: str, external_id: Optional[str] = None) -> Optional[str]:
+        if external_id and external_id in self.by_external_id:
+            return self.by_external_id[external_id]
 
-        if not run_data.data:
-            logger.error("Could not create import run record")
-            return ImportResult(
-                success=False,
-                message="Could not initialize import. Please check database connection.",
-                errors=1
-            )
+        key = normalize_payer_name(name)
+        payer_id = self.by_key.get(key)
+        if payer_id is None and key and self.threshold < 1:
+            close = difflib.get_close_matches(key, self.by_key.keys(), n=1, cutoff=self.threshold)
+            if close:
+                payer_id = self.by_key[close[0]]
+                logger.info(f"Matched payer '{name}' to '{close[0]}'")
+                # Remember the variant so its later rows skip the fuzzy scan
+                self.by_key[key] = payer_id
+        return payer_id
 
-        run = run_data.data[0]
-        run_id = run["id"]
-        logger.info(f"Created import run ID: {run_id}")
-    except Exception as e:
-        logger.error(f"Error creating import run: {e}")
-        return ImportResult(
-            success=False,
-            message=f"Database error: {str(e)}",
-            errors=1
-        )
+# Stand-in ids a dry run gives entities it would have created
+PLACEHOLDER_ID_PREFIX = "new:"
 
-    # Process CSV
-    total = inserted = updated = flagged = duplicates = errors = 0
-    errors_list = []
-    flagged_preview = []
+def is_placeholder_id(value: Optional[str]) -> bool:
+    return bool(value) and value.startswith(PLACEHOLDER_ID_PREFIX)
 
-    try:
-        # Read and decode CSV file
-        payload_bytes = await file.read()
-        csv_text = payload_bytes.decode("utf-8", errors="ignore")
+def _chunks(items: list, size: int):
+    """Yield successive slices of at most `size` items"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
 
-        # Parse CSV
-        reader = csv.DictReader(io.StringIO(csv_text))
+# Rows PostgREST returns per request at most (its db-max-rows setting)
+POSTGREST_MAX_ROWS = int(os.environ.get("POSTGREST_MAX_ROWS", "1000"))
 
-        # Track seen records for duplicate detection
-        seen_records = set()
+def select_all(build_query, page_size: int = POSTGREST_MAX_ROWS) -> List[Dict[str, Any]]:
+    """
+    Every row a select matches, fetched in .range() pages ordered by id so
+    PostgREST's row cap can't silently truncate the result. build_query
+    returns a fresh query builder per page.
+    """
+    rows: List[Dict[str, Any]] = []
+    while True:
+        page = execute(build_query().order("id").range(len(rows), len(rows) + page_size - 1)).data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
 
-        for row_num, row in enumerate(reader, start=2):  # Start at 2 to account for header
-            total += 1
+class ReferenceResolver:
+    """
+    Resolves provider, client and payer names for an import run in bulk.
+    Existing rows are fetched with in.() queries, missing ones are created
+    with one batched insert per table, and every id is kept in memory so
+    later rows never touch the database for lookups.
+    With dry_run, missing rows get placeholder ids instead of being created.
+    """
 
-            try:
-                # Extract fields (handle BOTH SimplePractice CSV formats)
-                client_name = row.get("Client", row.get("client", "")).strip()
-                client_type = row.get("Client type", row.get("client_type", "")).strip()
-
-                # Handle BOTH "Date of Service" (new format) and "Date added" (old format)
-                service_date = row.get("Date of Service", row.get("Date added", row.get("service_date", ""))).strip()
-
-                # Handle BOTH "Clinician" (new format) and "Primary clinician" (old format)
-                provider_name = row.get("Clinician", row.get("Primary clinician", row.get("provider", ""))).strip()
-
-                # Parse start_time from "Date of Service" if needed (format: "10/06/2025 12:00")
-                start_time = row.get("Start time", row.get("start_time", "")).strip()
-                if not start_time and service_date and " " in service_date:
-                    # Extract time from "MM/DD/YYYY HH:MM" format
-                    date_parts = service_date.split(" ", 1)
-                    if len(date_parts) == 2:
-                        service_date = date_parts[0]  # Just the date part
-                        start_time = date_parts[1]     # Just the time part
-                
-                # Normalize time format - ensure it's in HH:MM format
-                if start_time:
-                    try:
-                        # Try to parse various time formats
-                        if ":" in start_time:
-                            time_parts = start_time.split(":")
-                            if len(time_parts) >= 2:
-                                hour = int(time_parts[0])
-                                minute = int(time_parts[1])
-                                start_time = f"{hour:02d}:{minute:02d}"
-                        else:
-                            # If no colon, assume it's just hours
-                            hour = int(start_time)
-                            start_time = f"{hour:02d}:00"
-                    except (ValueError, IndexError):
-                        # If parsing fails, use default
-                        start_time = "09:00"
-
-                end_time = row.get("End time", row.get("end_time", "")).strip()
-                minutes_str = row.get("Minutes", row.get("minutes", "")).strip()
-
-                # Handle BOTH "Primary Insurance" (new format) and "Primary insurance" (old format)
-                primary_insurance = row.get("Primary Insurance", row.get("Primary insurance", row.get("insurance", ""))).strip()
-
-                billing_route = row.get("Billing route", row.get("billing_route", "simplepractice")).strip()
-                status = row.get("Status", row.get("status", "")).strip()
-                notes = row.get("Notes", row.get("notes", "")).strip()
-
-                logger.info(f"Processing row {row_num}: {client_name} - {provider_name} - {service_date}")
-
-                # Check for duplicates
-                record_key = (client_name, service_date, start_time, provider_name)
-                if record_key in seen_records:
-                    duplicates += 1
-                    logger.warning(f"Duplicate record found at row {row_num}: {record_key}")
-                    continue
-                seen_records.add(record_key)
-
-                # Validate required fields
-                if not client_name or not provider_name or not service_date:
-                    reason = "missing_data"
-                    details = []
-                    if not client_name:
-                        details.append("client")
-                    if not provider_name:
-                        details.append("provider")
-                    if not service_date:
-                        details.append("date")
-
-                    flagged += 1
-                    if len(flagged_preview) < 10:
-                        flagged_preview.append({
-                            "reason": f"missing_{', '.join(details)}",
-                            "client_name": client_name or "Unknown",
-                            "provider_name": provider_name or "Unknown",
-                            "service_date": service_date or "Unknown",
-                            "row": row_num
-                        })
+    def __init__(self, dry_run: bool = False):
+        self.providers: Dict[str, str] = {}  # provider name -> id
+        self.clients: Dict[str, str] = {}  # client name -> id
+        self.payers: Optional[PayerIndex] = None  # loaded whole on first use
+        self.dry_run = dry_run
+        self.new_entities: Dict[str, List[str]] = {"providers": [], "clients": [], "payers": []}
 
-                    logger.warning(f"Row {row_num} flagged: missing {', '.join(details)}")
-
-                    # Store in staging table
-                    if SB:
-                        try:
-                            SB.table("import_staging").insert({
-                                "run_id": run_id,
-                                "raw": row,
-                                "reason": f"missing_{', '.join(details)}"
-                            }).execute()
-                        except Exception as e:
-                            logger.error(f"Could not save to staging: {e}")
-                    continue
+    def resolve(self, records: List[Dict[str, Any]]):
+        """Resolve every entity referenced by the given normalized rows"""
+        self._resolve_names("providers", self.providers, {r["provider_name"] for r in records})
+        self._resolve_names("clients", self.clients, {r["client_name"] for r in records})
 
-                # Convert date format if needed (MM/DD/YYYY to YYYY-MM-DD)
-                try:
-                    date_obj = datetime.strptime(service_date, "%m/%d/%Y")
-                    formatted_date = date_obj.strftime("%Y-%m-%d")
-                except ValueError:
-                    # Try other date formats
-                    try:
-                        date_obj = datetime.strptime(service_date, "%Y-%m-%d")
-                        formatted_date = service_date
-                    except ValueError:
-                        logger.error(f"Invalid date format at row {row_num}: {service_date}")
-                        errors += 1
-                        errors_list.append({
-                            "row": row_num,
-                            "error": f"Invalid date format: {service_date}"
-                        })
-                        continue
+        payer_routes: Dict[tuple, str] = {}
+        for r in records:
+            if r["primary_insurance"]:
+                payer_routes.setdefault(parse_insurance_info(r["primary_insurance"]), r["billing_route"])
+        self.resolve_payers(payer_routes)
 
-                # Calculate minutes from times if not provided
-                if minutes_str and minutes_str.isdigit():
-                    minutes = int(minutes_str)
-                else:
-                    minutes = parse_time_to_minutes(start_time, end_time)
+    def payer_id(self, insurance_string: str) -> Optional[str]:
+        """Look up a resolved payer id for a raw insurance string"""
+        if self.payers is None:
+            return None
+        return self.payers.match(*parse_insurance_info(insurance_string))
 
-                # Find or create provider
-                provider = find_or_create_provider(provider_name)
-                if not provider:
-                    logger.error(f"Could not create provider: {provider_name}")
-                    flagged += 1
-                    continue
+    def _resolve_names(self, table: str, cache: Dict[str, str], names: set):
+        missing = sorted(n for n in names if n and n not in cache)
+        if not missing:
+            return
 
-                # Find or create client
-                client = find_or_create_client(client_name)
-                if not client:
-                    logger.error(f"Could not create client: {client_name}")
-                    flagged += 1
-                    continue
+        for chunk in _chunks(missing, IN_FILTER_CHUNK_SIZE):
+            result = execute(SB.table(table).select("id, name").in_("name", chunk))
+            for row in result.data or []:
+                cache.setdefault(row["name"], row["id"])
 
-                # Handle insurance/payer - auto-create if possible
-                payer_id = None
-                if primary_insurance:
-                    payer_id = find_or_create_payer(primary_insurance, billing_route)
-
-                    # If payer creation STILL failed (rare), flag it
-                    if not payer_id:
-                        logger.error(f"Failed to create payer at row {row_num}: {primary_insurance}")
-                        flagged += 1
-                        if len(flagged_preview) < 10:
-                            flagged_preview.append({
-                                "reason": "payer_creation_failed",
-                                "client_name": client_name,
-                                "provider_name": provider_name,
-                                "service_date": formatted_date,
-                                "insurance": primary_insurance,
-                                "row": row_num
-                            })
-
-                        # Store in staging for team review
-                        if SB:
-                            try:
-                                SB.table("import_staging").insert({
-                                    "run_id": run_id,
-                                    "raw": row,
-                                    "reason": f"payer_creation_failed: {primary_insurance}"
-                                }).execute()
-                            except Exception as e:
-                                logger.error(f"Could not save to staging: {e}")
-                        continue
-                # If no insurance, leave payer_id as None (self-pay)
-
-                # Determine note submission status
-                note_submitted = status.lower() in ["completed", "submitted", "finalized", "complete"]
-
-                # Prepare session data (only include fields that exist in the sessions table)
-                session_data = {
-                    "provider_id": provider["id"],
-                    "client_id": client["id"],
-                    "session_date": formatted_date,
-                    "start_time": start_time,  # Already normalized above
-                    "minutes": minutes,
-                    "note_submitted": note_submitted,
-                    "billing_status": "completed" if note_submitted else "pending",
-                    "amount_billed": 160.0  # Default amount
+        to_create = [n for n in missing if n not in cache]
+        if not to_create:
+            return
+
+        if self.dry_run:
+            for n in to_create:
+                cache[n] = f"{PLACEHOLDER_ID_PREFIX}{table}:{n}"
+            self.new_entities[table].extend(to_create)
+            return
+
+        logger.info(f"Creating {len(to_create)} new {table}")
+        try:
+            created = execute(SB.table(table).insert([{"name": n} for n in to_create]))
+            for row in created.data or []:
+                cache[row["name"]] = row["id"]
+        except Exception as e:
+            # Another import may have created some of them concurrently - pick those up
+            logger.error(f"✗ Batched insert into {table} failed: {type(e).__name__}: {e}")
+            for chunk in _chunks(to_create, IN_FILTER_CHUNK_SIZE):
+                result = execute(SB.table(table).select("id, name").in_("name", chunk))
+                for row in result.data or []:
+                    cache.setdefault(row["name"], row["id"])
+
+    def resolve_payers(self, payer_routes: Dict[tuple, str]):
+        """Resolve (payer name, external id) pairs, creating payers nothing matches"""
+        if self.payers is None:
+            # payers is a small reference table - load it whole (paged past the row cap) and match in memory
+            self.payers = PayerIndex()
+            for row in select_all(lambda: SB.table("payers").select("id, name, external_id")):
+                self.payers.add(row)
+
+        # New payers, deduplicated among themselves the same way as against the table
+        to_create: Dict[str, Dict[str, Any]] = {}
+        new_payers = PayerIndex(self.payers.threshold)
+        backfill: Dict[str, str] = {}
+        for (name, external_id), route in payer_routes.items():
+            payer_id = self.payers.match(name, external_id)
+            if payer_id is not None:
+                if external_id and not self.payers.external_ids.get(payer_id):
+                    backfill.setdefault(payer_id, external_id)
+                continue
+
+            key = new_payers.match(name, external_id)
+            if key is None:
+                key = normalize_payer_name(name)
+                new_payers.add({"id": key, "name": name, "external_id": external_id})
+                to_create[key] = {
+                    "name": name,
+                    "external_id": external_id,
+                    "billing_route": route,
+                    "status": "Active"
                 }
+            elif external_id and not to_create[key]["external_id"]:
+                to_create[key]["external_id"] = external_id
 
-                # Add payer ID if available (commented out until database schema is updated)
-                # if payer_id:
-                #     session_data["payer_id"] = payer_id
-
-                # Check if session already exists
-                existing = SB.table("sessions").select("id") \
-                    .eq("provider_id", provider["id"]) \
-                    .eq("client_id", client["id"]) \
-                    .eq("session_date", formatted_date) \
-                    .limit(1).execute()
-
-                if existing.data:
-                    # Update existing session
-                    session_data["is_duplicate"] = True
-                    result = SB.table("sessions").update(session_data).eq("id", existing.data[0]["id"]).execute()
-                    updated += 1
-                    logger.info(f"Updated existing session ID: {existing.data[0]['id']}")
-                else:
-                    # Insert new session
-                    session_data["is_duplicate"] = False
-                    result = SB.table("sessions").insert(session_data).execute()
-                    inserted += 1
-                    logger.info(f"Created new session for {client_name} on {formatted_date}")
+        if self.dry_run:
+            for payer in to_create.values():
+                self.payers.add({"id": f"{PLACEHOLDER_ID_PREFIX}payers:{payer['name']}", **payer})
+                self.new_entities["payers"].append(payer["name"])
+            return
+
+        if backfill:
+            self._backfill_external_ids(backfill)
+        if not to_create:
+            return
 
+        logger.info(f"Creating {len(to_create)} new payers")
+        try:
+            created = execute(SB.table("payers").insert(list(to_create.values())))
+            for row in created.data or []:
+                self.payers.add(row)
+        except Exception as e:
+            logger.error(f"✗ Batched insert into payers failed: {type(e).__name__}: {e}")
+            names = [p["name"] for p in to_create.values()]
+            for chunk in _chunks(names, IN_FILTER_CHUNK_SIZE):
+                result = execute(SB.table("payers").select("id, name, external_id").in_("name", chunk))
+                for row in result.data or []:
+                    self.payers.add(row)
+
+    def _backfill_external_ids(self, backfill: Dict[str, str]):
+        """Store the external id seen in an export on payers that were matched by name and had none"""
+        for payer_id, external_id in backfill.items():
+            try:
+                execute(SB.table("payers").update({"external_id": external_id})
+                        .eq("id", payer_id).is_("external_id", "null"))
+                self.payers.external_ids[payer_id] = external_id
+                self.payers.by_external_id.setdefault(external_id, payer_id)
             except Exception as e:
-                logger.error(f"Error processing row {row_num}: {str(e)}")
-                errors += 1
-                errors_list.append({
-                    "row": row_num,
-                    "error": str(e)
-                })
-
-        # Update import run with results
-        SB.table("import_runs").update({
-            "finished_at": datetime.now(timezone.utc).isoformat(),
-            "total_rows": total,
-            "inserted_rows": inserted,
-            "updated_rows": updated,
-            "flagged_rows": flagged,
-            "errors": errors_list[:10]  # Limit to first 10 errors
-        }).eq("id", run_id).execute()
-
-        logger.info(f"Import complete: {inserted} inserted, {updated} updated, {flagged} flagged, {errors} errors")
+                # e.g. another payer already holds this external id
+                logger.error(f"Could not set external_id {external_id} on payer {payer_id}: {e}")
 
-        return ImportResult(
-            success=True,
-            run_id=run_id,
-            total=total,
-            inserted=inserted,
-            updated=updated,
-            flagged=flagged,
-            duplicates=duplicates,
-            errors=errors,
-            flagged_preview=flagged_preview,
-            errors_detail=errors_list[:10],
-            message=f"Successfully imported {inserted} new sessions, updated {updated} existing sessions"
-        )
+# Sessions written per upsert request (override with IMPORT_BATCH_SIZE)
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "500"))
 
-    except Exception as e:
-        logger.error(f"Fatal error during import: {str(e)}")
+# Example sessions a dry run returns per outcome
+DRY_RUN_SAMPLE_SIZE = 10
 
-        # Update import run with error
-        if 'run_id' in locals():
-            SB.table("import_runs").update({
-                "finished_at": datetime.now(timezone.utc).isoformat(),
-                "errors": [{"error": str(e)}]
-            }).eq("id", run_id).execute()
+# Unique key the upsert conflicts on - see sql/essential/2026-10-18-sessions-natural-key.sql
+SESSION_NATURAL_KEY = ("provider_id", "client_id", "session_date")
 
-        return ImportResult(
-            success=False,
-            message=f"Import failed: {str(e)}",
-            errors=1
-        )
+def session_row_hash(session_data: Dict[str, Any]) -> str:
+    """Stable digest of the imported session fields, stored as sessions.row_hash"""
+    payload = json.dumps(session_data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
 
-@app.get("/api/sessions")
-async def get_sessions(
-    authorization: str = Header(None),
-    impersonated_role: str = Cookie(None)
-):
-    """Get sessions with role-based filtering"""
-    if not SB:
-        logger.error("Database connection not available")
-        raise HTTPException(status_code=500, detail="Database connection error")
+class SessionBatchWriter:
+    """
+    Buffers normalized session rows and writes each chunk with a single
+    upsert on the session natural key. Existing keys are fetched per chunk
+    beforehand so inserted/updated counts stay accurate, and sessions whose
+    stored row_hash matches are left untouched. With dry_run the chunk is
+    classified the same way but never written; a few rows per outcome are
+    kept as samples instead. A chunk that still fails after execute()'s
+    retries raises, failing the run so it can be resumed from its last
+    checkpoint.
+    """
 
-    try:
-        # Get effective role for filtering
-        effective_role = "admin"  # Default
+    def __init__(self, batch_size: int = IMPORT_BATCH_SIZE, dry_run: bool = False):
+        self.batch_size = max(1, batch_size)
+        self.dry_run = dry_run
+        self.samples: Dict[str, List[Dict[str, Any]]] = {"insert": [], "update": [], "unchanged": []}
+        self.buffer: Dict[tuple, Dict[str, Any]] = {}  # natural key -> {"rows": [...], "data": {...}}
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.written: List[int] = []  # row numbers from successful upserts
 
-        if authorization and authorization.startswith("Bearer "):
-            token = authorization.replace("Bearer ", "")
-            auth_response = SB.auth.get_user(token)
+    def add(self, row_num: int, session_data: Dict[str, Any]):
+        key = tuple(session_data[k] for k in SESSION_NATURAL_KEY)
+        entry = self.buffer.get(key)
+        if entry:
+            # Same session twice in one chunk - the later row wins, as the
+            # old per-row update did
+            entry["rows"].append(row_num)
+            entry["data"] = session_data
+        else:
+            self.buffer[key] = {"rows": [row_num], "data": session_data}
 
-            if auth_response and auth_response.user:
-                # Fetch user profile to get actual role
-                user_id = auth_response.user.id
-                profile_result = SB.table("profiles").select("role").eq("id", user_id).execute()
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
 
-                if profile_result.data:
-                    actual_role = profile_result.data[0].get("role", "billing")
+    def flush(self):
+        if not self.buffer:
+            return
 
-                    # If user is admin and has impersonated role, use that
-                    if actual_role == "admin" and impersonated_role:
-                        effective_role = impersonated_role
-                        logger.info(f"Admin impersonating as: {impersonated_role}")
-                    else:
-                        effective_role = actual_role
-
-        # Query sessions based on effective role
-        if effective_role == "admin":
-            # Admin sees all sessions
-            result = SB.table("sessions").select(
-                "id, session_date, client_id, provider_id, minutes, note_submitted, "
-                "billing_status, amount_billed, amount_paid, date_submitted, date_paid, "
-                "clients(name), providers(name)"
-            ).order("session_date", desc=True).execute()
-        elif effective_role == "billing":
-            # Billing sees all sessions (for billing purposes)
-            result = SB.table("sessions").select(
-                "id, session_date, client_id, provider_id, minutes, note_submitted, "
-                "billing_status, amount_billed, amount_paid, date_submitted, date_paid, "
-                "clients(name), providers(name)"
-            ).order("session_date", desc=True).execute()
-        elif effective_role == "manager":
-            # Manager sees team sessions (for now, same as billing)
-            result = SB.table("sessions").select(
-                "id, session_date, client_id, provider_id, minutes, note_submitted, "
-                "billing_status, amount_billed, amount_paid, date_submitted, date_paid, "
-                "clients(name), providers(name)"
-            ).order("session_date", desc=True).execute()
-        else:
-            # Provider sees only their own sessions
-            if authorization and authorization.startswith("Bearer "):
-                token = authorization.replace("Bearer ", "")
-                auth_response = SB.auth.get_user(token)
-
-                if auth_response and auth_response.user:
-                    user_id = auth_response.user.id
-                    # Get provider ID for this user
-                    provider_result = SB.table("providers").select("id").eq("user_id", user_id).execute()
-
-                    if provider_result.data:
-                        provider_id = provider_result.data[0]["id"]
-                        result = SB.table("sessions").select(
-                            "id, session_date, client_id, provider_id, minutes, note_submitted, "
-                            "billing_status, amount_billed, amount_paid, date_submitted, date_paid, "
-                            "clients(name), providers(name)"
-                        ).eq("provider_id", provider_id).order("session_date", desc=True).execute()
-                    else:
-                        result = {"data": []}
+        batch, self.buffer = self.buffer, {}
+        try:
+            existing = self._existing_hashes(batch)
+
+            payload = []
+            inserted = updated = unchanged = 0
+            for key, entry in batch.items():
+                repeats = len(entry["rows"]) - 1
+                row_hash = session_row_hash(entry["data"])
+                if key in existing and existing[key] == row_hash:
+                    # Same data as the last import - skip the no-op update
+                    unchanged += 1 + repeats
+                    self._sample("unchanged", entry)
+                    continue
+                if key in existing:
+                    updated += 1 + repeats
+                    self._sample("update", entry)
                 else:
-                    result = {"data": []}
-            else:
-                result = {"data": []}
+                    inserted += 1
+                    updated += repeats
+                    self._sample("insert", entry)
+                payload.append({**entry["data"], "row_hash": row_hash, "is_duplicate": key in existing or repeats > 0})
 
-        logger.info(f"Found {len(result.data) if result.data else 0} sessions for role: {effective_role}")
-        return result.data if result.data else []
-    except Exception as e:
-        logger.error(f"Error fetching sessions: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=str(e))
+            if payload and not self.dry_run:
+                execute(SB.table("sessions").upsert(payload, on_conflict=",".join(SESSION_NATURAL_KEY)))
 
-@app.get("/api/user/profile")
-async def get_user_profile(
-    authorization: str = Header(None),
-    impersonated_role: str = Cookie(None)
-):
-    """Get user profile with role information"""
-    if not SB:
-        logger.error("Database connection not available")
-        raise HTTPException(status_code=500, detail="Database connection error")
+            self.inserted += inserted
+            self.updated += updated
+            self.unchanged += unchanged
+            for entry in batch.values():
+                self.written.extend(entry["rows"])
+            logger.info(f"{'Would upsert' if self.dry_run else 'Upserted'} {len(payload)} sessions "
+                        f"({inserted} new, {updated} updated, {unchanged} unchanged)")
+        except Exception as e:
+            logger.error(f"✗ Session batch upsert failed: {type(e).__name__}: {e}")
+            raise
 
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
+    def _sample(self, outcome: str, entry: Dict[str, Any]):
+        if self.dry_run and len(self.samples[outcome]) < DRY_RUN_SAMPLE_SIZE:
+            self.samples[outcome].append({"row": entry["rows"][0], **entry["data"]})
 
-    try:
-        # Extract token
-        token = authorization.replace("Bearer ", "")
+    def _existing_hashes(self, batch: Dict[tuple, Dict[str, Any]]) -> Dict[tuple, Optional[str]]:
+        """Natural keys from this chunk that already exist in sessions, with their row_hash"""
+        dates = sorted({key[2] for key in batch})
+        # Clients a dry run would create have no sessions yet
+        client_ids = sorted({key[1] for key in batch if not is_placeholder_id(key[1])})
 
-        # Verify token with Supabase
-        auth_response = SB.auth.get_user(token)
-        if not auth_response or not auth_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
+        existing = {}
+        for chunk in _chunks(client_ids, IN_FILTER_CHUNK_SIZE):
+            # A chunk's clients can have more sessions in the date window than
+            # one response holds, so page through all of them
+            rows = select_all(lambda: SB.table("sessions").select(", ".join(SESSION_NATURAL_KEY) + ", row_hash") \
+                .in_("client_id", chunk) \
+                .gte("session_date", dates[0]) \
+                .lte("session_date", dates[-1]))
+            for row in rows:
+                key = tuple(row[k] for k in SESSION_NATURAL_KEY)
+                if key in batch:
+                    existing[key] = row.get("row_hash")
+        return existing
 
-        user = auth_response.user
-        user_id = user.id
-        email = user.email
+# Bytes sniffed from the head of an upload to pick its text encoding
+ENCODING_SNIFF_BYTES = 64 * 1024
 
-        # Fetch user profile from profiles table
-        profile_result = SB.table("profiles").select("role, full_name").eq("id", user_id).limit(1).execute()
+# Error details kept in memory per run (only these are returned and persisted)
+ERROR_DETAIL_LIMIT = 10
 
-        if profile_result.data and len(profile_result.data) > 0:
-            profile = profile_result.data[0]
-            actual_role = profile.get("role", "billing")
+# Full per-row error/flag reports live in Supabase storage as gzipped NDJSON
+IMPORT_REPORTS_BUCKET = os.environ.get("IMPORT_REPORTS_BUCKET", "import-reports")
 
-            # If user is admin and has impersonated role, return that role
-            effective_role = actual_role
-            if actual_role == "admin" and impersonated_role:
-                effective_role = impersonated_role
-                logger.info(f"Admin impersonating as: {impersonated_role}")
+# Private bucket keeping each run's uploaded CSV, so a failed run can be resumed
+IMPORT_UPLOADS_BUCKET = os.environ.get("IMPORT_UPLOADS_BUCKET", "import-uploads")
 
-            return {
-                "id": user_id,
-                "email": email,
-                "role": effective_role,  # Return effective role
-                "name": profile.get("full_name", email.split("@")[0])
-            }
-        else:
-            # No profile found, return default
-            logger.warning(f"No profile found for user {user_id}, returning defaults")
-            return {
-                "id": user_id,
-                "email": email,
-                "role": "billing",  # Default role
-                "name": email.split("@")[0] if email else "User"
-            }
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error fetching user profile: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=str(e))
+# Stored uploads are read back from a short-lived signed URL and streamed to a
+# temp file - storage's download() would hold the whole object in memory
+STORAGE_HTTP = httpx.Client(
+    timeout=httpx.Timeout(DB_TIMEOUT_SECONDS, connect=DB_CONNECT_TIMEOUT_SECONDS),
+    follow_redirects=True,
+)
+STORAGE_SIGNED_URL_SECONDS = 60
 
-@app.get("/api/imports/history")
-async def get_import_history():
-    """Get recent import runs with statistics"""
-    if not SB:
-        logger.error("Database connection not available")
-        raise HTTPException(status_code=500, detail="Database connection error")
+def download_to_file(bucket: str, path: str, fileobj) -> int:
+    """Stream a storage object into fileobj (blocking); returns the bytes written"""
+    signed = timed_call(SB.storage.from_(bucket).create_signed_url, path, STORAGE_SIGNED_URL_SECONDS)
+    written = 0
+    with STORAGE_HTTP.stream("GET", signed["signedURL"]) as response:
+        response.raise_for_status()
+        for chunk in response.iter_bytes(UPLOAD_COPY_CHUNK_BYTES):
+            fileobj.write(chunk)
+            written += len(chunk)
+    return written
 
-    try:
-        # Query import_runs table, get last 20 imports
-        result = SB.table("import_runs").select(
-            "id, source, file_name, started_at, finished_at, "
-            "total_rows, inserted_rows, updated_rows, flagged_rows, errors"
-        ).order("started_at", desc=True).limit(20).execute()
+# Days an uploaded CSV is kept for resuming before it is removed
+IMPORT_UPLOAD_RETENTION_DAYS = int(os.environ.get("IMPORT_UPLOAD_RETENTION_DAYS", "7"))
 
-        logger.info(f"Found {len(result.data) if result.data else 0} import runs")
-        return result.data if result.data else []
-    except Exception as e:
-        logger.error(f"Error fetching import history: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=str(e))
+# Rows between checkpoints - everything before one is committed and recorded on import_runs
+IMPORT_CHECKPOINT_ROWS = int(os.environ.get("IMPORT_CHECKPOINT_ROWS", "5000"))
 
-@app.put("/api/users/{user_id}/role")
-async def update_user_role(
-    user_id: str,
-    role_data: dict,
-    authorization: str = Header(None)
-):
-    """Update user role"""
+# Compressed report bytes kept in memory before spilling to a temp file
+REPORT_SPOOL_BYTES = 1024 * 1024
+
+# Duplicate-check keys held in memory before spilling to a temp SQLite file
+SEEN_RECORDS_IN_MEMORY = 100_000
+
+# Report lines buffered per compressor call
+REPORT_WRITE_LINES = 500
+
+def sniff_encoding(fileobj) -> str:
+    """
+    Pick a text encoding for an uploaded CSV from its first bytes.
+    Honors UTF-8/UTF-16 byte order marks, otherwise falls back to
+    cp1252 when the head of the file is not valid UTF-8.
+    """
+    head = fileobj.read(ENCODING_SNIFF_BYTES)
+    fileobj.seek(0)
+
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+
+    try:
+        # Incremental decode so a character split at the sniff boundary is not an error
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+def iter_csv_rows(fileobj) -> Iterator[List[str]]:
+    """
+    Stream rows (header first) out of a binary CSV file object without
+    loading it into memory. Decoding happens incrementally as the csv
+    reader pulls lines.
+    """
+    encoding = sniff_encoding(fileobj)
+    text = io.TextIOWrapper(fileobj, encoding=encoding, errors="ignore", newline="")
+    try:
+        yield from csv.reader(text)
+    finally:
+        # Leave the underlying upload open - FastAPI closes it after the request.
+        # A run that failed midway may already have closed it.
+        if not fileobj.closed:
+            text.detach()
+
+# Bump when the importer's handling of a row changes, so earlier runs'
+# fingerprints stop matching and every row is processed again
+ROW_FINGERPRINT_VERSION = "1"
+
+def row_fingerprint(row: List[str]) -> str:
+    """Stable digest of a raw CSV row, recorded once the row's session is written"""
+    raw = ROW_FINGERPRINT_VERSION + "\x1f" + "\x1f".join(cell.strip() for cell in row)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+def seen_row_fingerprints(fingerprints: List[str]) -> Dict[str, str]:
+    """Fingerprints already recorded by import runs, mapped to the run that recorded each"""
+    seen = {}
+    for chunk in _chunks(fingerprints, IN_FILTER_CHUNK_SIZE):
+        result = execute(SB.table("import_row_fingerprints").select("fingerprint, run_id").in_("fingerprint", chunk))
+        seen.update((row["fingerprint"], row["run_id"]) for row in result.data or [])
+    return seen
+
+# Header aliases per importer field, in order of preference. Covers the current
+# SimplePractice export ("Date of Service", "Clinician", "Primary Insurance"),
+# the older one ("Date added", "Primary clinician", ...) and snake_case columns.
+SIMPLEPRACTICE_COLUMNS = {
+    "client_name": ("Client", "client"),
+    "service_date": ("Date of Service", "Date added", "service_date"),
+    "provider_name": ("Clinician", "Primary clinician", "provider"),
+    "start_time": ("Start time", "start_time"),
+    "end_time": ("End time", "end_time"),
+    "minutes": ("Minutes", "minutes"),
+    "primary_insurance": ("Primary Insurance", "Primary insurance", "insurance"),
+    "billing_route": ("Billing route", "billing_route"),
+    "status": ("Status", "status"),
+}
+
+# Values for fields whose column is absent from the file
+SIMPLEPRACTICE_DEFAULTS = {"billing_route": "simplepractice"}
+
+class SimplePracticeLayout:
+    """
+    Column positions for each importer field, resolved once from the CSV
+    header so rows can be read as plain lists.
+    """
+
+    def __init__(self, header: List[str]):
+        self.header = header
+
+        # Later columns win on repeated names, as with csv.DictReader
+        positions = {name: index for index, name in enumerate(header)}
+
+        self.columns: Dict[str, Optional[int]] = {}
+        for field, aliases in SIMPLEPRACTICE_COLUMNS.items():
+            self.columns[field] = next((positions[alias] for alias in aliases if alias in positions), None)
+
+        self.fields = [
+            (index, SIMPLEPRACTICE_DEFAULTS.get(field, ""))
+            for field, index in self.columns.items()
+        ]
+        self.width = max((index for index in self.columns.values() if index is not None), default=-1) + 1
+
+    def extract(self, row: List[str]) -> List[str]:
+        """Stripped values in SIMPLEPRACTICE_COLUMNS order"""
+        if len(row) < self.width:
+            raise ValueError(f"Row has {len(row)} columns, expected at least {self.width}")
+        return [row[index].strip() if index is not None else default for index, default in self.fields]
+
+    def as_dict(self, row: List[str]) -> Dict[str, Optional[str]]:
+        """The row keyed by header, for storing the raw line in import_staging"""
+        record: Dict[str, Optional[str]] = dict.fromkeys(self.header)
+        record.update(zip(self.header, row))
+        return record
+
+def import_report_path(run_id: str) -> str:
+    return f"{run_id}.ndjson.gz"
+
+def import_upload_path(run_id: str) -> str:
+    return f"{run_id}.csv"
+
+class ImportReport:
+    """
+    Every rejected, flagged and duplicate row of a run, one JSON object per
+    line, gzip-compressed as it is written so memory stays flat.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.buffer = tempfile.SpooledTemporaryFile(max_size=REPORT_SPOOL_BYTES)
+        self.gzip = gzip.GzipFile(fileobj=self.buffer, mode="wb", compresslevel=6)
+
+        # Encoded lines waiting to be compressed in one call
+        self.lines: List[str] = []
+
+    def add(self, kind: str, row_num: Optional[int], **fields):
+        entry = {"row": row_num, "type": kind, **fields}
+        self.add_line(json.dumps(entry, default=str))
+
+    def add_line(self, line: str):
+        """Append an already encoded entry, e.g. one carried over from an earlier attempt"""
+        self.lines.append(line)
+        self.rows += 1
+        if len(self.lines) >= REPORT_WRITE_LINES:
+            self._write_lines()
+
+    def _write_lines(self):
+        if self.lines:
+            self.gzip.write(("\n".join(self.lines) + "\n").encode("utf-8"))
+            self.lines = []
+
+    def finish(self) -> bytes:
+        """Close the gzip stream and return the compressed report"""
+        self._write_lines()
+        self.gzip.close()
+        self.buffer.seek(0)
+        data = self.buffer.read()
+        self.buffer.close()
+        return data
+
+    def close(self):
+        self.gzip.close()
+        self.buffer.close()
+
+class SeenRecords:
+    """
+    Row keys (hashes) seen so far in a run, for duplicate detection. Past
+    SEEN_RECORDS_IN_MEMORY keys they move to a temporary SQLite database, so
+    memory stays flat however long the export is.
+    """
+
+    def __init__(self, memory_limit: Optional[int] = None):
+        self.memory_limit = memory_limit or SEEN_RECORDS_IN_MEMORY
+        self.keys: set = set()
+        self.db: Optional[sqlite3.Connection] = None
+
+    def __contains__(self, key: int) -> bool:
+        if key in self.keys:
+            return True
+        return self.db is not None and self.db.execute("SELECT 1 FROM seen WHERE key = ?", (key,)).fetchone() is not None
+
+    def add(self, key: int):
+        self.keys.add(key)
+        if len(self.keys) >= self.memory_limit:
+            self._spill()
+
+    def _spill(self):
+        if self.db is None:
+            # An empty name is a private on-disk database, deleted when closed
+            self.db = sqlite3.connect("", check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode = OFF")
+            self.db.execute("PRAGMA synchronous = OFF")
+            self.db.execute("CREATE TABLE seen (key INTEGER PRIMARY KEY)")
+        self.db.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((key,) for key in self.keys))
+        self.keys = set()
+
+def parse_simplepractice_row(layout: SimplePracticeLayout, row: List[str]) -> Dict[str, Any]:
+    """
+    Normalize one export row without touching the database or any run state.
+    formatted_date (and minutes) are only filled in for rows that have a
+    client, clinician and valid date; raises ValueError for truncated rows.
+    """
+    # Extract fields (column positions cover BOTH SimplePractice CSV formats)
+    (client_name, service_date, provider_name, start_time, end_time,
+     minutes_str, primary_insurance, billing_route, status) = layout.extract(row)
+
+    # Parse start_time from "Date of Service" if needed (format: "10/06/2025 12:00")
+    if not start_time and service_date and " " in service_date:
+        # Extract time from "MM/DD/YYYY HH:MM" format
+        service_date, start_time = service_date.split(" ", 1)
+
+    # Normalize time format - ensure it's in HH:MM format
+    if start_time:
+        start_time = normalize_start_time(start_time)
+
+    fields = {
+        "client_name": client_name,
+        "service_date": service_date,
+        "provider_name": provider_name,
+        "start_time": start_time,
+        "primary_insurance": primary_insurance,
+        "billing_route": billing_route,
+        "status": status,
+        "formatted_date": None,
+        "minutes": None,
+    }
+
+    if client_name and provider_name and service_date:
+        # Convert date format if needed (MM/DD/YYYY to YYYY-MM-DD)
+        fields["formatted_date"] = parse_service_date(service_date)
+
+        # Calculate minutes from times if not provided
+        if fields["formatted_date"] is not None:
+            if minutes_str and minutes_str.isdigit():
+                fields["minutes"] = int(minutes_str)
+            else:
+                fields["minutes"] = parse_time_to_minutes(start_time, end_time)
+
+    return fields
+
+def parse_simplepractice_file(path: str, chunk_size: int = IMPORT_BATCH_SIZE) -> Iterator[Any]:
+    """
+    Read and normalize an export file as a stream: the header first (None
+    for an empty file), then lists of up to chunk_size
+    (row_num, row, fingerprint, fields, error) tuples, one per non-blank row.
+    """
+    with open(path, "rb") as fileobj:
+        rows = iter_csv_rows(fileobj)
+        header = next(rows, None)
+        yield header
+        if header is None:
+            return
+
+        layout = SimplePracticeLayout(header)
+        chunk = []
+        row_num = 1  # Data rows start at 2 to account for header
+        for row in rows:
+            # Skip blank lines, as csv.DictReader does
+            if not row:
+                continue
+            row_num += 1
+            try:
+                chunk.append((row_num, row, row_fingerprint(row), parse_simplepractice_row(layout, row), None))
+            except Exception as e:
+                chunk.append((row_num, row, row_fingerprint(row), None, str(e)))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+def stage_parsed_file(path: str, chunk_size: int) -> str:
+    """
+    Runs in the batch import's process pool: pickles parse_simplepractice_file's
+    stream chunk by chunk into a temp file and returns its path. Only the path
+    goes back to the parent, which reads the chunks one at a time with
+    read_staged_file, so neither process holds a whole parsed export.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".parsed", delete=False) as staged:
+        try:
+            for item in parse_simplepractice_file(path, chunk_size):
+                pickle.dump(item, staged, protocol=pickle.HIGHEST_PROTOCOL)
+        except BaseException:
+            staged.close()
+            os.unlink(staged.name)
+            raise
+    return staged.name
+
+def read_staged_file(staged: "Future[str]") -> Iterator[Any]:
+    """Stream a stage_parsed_file back once its worker is done, deleting it once read (or abandoned)"""
+    path = staged.result()
+    try:
+        with open(path, "rb") as fileobj:
+            while True:
+                try:
+                    yield pickle.load(fileobj)
+                except EOFError:
+                    return
+    finally:
+        discard_staged_file(staged)
+
+def discard_staged_file(staged: "Future[str]"):
+    if staged.cancelled() or staged.exception() is not None:
+        return
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(staged.result())
+
+# Per-row problems logged at their own level per run before dropping to debug
+ROW_LOG_SAMPLE = 10
+
+# Stages timed by SimplePracticeImporter.stage_timings
+IMPORT_STAGES = ("parse", "fingerprints", "resolve", "write", "staging")
+
+class SimplePracticeImporter:
+    """
+    Streams SimplePractice CSV rows through validation, bulk entity
+    resolution and batched session writes. Memory is bounded by the batch
+    size plus a compact fingerprint per distinct row for duplicate detection.
+    A dry run (no run_id) does every lookup but writes nothing.
+    """
+
+    def __init__(self, run_id: Optional[str], batch_size: int = IMPORT_BATCH_SIZE, dry_run: bool = False):
+        self.run_id = run_id
+        self.batch_size = max(1, batch_size)
+        self.dry_run = dry_run
+        self.resolver = ReferenceResolver(dry_run)
+        self.writer = SessionBatchWriter(batch_size, dry_run)
+
+        self.total = self.flagged = self.duplicates = self.errors = 0
+        self.errors_list: List[Dict[str, Any]] = []
+        self.flagged_preview: List[Dict[str, Any]] = []
+
+        # Track seen records for duplicate detection (hashed to keep entries small)
+        self.seen_records = SeenRecords()
+
+        # Rows that passed validation, written once their entities are resolved
+        self.pending: List[Dict[str, Any]] = []
+
+        # Flagged rows for import_staging, inserted in bulk with each batch
+        self.staging: List[Dict[str, Any]] = []
+
+        # Complete error/flag report (errors_list only keeps the first few)
+        self.report = ImportReport()
+
+        # Column mapping, compiled from the header when the run starts
+        self.layout: Optional[SimplePracticeLayout] = None
+
+        # Rows already imported by earlier runs are skipped by fingerprint
+        self.skipped = 0
+        self.fingerprints_enabled = True
+        self.row_fingerprints: Dict[int, str] = {}  # row number -> fingerprint, until written
+
+        # Seconds spent per stage; "parse" is whatever the other stages don't cover
+        # (reading, decoding and validating rows)
+        self.stage_timings: Dict[str, float] = dict.fromkeys(IMPORT_STAGES, 0.0)
+
+        # Per-row problems logged so far (see _log_row)
+        self.row_logs = 0
+
+        # Last row committed and recorded on import_runs; a resumed run starts after it
+        self.checkpoint_row = 0
+        self.resume_after = 0
+        self.saved_checkpoint: Optional[Dict[str, Any]] = None
+        # Writer counters as of the last batch whose row fingerprints were recorded.
+        # A failed run saves them with its checkpoint: on resume, the rows it wrote
+        # past the checkpoint are found by fingerprint and not counted again.
+        self.fingerprinted_counts: Optional[Dict[str, int]] = None
+        self.upload_path: Optional[str] = None  # Stored copy of the upload, recorded with each checkpoint
+
+    @property
+    def inserted(self) -> int:
+        return self.writer.inserted
+
+    @property
+    def updated(self) -> int:
+        return self.writer.updated
+
+    @property
+    def unchanged(self) -> int:
+        return self.writer.unchanged
+
+    @contextlib.contextmanager
+    def _timed(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_timings[stage] += time.perf_counter() - started
+
+    @contextlib.contextmanager
+    def _parse_time(self):
+        """Count a block as "parse", minus the time other stages account for inside it"""
+        def timed() -> float:
+            return sum(seconds for stage, seconds in self.stage_timings.items() if stage != "parse")
+
+        started, timed_before = time.perf_counter(), timed()
+        try:
+            yield
+        finally:
+            inner = timed() - timed_before
+            self.stage_timings["parse"] += max(0.0, time.perf_counter() - started - inner)
+
+    def run(self, rows: Iterable[List[str]]):
+        """Process every row (header first), flushing resolution and writes batch by batch"""
+        with self._parse_time():
+            self._run(rows)
+
+    def accept_parsed(self, export: Iterator[Any]):
+        """
+        Take in a file already normalized by parse_simplepractice_file, chunk
+        by chunk: skip rows earlier runs imported, then resolve and write
+        each batch as it fills, as run() does for raw rows.
+        """
+        with self._parse_time():
+            header = next(export, None)
+            if header is None:
+                return
+            self.layout = SimplePracticeLayout(header)
+
+            for chunk in export:
+                seen = self._seen_fingerprints([fingerprint for _, _, fingerprint, _, _ in chunk])
+                for row_num, row, fingerprint, fields, error in chunk:
+                    self.total += 1
+                    if error is not None:
+                        self._log_row(logging.ERROR, f"Error processing row {row_num}: {error}")
+                        self._record_error(row_num, error)
+                    else:
+                        self._accept_row(row_num, row, fingerprint, fields, seen.get(fingerprint))
+                    if len(self.pending) >= self.batch_size:
+                        self._write_pending()
+                    if len(self.staging) >= self.batch_size:
+                        self._flush_staging()
+
+    def finish(self):
+        """Write everything still pending and flush the remaining buffers"""
+        with self._parse_time():
+            self._write_pending()
+            with self._timed("write"):
+                self.writer.flush()
+            self._flush_staging()
+            self._record_fingerprints()
+
+    def _run(self, rows: Iterable[List[str]]):
+        rows = iter(rows)
+        header = next(rows, None)
+        if header is None:
+            return
+        self.layout = SimplePracticeLayout(header)
+
+        row_num = 1  # Data rows start at 2 to account for header
+        chunk: List[tuple] = []
+        for row in rows:
+            # Skip blank lines, as csv.DictReader does
+            if not row:
+                continue
+            row_num += 1
+            if row_num <= self.resume_after:
+                # Committed before the checkpoint - only needed for duplicate detection
+                self._remember_row(row)
+                continue
+            chunk.append((row_num, row))
+            if len(chunk) >= self.batch_size:
+                self._process_rows(chunk)
+                chunk = []
+
+        self._process_rows(chunk)
+        self.finish()
+
+    def _process_rows(self, chunk: List[tuple]):
+        """Parse a chunk of raw rows, skipping any an earlier run already imported"""
+        if not chunk:
+            return
+
+        fingerprints = [row_fingerprint(row) for _, row in chunk]
+        seen = self._seen_fingerprints(fingerprints)
+
+        for (row_num, row), fingerprint in zip(chunk, fingerprints):
+            self.total += 1
+            self._parse_row(row_num, row, fingerprint, imported_by=seen.get(fingerprint))
+            if len(self.pending) >= self.batch_size:
+                self._write_pending()
+            if len(self.staging) >= self.batch_size:
+                self._flush_staging()
+
+        last_row = chunk[-1][0]
+        if self.run_id and not self.dry_run and last_row - self.checkpoint_row >= IMPORT_CHECKPOINT_ROWS:
+            self.checkpoint(last_row)
+
+    def _remember_row(self, row: List[str]):
+        """Add a row from before the checkpoint to seen_records without processing it again"""
+        try:
+            fields = parse_simplepractice_row(self.layout, row)
+        except Exception:
+            return
+        self.seen_records.add(hash((fields["client_name"], fields["service_date"],
+                                    fields["start_time"], fields["provider_name"])))
+
+    def checkpoint(self, row_num: int):
+        """Commit everything up to row_num, then record it on import_runs as the point to resume from"""
+        self._write_pending()
+        with self._timed("write"):
+            self.writer.flush()
+        self._flush_staging()
+        self._record_fingerprints()
+
+        state = self.checkpoint_state(row_num)
+        try:
+            with self._timed("write"):
+                execute(SB.table("import_runs").update({
+                    "checkpoint": state,
+                    "upload_path": self.upload_path
+                }).eq("id", self.run_id))
+            self.checkpoint_row = row_num
+            self.saved_checkpoint = state
+        except Exception as e:
+            logger.error(f"Could not record checkpoint at row {row_num} for run {self.run_id}: {e}")
+
+    def checkpoint_state(self, row_num: int) -> Dict[str, Any]:
+        return {
+            "row": row_num,
+            "total": self.total,
+            "inserted": self.writer.inserted,
+            "updated": self.writer.updated,
+            "unchanged": self.writer.unchanged,
+            "flagged": self.flagged,
+            "duplicates": self.duplicates,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "errors_detail": list(self.errors_list),
+            "flagged_preview": list(self.flagged_preview),
+        }
+
+    def writer_counts(self) -> Dict[str, int]:
+        return {"inserted": self.writer.inserted, "updated": self.writer.updated, "unchanged": self.writer.unchanged}
+
+    def failure_checkpoint(self) -> Optional[Dict[str, Any]]:
+        """The checkpoint a failed run leaves to resume from: the last one, plus what was written since"""
+        if self.fingerprinted_counts is None:
+            return self.saved_checkpoint
+        base = self.saved_checkpoint or {
+            **dict.fromkeys(("row", "total", "inserted", "updated", "unchanged", "flagged",
+                             "duplicates", "skipped", "errors"), 0),
+            "errors_detail": [], "flagged_preview": [],
+        }
+        return {**base, "written": self.fingerprinted_counts}
+
+    def restore(self, state: Dict[str, Any]):
+        """Pick up the counters of a checkpoint; rows up to it are not processed again"""
+        self.checkpoint_row = self.resume_after = state["row"]
+        self.saved_checkpoint = state
+        self.total = state["total"]
+        # Sessions written after the checkpoint by the failed attempt count as written then
+        written = state.get("written") or state
+        self.writer.inserted = written["inserted"]
+        self.writer.updated = written["updated"]
+        self.writer.unchanged = written["unchanged"]
+        self.flagged = state["flagged"]
+        self.duplicates = state["duplicates"]
+        self.skipped = state["skipped"]
+        self.errors = state["errors"]
+        self.errors_list = state["errors_detail"]
+        self.flagged_preview = state["flagged_preview"]
+
+    def _seen_fingerprints(self, fingerprints: List[str]) -> Dict[str, str]:
+        if not SB or not self.fingerprints_enabled:
+            return {}
+
+        try:
+            with self._timed("fingerprints"):
+                return seen_row_fingerprints(sorted(set(fingerprints)))
+        except Exception as e:
+            # Import everything rather than fail - e.g. the fingerprint table is missing
+            logger.error(f"✗ Row fingerprint lookup failed, importing without it: {e}")
+            self.fingerprints_enabled = False
+            return {}
+
+    def _record_fingerprints(self):
+        """Record fingerprints of rows whose sessions were written in one request"""
+        written, self.writer.written = self.writer.written, []
+        fingerprints = {self.row_fingerprints.pop(row_num) for row_num in written if row_num in self.row_fingerprints}
+        if not fingerprints or not SB or not self.fingerprints_enabled or self.dry_run:
+            return
+
+        try:
+            with self._timed("fingerprints"):
+                execute(SB.table("import_row_fingerprints").upsert(
+                    [{"fingerprint": fingerprint, "run_id": self.run_id} for fingerprint in sorted(fingerprints)],
+                    on_conflict="fingerprint",
+                    ignore_duplicates=True
+                ))
+            self.fingerprinted_counts = self.writer_counts()
+        except Exception as e:
+            logger.error(f"Could not record {len(fingerprints)} row fingerprints: {e}")
+
+    def _log_row(self, level: int, message: str):
+        """Log a per-row problem; past the first few per run they go to debug (the report has them all)"""
+        self.row_logs += 1
+        if self.row_logs == ROW_LOG_SAMPLE + 1:
+            logger.warning(f"Run {self.run_id}: further row problems logged at debug level only")
+        logger.log(level if self.row_logs <= ROW_LOG_SAMPLE else logging.DEBUG, message)
+
+    def _record_error(self, row_num: Optional[int], message: str):
+        self.errors += 1
+        self.report.add("error", row_num, error=message)
+        if len(self.errors_list) < ERROR_DETAIL_LIMIT:
+            entry = {"row": row_num, "error": message} if row_num is not None else {"error": message}
+            self.errors_list.append(entry)
+
+    def _record_flag(self, row_num: int, reason: str, raw: Optional[Dict[str, str]] = None, **details):
+        self.flagged += 1
+        self.report.add("flagged", row_num, reason=reason, **details)
+        if raw is not None:
+            self.staging.append({"run_id": self.run_id, "raw": raw, "reason": reason})
+
+    def _flush_staging(self):
+        """Insert the buffered import_staging rows in one request"""
+        if not self.staging:
+            return
+
+        rows, self.staging = self.staging, []
+        if not SB or self.dry_run:
+            return
+
+        try:
+            with self._timed("staging"):
+                execute(SB.table("import_staging").insert(rows))
+        except Exception as e:
+            logger.error(f"Could not save {len(rows)} rows to staging: {e}")
+
+    def _parse_row(self, row_num: int, row: List[str], fingerprint: Optional[str] = None,
+                   imported_by: Optional[str] = None):
+        try:
+            fields = parse_simplepractice_row(self.layout, row)
+        except Exception as e:
+            self._log_row(logging.ERROR, f"Error processing row {row_num}: {str(e)}")
+            self._record_error(row_num, str(e))
+            return
+        self._accept_row(row_num, row, fingerprint, fields, imported_by)
+
+    def _accept_row(self, row_num: int, row: List[str], fingerprint: Optional[str],
+                    fields: Dict[str, Any], imported_by: Optional[str]):
+        """Duplicate, already-imported and validation checks for a normalized row"""
+        client_name = fields["client_name"]
+        service_date = fields["service_date"]
+        provider_name = fields["provider_name"]
+        start_time = fields["start_time"]
+
+        try:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Processing row {row_num}: {client_name} - {provider_name} - {service_date}")
+
+            # Check for duplicates
+            record_key = hash((client_name, service_date, start_time, provider_name))
+            if record_key in self.seen_records:
+                self.duplicates += 1
+                self.report.add("duplicate", row_num, client_name=client_name, provider_name=provider_name,
+                                service_date=service_date, start_time=start_time)
+                self._log_row(logging.WARNING, f"Duplicate record found at row {row_num}: {(client_name, service_date, start_time, provider_name)}")
+                return
+            self.seen_records.add(record_key)
+
+            # Written by an earlier run - still tracked above so in-file duplicates match the original import.
+            # Rows this run wrote before it failed are already in the counters restored on resume.
+            if imported_by is not None:
+                if imported_by != self.run_id:
+                    self.skipped += 1
+                return
+
+            # Validate required fields
+            if not client_name or not provider_name or not service_date:
+                details = []
+                if not client_name:
+                    details.append("client")
+                if not provider_name:
+                    details.append("provider")
+                if not service_date:
+                    details.append("date")
+
+                reason = f"missing_{', '.join(details)}"
+                self._record_flag(row_num, reason, raw=self.layout.as_dict(row), client_name=client_name,
+                                  provider_name=provider_name, service_date=service_date)
+                if len(self.flagged_preview) < 10:
+                    self.flagged_preview.append({
+                        "reason": reason,
+                        "client_name": client_name or "Unknown",
+                        "provider_name": provider_name or "Unknown",
+                        "service_date": service_date or "Unknown",
+                        "row": row_num
+                    })
+
+                self._log_row(logging.WARNING, f"Row {row_num} flagged: missing {', '.join(details)}")
+                return
+
+            formatted_date = fields["formatted_date"]
+            if formatted_date is None:
+                self._log_row(logging.ERROR, f"Invalid date format at row {row_num}: {service_date}")
+                self._record_error(row_num, f"Invalid date format: {service_date}")
+                return
+
+            # Defer entity resolution so names are looked up in bulk per batch
+            self.pending.append({
+                "row_num": row_num,
+                "row": row,
+                "fingerprint": fingerprint,
+                "client_name": client_name,
+                "provider_name": provider_name,
+                "formatted_date": formatted_date,
+                "start_time": start_time,
+                "minutes": fields["minutes"],
+                "primary_insurance": fields["primary_insurance"],
+                "billing_route": fields["billing_route"],
+                "status": fields["status"],
+            })
+
+        except Exception as e:
+            self._log_row(logging.ERROR, f"Error processing row {row_num}: {str(e)}")
+            self._record_error(row_num, str(e))
+
+    def _write_pending(self):
+        if not self.pending:
+            return
+
+        batch, self.pending = self.pending, []
+
+        # Resolve every distinct provider, client and payer in a few bulk queries
+        with self._timed("resolve"):
+            self.resolver.resolve(batch)
+
+        with self._timed("write"):
+            for record in batch:
+                self._write_record(record)
+
+        self._record_fingerprints()
+
+    def _write_record(self, record: Dict[str, Any]):
+        row_num = record["row_num"]
+        row = record["row"]
+        client_name = record["client_name"]
+        provider_name = record["provider_name"]
+        formatted_date = record["formatted_date"]
+        primary_insurance = record["primary_insurance"]
+
+        try:
+            provider_id = self.resolver.providers.get(provider_name)
+            if not provider_id:
+                self._log_row(logging.ERROR, f"Could not create provider: {provider_name}")
+                self._record_flag(row_num, "provider_creation_failed", provider_name=provider_name)
+                return
+
+            client_id = self.resolver.clients.get(client_name)
+            if not client_id:
+                self._log_row(logging.ERROR, f"Could not create client: {client_name}")
+                self._record_flag(row_num, "client_creation_failed", client_name=client_name)
+                return
+
+            # Handle insurance/payer - auto-created during resolution if possible
+            payer_id = None
+            if primary_insurance:
+                payer_id = self.resolver.payer_id(primary_insurance)
+
+                # If payer creation STILL failed (rare), flag it
+                if not payer_id:
+                    self._log_row(logging.ERROR, f"Failed to create payer at row {row_num}: {primary_insurance}")
+
+                    # Store in staging for team review
+                    self._record_flag(row_num, f"payer_creation_failed: {primary_insurance}", raw=self.layout.as_dict(row),
+                                      client_name=client_name, provider_name=provider_name,
+                                      service_date=formatted_date)
+                    if len(self.flagged_preview) < 10:
+                        self.flagged_preview.append({
+                            "reason": "payer_creation_failed",
+                            "client_name": client_name,
+                            "provider_name": provider_name,
+                            "service_date": formatted_date,
+                            "insurance": primary_insurance,
+                            "row": row_num
+                        })
+                    return
+            # If no insurance, leave payer_id as None (self-pay)
+
+            # Determine note submission status
+            note_submitted = record["status"].lower() in ["completed", "submitted", "finalized", "complete"]
+
+            # Prepare session data (only include fields that exist in the sessions table)
+            session_data = {
+                "provider_id": provider_id,
+                "client_id": client_id,
+                "session_date": formatted_date,
+                "start_time": record["start_time"],  # Already normalized above
+                "minutes": record["minutes"],
+                "note_submitted": note_submitted,
+                "billing_status": "completed" if note_submitted else "pending",
+                "amount_billed": 160.0  # Default amount
+            }
+
+            # Add payer ID if available (commented out until database schema is updated)
+            # if payer_id:
+            #     session_data["payer_id"] = payer_id
+
+        except Exception as e:
+            self._log_row(logging.ERROR, f"Error processing row {row_num}: {str(e)}")
+            self._record_error(row_num, str(e))
+            return
+
+        # Queue for the batched upsert on the session's natural key - outside
+        # the try, so a failed batch write fails the run rather than this row
+        if record["fingerprint"]:
+            self.row_fingerprints[row_num] = record["fingerprint"]
+        self.writer.add(row_num, session_data)
+
+    def result(self) -> ImportResult:
+        if self.dry_run:
+            return self.preview()
+        return ImportResult(
+            success=True,
+            run_id=self.run_id,
+            total=self.total,
+            inserted=self.inserted,
+            updated=self.updated,
+            flagged=self.flagged,
+            duplicates=self.duplicates,
+            errors=self.errors,
+            flagged_preview=self.flagged_preview,
+            errors_detail=self.errors_list,
+            report_rows=self.report.rows,
+            skipped=self.skipped,
+            unchanged=self.unchanged,
+            status="completed",
+            message=f"Successfully imported {self.inserted} new sessions, updated {self.updated} existing sessions"
+                    + (f", {self.unchanged} already up to date" if self.unchanged else "")
+                    + (f", skipped {self.skipped} rows already imported" if self.skipped else "")
+        )
+
+    def preview(self) -> ImportResult:
+        """What a dry run would have written, with sample sessions named rather than by id"""
+        providers = {v: k for k, v in self.resolver.providers.items()}
+        clients = {v: k for k, v in self.resolver.clients.items()}
+        samples = {
+            outcome: [
+                {
+                    "provider_name": providers.get(s.pop("provider_id")),
+                    "client_name": clients.get(s.pop("client_id")),
+                    **s
+                }
+                for s in map(dict, rows)
+            ]
+            for outcome, rows in self.writer.samples.items()
+        }
+        samples["flagged"] = self.flagged_preview
+
+        new_entities = self.resolver.new_entities
+        would_create = ", ".join(f"{len(names)} {table}" for table, names in new_entities.items() if names)
+        return ImportResult(
+            success=True,
+            total=self.total,
+            inserted=self.inserted,
+            updated=self.updated,
+            flagged=self.flagged,
+            duplicates=self.duplicates,
+            errors=self.errors,
+            flagged_preview=self.flagged_preview,
+            errors_detail=self.errors_list,
+            report_rows=self.report.rows,
+            skipped=self.skipped,
+            unchanged=self.unchanged,
+            dry_run=True,
+            new_entities=new_entities,
+            samples=samples,
+            status="completed",
+            message=f"Dry run: would import {self.inserted} new sessions, update {self.updated} existing sessions"
+                    + (f", leave {self.unchanged} unchanged" if self.unchanged else "")
+                    + (f", skip {self.skipped} rows already imported" if self.skipped else "")
+                    + (f" and create {would_create}" if would_create else "")
+                    + ". Nothing was written."
+        )
+
+def preview_simplepractice(upload) -> ImportResult:
+    """Dry-run an upload through the importer and return what it would do"""
+    importer = SimplePracticeImporter(None, dry_run=True)
+    started = time.perf_counter()
+    try:
+        importer.run(iter_csv_rows(upload))
+        return importer.result()
+    finally:
+        importer.report.close()
+        upload.close()
+        logger.info(f"Dry run of {importer.total} rows took {time.perf_counter() - started:.2f}s")
+
+# Worker threads that run queued imports (override with IMPORT_WORKERS)
+IMPORT_WORKERS = int(os.environ.get("IMPORT_WORKERS", "2"))
+IMPORT_EXECUTOR = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="import")
+
+# Finished jobs kept in memory for status polling; older ones fall back to import_runs
+IMPORT_JOBS_RETAINED = 50
+
+# Seconds between sweeps for expired uploads
+UPLOAD_PURGE_INTERVAL_SECONDS = 3600
+
+# First sweep an interval after startup, keeping it off the first import's path
+_last_upload_purge = time.monotonic()
+
+def purge_expired_uploads():
+    """Remove stored uploads older than IMPORT_UPLOAD_RETENTION_DAYS; their runs can no longer be resumed"""
+    global _last_upload_purge
+    if not SB or time.monotonic() - _last_upload_purge < UPLOAD_PURGE_INTERVAL_SECONDS:
+        return
+    _last_upload_purge = time.monotonic()
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=IMPORT_UPLOAD_RETENTION_DAYS)
+    try:
+        result = execute(SB.table("import_runs").select("id, upload_path")
+                         .not_.is_("upload_path", "null")
+                         .lt("started_at", cutoff.isoformat())
+                         .limit(100))
+        if not result.data:
+            return
+
+        timed_call(SB.storage.from_(IMPORT_UPLOADS_BUCKET).remove, [run["upload_path"] for run in result.data])
+        execute(SB.table("import_runs").update({"upload_path": None}).in_("id", [run["id"] for run in result.data]))
+        logger.info(f"Removed {len(result.data)} expired import uploads")
+    except Exception as e:
+        logger.error(f"Could not purge expired import uploads: {e}")
+
+class ImportJob:
+    """An import run executing (or queued) on the in-process worker pool"""
+
+    def __init__(self, run_id: str, file_name: str, upload, checkpoint: Optional[Dict[str, Any]] = None):
+        self.run_id = run_id
+        self.file_name = file_name
+        self.upload = upload
+        self.upload.seek(0, os.SEEK_END)
+        self.bytes_total = self.upload.tell()
+        self.upload.seek(0)
+
+        self.status = "queued"
+        self.importer = SimplePracticeImporter(run_id)
+        self.result: Optional[ImportResult] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+        # Resuming an earlier attempt of this run from its last checkpoint
+        self.checkpoint = checkpoint
+        if checkpoint:
+            self.importer.restore(checkpoint)
+
+    def run(self) -> ImportResult:
+        """Run the import to completion and record the outcome on import_runs"""
+        self.start()
+        try:
+            if self.checkpoint:
+                self._restore_report()
+            else:
+                self._store_upload()
+            self.importer.run(iter_csv_rows(self.upload))
+            self.complete()
+        except Exception as e:
+            self.fail(e)
+        finally:
+            self.finalize()
+        return self.result
+
+    def start(self):
+        self.status = "running"
+        self.started_at = time.monotonic()
+
+    def complete(self):
+        """Record a finished import's counters on import_runs"""
+        importer = self.importer
+        try:
+            # Update import run with results
+            execute(SB.table("import_runs").update({
+                "finished_at": datetime.now(timezone.utc).isoformat(),
+                "total_rows": importer.total,
+                "inserted_rows": importer.inserted,
+                "updated_rows": importer.updated,
+                "flagged_rows": importer.flagged,
+                "skipped_rows": importer.skipped,
+                "unchanged_rows": importer.unchanged,
+                "duplicate_rows": importer.duplicates,
+                "error_rows": importer.errors,
+                "stage_timings": self.stage_timings(),
+                "checkpoint": None,
+                "upload_path": importer.upload_path,
+                "errors": importer.errors_list  # Limited to the first ERROR_DETAIL_LIMIT errors
+            }).eq("id", self.run_id))
+
+            self.result = importer.result()
+            self.status = "completed"
+        except Exception as e:
+            self.fail(e)
+
+    def fail(self, e: Exception):
+        logger.error(f"Fatal error during import: {str(e)}")
+
+        # Update import run with error
+        try:
+            execute(SB.table("import_runs").update({
+                "finished_at": datetime.now(timezone.utc).isoformat(),
+                "stage_timings": self.stage_timings(),
+                "checkpoint": self.importer.failure_checkpoint(),
+                "upload_path": self.importer.upload_path,
+                "errors": [{"error": str(e)}]
+            }).eq("id", self.run_id))
+        except Exception as update_error:
+            logger.error(f"Could not record failure on import run {self.run_id}: {update_error}")
+
+        self.result = ImportResult(
+            success=False,
+            run_id=self.run_id,
+            status="failed",
+            message=f"Import failed: {str(e)}",
+            errors=1
+        )
+        self.status = "failed"
+
+    def finalize(self):
+        """Save the report and release the upload, whatever the outcome"""
+        self._save_report()
+        self.finished_at = time.monotonic()
+        self.upload.close()
+        self._log_summary()
+        self._record_metrics()
+        self._publish()
+        purge_expired_uploads()
+
+    def _publish(self):
+        """Tell /api/events listeners the run finished, with the change cursor to sync to"""
+        if not CHANGE_FEED.listeners:
+            return
+        try:
+            cursor = session_change_cursor()["cursor"]
+        except Exception as e:
+            logger.error(f"Could not read the session change cursor: {e}")
+            cursor = None
+        CHANGE_FEED.publish("import-completed", {
+            "run_id": self.run_id,
+            "status": self.status,
+            "inserted": self.importer.inserted,
+            "updated": self.importer.updated,
+            "cursor": cursor,
+        })
+
+    def _store_upload(self):
+        """Keep the uploaded CSV in storage so a failed run can be resumed (recorded with the next update of the run)"""
+        path = import_upload_path(self.run_id)
+        try:
+            # A plain reader over the spooled file, so the request body is streamed from disk
+            self.upload.seek(0)
+            with open(self.upload.fileno(), "rb", closefd=False) as reader:
+                timed_call(
+                    SB.storage.from_(IMPORT_UPLOADS_BUCKET).upload,
+                    path,
+                    reader,
+                    {"content-type": "text/csv", "upsert": "true"}
+                )
+            self.importer.upload_path = path
+        except Exception as e:
+            logger.error(f"✗ Could not store the upload for run {self.run_id}; it can't be resumed: {e}")
+        finally:
+            self.upload.seek(0)
+
+    def _restore_report(self):
+        """Carry over the report entries of rows before the checkpoint from the failed attempt"""
+        try:
+            data = timed_call(SB.storage.from_(IMPORT_REPORTS_BUCKET).download, import_report_path(self.run_id))
+        except Exception:
+            return  # No report - that attempt had nothing to report
+
+        for line in gzip.decompress(data).decode("utf-8").splitlines():
+            row_num = json.loads(line).get("row")
+            if row_num is not None and row_num <= self.checkpoint["row"]:
+                self.importer.report.add_line(line)
+
+    def stage_timings(self) -> Dict[str, float]:
+        return {stage: round(seconds, 3) for stage, seconds in self.importer.stage_timings.items()}
+
+    def _log_summary(self):
+        importer = self.importer
+        elapsed = (self.finished_at or time.monotonic()) - (self.started_at or time.monotonic())
+        rate = importer.total / elapsed if elapsed > 0 else 0.0
+        stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in self.stage_timings().items())
+        logger.info(
+            f"Import {self.run_id} {self.status}: {importer.total} rows in {elapsed:.1f}s ({rate:.0f} rows/s) - "
+            f"{importer.inserted} inserted, {importer.updated} updated, {importer.unchanged} unchanged, "
+            f"{importer.skipped} skipped, {importer.flagged} flagged, {importer.duplicates} duplicates, "
+            f"{importer.errors} errors; {stages}"
+        )
+
+    def _record_metrics(self):
+        importer = self.importer
+        IMPORT_RUNS.inc(self.status)
+        for stage, seconds in importer.stage_timings.items():
+            IMPORT_STAGE_SECONDS.observe(stage, value=seconds)
+        for outcome in ("inserted", "updated", "unchanged", "skipped", "flagged", "duplicates", "errors"):
+            IMPORT_ROWS.inc(outcome, amount=getattr(importer, outcome))
+
+    def _save_report(self):
+        """Upload the full error/flag report (even for failed runs) to storage"""
+        report = self.importer.report
+        if not report.rows:
+            report.close()
+            return
+
+        try:
+            data = report.finish()
+            timed_call(
+                SB.storage.from_(IMPORT_REPORTS_BUCKET).upload,
+                import_report_path(self.run_id),
+                data,
+                {"content-type": "application/gzip", "upsert": "true"}
+            )
+            logger.info(f"✓ Saved import report for run {self.run_id}: {report.rows} rows, {len(data)} bytes")
+        except Exception as e:
+            logger.error(f"✗ Could not save import report for run {self.run_id}: {e}")
+
+    def progress(self) -> Dict[str, Any]:
+        """Snapshot of counters, throughput and ETA for the status endpoint"""
+        importer = self.importer
+        elapsed = 0.0
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.monotonic()) - self.started_at
+
+        bytes_processed = self.bytes_total
+        if self.status == "queued":
+            bytes_processed = 0
+        elif self.status == "running":
+            try:
+                bytes_processed = self.upload.tell()
+            except (ValueError, OSError):
+                pass
+
+        rows_per_second = importer.total / elapsed if elapsed > 0 else 0.0
+
+        eta_seconds = None
+        if self.status == "running" and bytes_processed > 0:
+            eta_seconds = round(elapsed * (self.bytes_total - bytes_processed) / bytes_processed, 1)
+        elif self.status in ("completed", "failed"):
+            eta_seconds = 0.0
+
+        return {
+            "run_id": self.run_id,
+            "status": self.status,
+            "file_name": self.file_name,
+            "rows_processed": importer.total,
+            "rows_per_second": round(rows_per_second, 1),
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": eta_seconds,
+            "bytes_processed": bytes_processed,
+            "bytes_total": self.bytes_total,
+            "inserted": importer.inserted,
+            "updated": importer.updated,
+            "unchanged": importer.unchanged,
+            "flagged": importer.flagged,
+            "duplicates": importer.duplicates,
+            "skipped": importer.skipped,
+            "errors": importer.errors,
+            "stage_timings": self.stage_timings(),
+            "result": self.result.model_dump() if self.result else None,
+        }
+
+# run_id -> job, in submission order
+IMPORT_JOBS: Dict[str, ImportJob] = {}
+
+def _prune_import_jobs():
+    """Drop the oldest finished jobs beyond IMPORT_JOBS_RETAINED"""
+    finished = [run_id for run_id, job in IMPORT_JOBS.items() if job.status in ("completed", "failed")]
+    for run_id in finished[:max(0, len(finished) - IMPORT_JOBS_RETAINED)]:
+        IMPORT_JOBS.pop(run_id, None)
+
+# Processes that parse the files of a batch import in parallel
+IMPORT_PARSE_PROCESSES = int(os.environ.get("IMPORT_PARSE_PROCESSES", str(min(4, os.cpu_count() or 1))))
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+
+def parse_export_files(paths: List[str], chunk_size: int = IMPORT_BATCH_SIZE) -> Iterator[Iterator[Any]]:
+    """
+    A parse_simplepractice_file stream per path, in order. With several files
+    they're parsed ahead in parallel processes, each staged to a temp file,
+    while the caller works through the earlier ones.
+    """
+    global _parse_pool
+    if len(paths) <= 1 or IMPORT_PARSE_PROCESSES <= 1:
+        for path in paths:
+            yield parse_simplepractice_file(path, chunk_size)
+        return
+
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # spawn rather than fork - the server process has threads running
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=IMPORT_PARSE_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+            )
+    staged = [_parse_pool.submit(stage_parsed_file, path, chunk_size) for path in paths]
+    try:
+        for future in staged:
+            yield read_staged_file(future)
+    finally:
+        # Files the caller never read (e.g. the batch failed) - removed once their worker is done
+        for future in staged:
+            future.cancel()
+            future.add_done_callback(discard_staged_file)
+
+class BatchImportJob:
+    """
+    Several exports imported together as one parent run with a child
+    ImportJob (and import_runs row) per file. Files are parsed in parallel
+    processes and streamed back in chunks, so each child writes batch by
+    batch like a single import; the children share one ReferenceResolver,
+    so an entity is looked up once for the whole batch, and one set of seen
+    records, so a row repeated in a later file counts as a duplicate there.
+    """
+
+    def __init__(self, run_id: str, children: List[ImportJob], skipped_files: List[Dict[str, Any]]):
+        self.run_id = run_id
+        self.children = children
+        self.skipped_files = skipped_files  # Files matching an earlier import, not re-run
+        self.file_name = f"{len(children)} files"
+        self.bytes_total = sum(child.bytes_total for child in children)
+
+        self.status = "queued"
+        self.result: Optional[ImportResult] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+        self.resolver = ReferenceResolver()
+        seen_records = SeenRecords()
+        for child in children:
+            child.importer.resolver = self.resolver
+            child.importer.seen_records = seen_records
+
+    def run(self) -> ImportResult:
+        self.status = "running"
+        self.started_at = time.monotonic()
+        for child in self.children:
+            child.start()
+
+        exports = parse_export_files([child.upload.name for child in self.children])
+        try:
+            for child, export in zip(self.children, exports):
+                try:
+                    child.importer.accept_parsed(export)
+                    child.importer.finish()
+                    child.complete()
+                except Exception as e:
+                    child.fail(e)
+                finally:
+                    export.close()
+                    child.finalize()
+
+            self.result = self._result()
+            self.status = "completed" if self.result.success else "failed"
+        except Exception as e:
+            logger.error(f"Fatal error during batch import {self.run_id}: {e}")
+            for child in self.children:
+                if child.status == "running":
+                    child.fail(e)
+                    child.finalize()
+            self.result = ImportResult(
+                success=False,
+                run_id=self.run_id,
+                status="failed",
+                message=f"Batch import failed: {str(e)}",
+                errors=1
+            )
+            self.status = "failed"
+        finally:
+            exports.close()
+            self.finished_at = time.monotonic()
+            self._record_run()
+            IMPORT_RUNS.inc(f"batch_{self.status}")
+            logger.info(
+                f"Batch import {self.run_id} {self.status}: {len(self.children)} files, "
+                f"{sum(c.importer.total for c in self.children)} rows in "
+                f"{self.finished_at - self.started_at:.1f}s (parse {self.timings['parse']:.2f}s, "
+                f"resolve {self.timings['resolve']:.2f}s)"
+            )
+
+        return self.result
+
+    @property
+    def timings(self) -> Dict[str, float]:
+        """Seconds per stage, summed over the children"""
+        return {
+            stage: sum(child.importer.stage_timings[stage] for child in self.children)
+            for stage in ("parse", "fingerprints", "resolve")
+        }
+
+    def _result(self) -> ImportResult:
+        results = [child.result for child in self.children if child.result]
+        total = lambda field: sum(getattr(r, field) for r in results)
+        failed = [r for r in results if not r.success]
+        child_runs = [
+            {"file_name": child.file_name, **child.result.model_dump(exclude={"flagged_preview", "child_runs"})}
+            for child in self.children if child.result
+        ] + self.skipped_files
+
+        return ImportResult(
+            success=not failed,
+            run_id=self.run_id,
+            total=total("total"),
+            inserted=total("inserted"),
+            updated=total("updated"),
+            flagged=total("flagged"),
+            duplicates=total("duplicates"),
+            errors=total("errors"),
+            flagged_preview=[p for r in results for p in r.flagged_preview][:10],
+            errors_detail=[e for r in results for e in r.errors_detail][:ERROR_DETAIL_LIMIT],
+            report_rows=total("report_rows"),
+            skipped=total("skipped"),
+            unchanged=total("unchanged"),
+            child_runs=child_runs,
+            status="completed" if not failed else "failed",
+            message=f"Imported {len(results) - len(failed)} of {len(self.children)} files: "
+                    f"{total('inserted')} new sessions, {total('updated')} updated"
+                    + (f", {total('unchanged')} already up to date" if total("unchanged") else "")
+                    + (f", {len(self.skipped_files)} files already imported" if self.skipped_files else "")
+        )
+
+    def _record_run(self):
+        """Totals on the parent import_runs row"""
+        result = self.result
+        try:
+            execute(SB.table("import_runs").update({
+                "finished_at": datetime.now(timezone.utc).isoformat(),
+                "total_rows": result.total,
+                "inserted_rows": result.inserted,
+                "updated_rows": result.updated,
+                "flagged_rows": result.flagged,
+                "skipped_rows": result.skipped,
+                "unchanged_rows": result.unchanged,
+                "duplicate_rows": result.duplicates,
+                "error_rows": result.errors,
+                "stage_timings": {stage: round(seconds, 3) for stage, seconds in self.timings.items()},
+                "errors": result.errors_detail if result.success else [{"error": result.message}]
+            }).eq("id", self.run_id))
+        except Exception as e:
+            logger.error(f"Could not record batch import run {self.run_id}: {e}")
+
+    def progress(self) -> Dict[str, Any]:
+        """Combined progress of the children, plus each child's own"""
+        children = [child.progress() for child in self.children]
+        elapsed = 0.0
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        rows = sum(c["rows_processed"] for c in children)
+        summed = ("bytes_processed", "inserted", "updated", "unchanged", "flagged", "duplicates", "skipped", "errors")
+
+        return {
+            "run_id": self.run_id,
+            "status": self.status,
+            "file_name": self.file_name,
+            "rows_processed": rows,
+            "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else 0.0,
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": 0.0 if self.status in ("completed", "failed") else None,
+            "bytes_total": self.bytes_total,
+            **{field: sum(c[field] for c in children) for field in summed},
+            "stage_timings": {stage: round(seconds, 3) for stage, seconds in self.timings.items()},
+            "children": [{k: v for k, v in c.items() if k != "result"} for c in children],
+            "result": self.result.model_dump() if self.result else None,
+        }
+
+# Bytes read per chunk when spooling and hashing an upload
+UPLOAD_COPY_CHUNK_BYTES = 1024 * 1024
+
+def spool_upload(source, named: bool = False) -> tuple[Any, str]:
+    """
+    Copy an upload to a temp file, returning it rewound with its SHA-256.
+    named=True gives the file a path, so other processes can open it.
+    """
+    digest = hashlib.sha256()
+    upload = tempfile.NamedTemporaryFile() if named else tempfile.TemporaryFile()
+    while chunk := source.read(UPLOAD_COPY_CHUNK_BYTES):
+        digest.update(chunk)
+        upload.write(chunk)
+    upload.seek(0)
+    return upload, digest.hexdigest()
+
+async def find_previous_import(file_sha256: str) -> Optional[ImportResult]:
+    """
+    Result of the latest run of an identical file that completed without
+    errors, if any. A run with row errors doesn't count: importing the file
+    again retries those rows (rows it did write are skipped by fingerprint).
+    """
+    result = await db(SB.table("import_runs").select(
+        "id, file_name, finished_at, total_rows, inserted_rows, updated_rows, flagged_rows, "
+        "skipped_rows, unchanged_rows, duplicate_rows, error_rows, errors"
+    ).eq("file_sha256", file_sha256).not_.is_("total_rows", "null").eq("error_rows", 0).order("finished_at", desc=True).limit(1))
+
+    if not result.data:
+        return None
+
+    run = result.data[0]
+    errors = run.get("errors") or []
+    return ImportResult(
+        success=True,
+        run_id=run["id"],
+        total=run.get("total_rows") or 0,
+        inserted=run.get("inserted_rows") or 0,
+        updated=run.get("updated_rows") or 0,
+        flagged=run.get("flagged_rows") or 0,
+        skipped=run.get("skipped_rows") or 0,
+        unchanged=run.get("unchanged_rows") or 0,
+        duplicates=run.get("duplicate_rows") or 0,
+        errors=run.get("error_rows") or len(errors),
+        errors_detail=errors,
+        already_imported=True,
+        status="completed",
+        message=f"This file was already imported ({run.get('file_name')}, finished {run.get('finished_at')}); nothing was changed"
+    )
+
+@app.post("/api/imports/simplepractice", response_model=ImportResult)
+async def import_simplepractice(
+    file: UploadFile = File(...),
+    wait: bool = False,
+    force: bool = False,
+    dry_run: bool = False,
+    auth: AuthContext = Depends(require_user)
+):
+    """
+    Fixed version of the SimplePractice CSV import handler.
+    Queues the import on the worker pool and returns the run_id straight
+    away; pass ?wait=true to run it inside the request as before.
+    A file identical to an earlier completed run returns that run's result
+    unless ?force=true. ?dry_run=true previews the import in the request
+    without writing anything (no import run is recorded).
+    """
+    logger.info(f"Starting CSV import: {file.filename}")
+
+    # Check database connection
+    if not SB:
+        logger.error("Database connection not available")
+        return ImportResult(
+            success=False,
+            message="Database connection error. Please check configuration.",
+            errors=1
+        )
+
+    # Validate file
+    if not file.filename or not file.filename.lower().endswith(".csv"):
+        return ImportResult(
+            success=False,
+            message="Please upload a valid CSV file",
+            errors=1
+        )
+
+    # Copy the upload off the request - FastAPI closes it once we respond
+    upload, file_sha256 = await run_in_threadpool(spool_upload, file.file)
+
+    if dry_run:
+        return await run_in_threadpool(preview_simplepractice, upload)
+
+    # Check if this exact file was already imported
+    if not force:
+        try:
+            previous = await find_previous_import(file_sha256)
+        except Exception as e:
+            logger.error(f"Could not look up earlier imports of this file: {e}")
+            previous = None
+
+        if previous:
+            upload.close()
+            logger.info(f"File {file.filename} matches import run {previous.run_id}, skipping")
+            return previous
+
+    # Create import run record
+    try:
+        run_data = await db(SB.table("import_runs").insert({
+            "source": "simplepractice",
+            "file_name": file.filename,
+            "file_sha256": file_sha256,
+            "started_at": datetime.now(timezone.utc).isoformat()
+        }))
+
+        if not run_data.data:
+            logger.error("Could not create import run record")
+            return ImportResult(
+                success=False,
+                message="Could not initialize import. Please check database connection.",
+                errors=1
+            )
+
+        run = run_data.data[0]
+        run_id = run["id"]
+        logger.info(f"Created import run ID: {run_id}")
+    except Exception as e:
+        logger.error(f"Error creating import run: {e}")
+        upload.close()
+        return ImportResult(
+            success=False,
+            message=f"Database error: {str(e)}",
+            errors=1
+        )
+
+    job = ImportJob(run_id, file.filename, upload)
+    IMPORT_JOBS[run_id] = job
+    _prune_import_jobs()
+
+    if wait:
+        # Synchronous mode - hold the request open until the import finishes
+        return await run_in_threadpool(job.run)
+
+    IMPORT_EXECUTOR.submit(job.run)
+    logger.info(f"Queued import run {run_id} ({job.bytes_total} bytes)")
+
+    return ImportResult(
+        success=True,
+        run_id=run_id,
+        status=job.status,
+        message=f"Import queued. Poll /api/imports/{run_id} for progress."
+    )
+
+@app.post("/api/imports/{run_id}/resume", response_model=ImportResult)
+async def resume_import(run_id: str, wait: bool = False, auth: AuthContext = Depends(require_user)):
+    """
+    Continue a failed or interrupted import after its last checkpoint,
+    re-reading the upload kept in storage. Rows up to the checkpoint are
+    already committed and are not processed again.
+    """
+    job = IMPORT_JOBS.get(run_id)
+    if job and job.status in ("queued", "running"):
+        raise HTTPException(status_code=409, detail="Import is still running")
+
+    if not SB:
+        logger.error("Database connection not available")
+        raise HTTPException(status_code=500, detail="Database connection error")
+
+    try:
+        result = await db(SB.table("import_runs").select(
+            "id, file_name, total_rows, checkpoint, upload_path"
+        ).eq("id", run_id).limit(1))
+    except Exception as e:
+        logger.error(f"Error fetching import run {run_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Import run not found")
+
+    run = result.data[0]
+    if run.get("total_rows") is not None:
+        raise HTTPException(status_code=409, detail="Import already completed")
+    if not run.get("upload_path"):
+        raise HTTPException(status_code=409, detail="The uploaded file is no longer available; upload it again")
+
+    try:
+        upload = tempfile.TemporaryFile()
+        await run_db(download_to_file, IMPORT_UPLOADS_BUCKET, run["upload_path"], upload)
+        upload.seek(0)
+
+        # Running again - clear the failure recorded by the last attempt
+        await db(SB.table("import_runs").update({"finished_at": None, "errors": []}).eq("id", run_id))
+    except Exception as e:
+        logger.error(f"Could not resume import run {run_id}: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+    checkpoint = run.get("checkpoint")
+    job = ImportJob(run_id, run.get("file_name"), upload, checkpoint=checkpoint)
+    job.importer.upload_path = run["upload_path"]
+    IMPORT_JOBS[run_id] = job
+    _prune_import_jobs()
+    resumed = f"after row {checkpoint['row']}" if checkpoint and checkpoint["row"] else "from the first row"
+    logger.info(f"Resuming import run {run_id} {resumed}")
+
+    if wait:
+        return await run_in_threadpool(job.run)
+
+    IMPORT_EXECUTOR.submit(job.run)
+    return ImportResult(
+        success=True,
+        run_id=run_id,
+        status=job.status,
+        message=f"Import resumed {resumed}. Poll /api/imports/{run_id} for progress."
+    )
+
+# Limits on one batch upload, after unzipping
+IMPORT_BATCH_MAX_FILES = int(os.environ.get("IMPORT_BATCH_MAX_FILES", "50"))
+IMPORT_BATCH_MAX_BYTES = int(os.environ.get("IMPORT_BATCH_MAX_BYTES", str(512 * 1024 * 1024)))
+
+def expand_batch_uploads(files: List[UploadFile]) -> List[tuple[str, Any, str]]:
+    """
+    Spool every CSV in the upload - given directly or inside .zip archives -
+    to a named temp file. Returns (file name, temp file, sha256) per CSV.
+    """
+    expanded: List[tuple[str, Any, str]] = []
+    total_bytes = 0
+
+    def add(name: str, source):
+        nonlocal total_bytes
+        if len(expanded) >= IMPORT_BATCH_MAX_FILES:
+            raise HTTPException(status_code=400, detail=f"At most {IMPORT_BATCH_MAX_FILES} files per batch")
+        upload, sha256 = spool_upload(source, named=True)
+        expanded.append((name, upload, sha256))
+        total_bytes += os.fstat(upload.fileno()).st_size
+        if total_bytes > IMPORT_BATCH_MAX_BYTES:
+            raise HTTPException(status_code=400, detail=f"Batch is larger than {IMPORT_BATCH_MAX_BYTES} bytes")
+
+    try:
+        for file in files:
+            name = file.filename or ""
+            if name.lower().endswith(".csv"):
+                add(name, file.file)
+            elif name.lower().endswith(".zip"):
+                try:
+                    with zipfile.ZipFile(file.file) as archive:
+                        for member in archive.infolist():
+                            base = os.path.basename(member.filename)
+                            # Skip folders and macOS resource forks
+                            if member.is_dir() or not base.lower().endswith(".csv") or base.startswith("._") \
+                                    or member.filename.startswith("__MACOSX/"):
+                                continue
+                            with archive.open(member) as source:
+                                add(base, source)
+                except zipfile.BadZipFile:
+                    raise HTTPException(status_code=400, detail=f"{name} is not a valid zip file")
+            else:
+                raise HTTPException(status_code=400, detail=f"{name or 'Unnamed file'} is not a CSV or zip file")
+    except BaseException:
+        for _, upload, _ in expanded:
+            upload.close()
+        raise
+
+    if not expanded:
+        raise HTTPException(status_code=400, detail="No CSV files found in the upload")
+    return expanded
+
+@app.post("/api/imports/simplepractice/batch", response_model=ImportResult)
+async def import_simplepractice_batch(
+    files: List[UploadFile] = File(...),
+    wait: bool = False,
+    force: bool = False,
+    auth: AuthContext = Depends(require_user)
+):
+    """
+    Import several SimplePractice exports (CSVs and/or zips of CSVs) as one
+    batch: a parent import run plus a child run per file. Files identical to
+    an earlier completed run (or repeated in the batch) are skipped unless ?force=true.
+    """
+    if not SB:
+        logger.error("Database connection not available")
+        return ImportResult(
+            success=False,
+            message="Database connection error. Please check configuration.",
+            errors=1
+        )
+
+    expanded = await run_in_threadpool(expand_batch_uploads, files)
+    logger.info(f"Starting batch import of {len(expanded)} files")
+
+    # Drop repeats within the batch and files already imported
+    to_import, skipped_files, hashes = [], [], set()
+    for name, upload, sha256 in expanded:
+        previous = None
+        if sha256 in hashes:
+            skipped_files.append({"file_name": name, "already_imported": True, "message": "Repeated in this batch"})
+        elif not force:
+            try:
+                previous = await find_previous_import(sha256)
+            except Exception as e:
+                logger.error(f"Could not look up earlier imports of {name}: {e}")
+            if previous:
+                skipped_files.append({"file_name": name, **previous.model_dump(exclude={"flagged_preview", "child_runs"})})
+
+        if sha256 in hashes or previous:
+            upload.close()
+            continue
+        hashes.add(sha256)
+        to_import.append((name, upload, sha256))
+
+    if not to_import:
+        return ImportResult(
+            success=True,
+            already_imported=True,
+            child_runs=skipped_files,
+            status="completed",
+            message="Every file in this batch was already imported; nothing was changed"
+        )
+
+    # Parent run first, then one child run per file pointing at it
+    try:
+        now = datetime.now(timezone.utc).isoformat()
+        parent = await db(SB.table("import_runs").insert({
+            "source": "simplepractice",
+            "file_name": f"Batch of {len(to_import)} files",
+            "started_at": now
+        }))
+        run_id = parent.data[0]["id"]
+
+        runs = await db(SB.table("import_runs").insert([
+            {
+                "source": "simplepractice",
+                "file_name": name,
+                "file_sha256": sha256,
+                "parent_run_id": run_id,
+                "started_at": now
+            }
+            for name, _, sha256 in to_import
+        ]))
+        child_ids = [row["id"] for row in runs.data or []]
+        if len(child_ids) != len(to_import):
+            raise RuntimeError("Could not create an import run for every file")
+        logger.info(f"Created batch import run ID: {run_id} with {len(child_ids)} files")
+    except Exception as e:
+        logger.error(f"Error creating batch import runs: {e}")
+        for _, upload, _ in to_import:
+            upload.close()
+        return ImportResult(
+            success=False,
+            message=f"Database error: {str(e)}",
+            errors=1
+        )
+
+    children = [ImportJob(child_id, name, upload) for child_id, (name, upload, _) in zip(child_ids, to_import)]
+    job = BatchImportJob(run_id, children, skipped_files)
+    for child in children:
+        IMPORT_JOBS[child.run_id] = child
+    IMPORT_JOBS[run_id] = job
+    _prune_import_jobs()
+
+    if wait:
+        return await run_in_threadpool(job.run)
+
+    IMPORT_EXECUTOR.submit(job.run)
+    logger.info(f"Queued batch import run {run_id} ({job.bytes_total} bytes)")
+
+    return ImportResult(
+        success=True,
+        run_id=run_id,
+        status=job.status,
+        message=f"Batch import queued. Poll /api/imports/{run_id} for progress."
+    )
+
+# Fields the session list endpoints can return (?fields=), with what each selects
+SESSION_LIST_FIELDS = {
+    "id": "id",
+    "session_date": "session_date",
+    "client_id": "client_id",
+    "provider_id": "provider_id",
+    "minutes": "minutes",
+    "note_submitted": "note_submitted",
+    "billing_status": "billing_status",
+    "amount_billed": "amount_billed",
+    "amount_paid": "amount_paid",
+    "date_submitted": "date_submitted",
+    "date_paid": "date_paid",
+    "clients": "clients(name)",
+    "providers": "providers(name)",
+}
+
+# Columns returned by the session list endpoints by default
+SESSION_LIST_COLUMNS = ", ".join(SESSION_LIST_FIELDS.values())
+
+# Always selected - the keyset cursor is built from them
+SESSION_CURSOR_FIELDS = ("id", "session_date")
+
+# Embedded {name} objects that format=columnar stores in the shared dictionary
+SESSION_NAME_EMBEDS = ("clients", "providers")
+
+SESSION_LIST_FORMATS = ("rows", "columnar")
+
+def parse_session_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Validate ?fields= against SESSION_LIST_FIELDS; None means every field"""
+    if fields is None:
+        return None
+    requested = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in SESSION_LIST_FIELDS]
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown) or '(none given)'}. Allowed: {', '.join(SESSION_LIST_FIELDS)}"
+        )
+    return requested
+
+def session_select(fields: Optional[List[str]], *extra: str) -> str:
+    """PostgREST select for the requested fields plus the ones paging needs"""
+    if fields is None:
+        return ", ".join([SESSION_LIST_COLUMNS, *extra])
+    wanted = dict.fromkeys([*SESSION_CURSOR_FIELDS, *fields])
+    return ", ".join([*(SESSION_LIST_FIELDS[f] for f in wanted), *extra])
+
+def columnar_sessions(sessions: List[Dict[str, Any]], fields: List[str]) -> Dict[str, Any]:
+    """
+    One array per field instead of one object per session. Client and
+    provider names become indexes into a shared dictionary, since the same
+    few names repeat on every page.
+    """
+    names: Dict[str, int] = {}
+    columns = {}
+    for field in fields:
+        if field in SESSION_NAME_EMBEDS:
+            column = []
+            for session in sessions:
+                name = (session.get(field) or {}).get("name")
+                column.append(None if name is None else names.setdefault(name, len(names)))
+            columns[field] = column
+        else:
+            columns[field] = [session.get(field) for session in sessions]
+    return {"count": len(sessions), "columns": columns, "dictionary": list(names)}
+
+# Page size for GET /api/sessions - matches PostgREST's default max-rows cap
+SESSIONS_PAGE_LIMIT = int(os.environ.get("SESSIONS_PAGE_LIMIT", "1000"))
+
+def encode_session_cursor(session: Dict[str, Any]) -> str:
+    """Opaque keyset cursor pointing just past the given session"""
+    raw = f"{session['session_date']}|{session['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_session_cursor(cursor: str) -> tuple[str, str]:
+    """
+    Inverse of encode_session_cursor - returns (session_date, id). Both are
+    re-serialized from a parsed date and UUID, since they end up inside an
+    or() filter string.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        session_date, session_id = raw.split("|", 1)
+        return date.fromisoformat(session_date).isoformat(), str(uuid.UUID(session_id))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def apply_session_cursor(query, after_date: str, after_id: str):
+    """Keyset condition for sessions strictly after (after_date, after_id) in list order"""
+    return query.or_(
+        f"session_date.lt.{after_date},"
+        f"and(session_date.eq.{after_date},id.lt.{after_id})"
+    )
+
+def order_sessions(query):
+    """Newest first, with id as the tie-breaker the keyset cursor relies on"""
+    return query.order("session_date", desc=True).order("id", desc=True)
+
+def _parse_date_param(value: Optional[str], name: str) -> Optional[str]:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}. Use YYYY-MM-DD")
+
+def apply_session_filters(
+    query,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    billing_status: Optional[str] = None,
+    note_submitted: Optional[bool] = None,
+    provider_id: Optional[str] = None,
+    payer_id: Optional[str] = None,
+):
+    """Push the session list filters down into the PostgREST query"""
+    date_from = _parse_date_param(date_from, "date_from")
+    date_to = _parse_date_param(date_to, "date_to")
+
+    if date_from:
+        query = query.gte("session_date", date_from)
+    if date_to:
+        query = query.lte("session_date", date_to)
+    if billing_status:
+        statuses = [s.strip() for s in billing_status.split(",") if s.strip()]
+        query = query.in_("billing_status", statuses)
+    if note_submitted is not None:
+        query = query.eq("note_submitted", note_submitted)
+    if provider_id:
+        query = query.eq("provider_id", provider_id)
+    if payer_id:
+        query = query.eq("payer_id", payer_id)
+    return query
+
+def resolve_session_scope(
+    auth: Optional[AuthContext],
+    impersonated_role: Optional[str]
+) -> tuple[str, Optional[str], bool]:
+    """
+    Work out which sessions the caller may see.
+    Returns (effective_role, provider_id, visible): admin, billing and
+    manager (for now) see all sessions with provider_id None; providers are
+    scoped to their own provider_id, and visible is False when they have none.
+    """
+    # Unauthenticated callers keep the historical admin default
+    effective_role = auth.effective_role(impersonated_role) if auth else "admin"
+
+    if effective_role in ("admin", "billing", "manager"):
+        return effective_role, None, True
+
+    if not auth or not auth.provider_id:
+        return effective_role, None, False
+
+    return effective_role, auth.provider_id, True
+
+def session_change_cursor() -> Dict[str, int]:
+    """
+    Latest session change cursor and the oldest one deltas can still start
+    from (blocking). Change numbers follow commit order, so nothing that
+    commits later can land at or below the cursor.
+    """
+    return _change_cursor_state(execute(SB.rpc("session_change_cursor")))
+
+async def read_session_change_cursor() -> Dict[str, int]:
+    """session_change_cursor() on the DB thread pool, for request handlers"""
+    return _change_cursor_state(await db(SB.rpc("session_change_cursor")))
+
+def _change_cursor_state(result) -> Dict[str, int]:
+    row = (result.data or [{}])[0]
+    return {"cursor": row.get("cursor") or 0, "pruned_through": row.get("pruned_through") or 0}
+
+async def fetch_session_changes(
+    since: int,
+    limit: int,
+    provider_id: Optional[str],
+    fields: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Sessions inserted, updated or deleted after change cursor `since`, oldest
+    change first, read from the session_changes log. List filters don't
+    apply - a session that moved out of the caller's view still has to reach
+    them as a change: for a provider scope, sessions reassigned to another
+    provider come back in `deleted` alongside actual deletes.
+    """
+    log = SB.table("session_changes").select("change_seq, session_id").gt("change_seq", since)
+    if provider_id:
+        try:
+            provider_id = str(uuid.UUID(provider_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid provider_id")
+        # Either side of a reassignment - the old provider has to hear it left
+        log = log.or_(f"provider_id.eq.{provider_id},old_provider_id.eq.{provider_id}")
+
+    state, log = await asyncio.gather(
+        read_session_change_cursor(),
+        db(log.order("change_seq").limit(limit + 1)),
+    )
+    if since < state["pruned_through"]:
+        raise HTTPException(status_code=410, detail="Change cursor expired; reload the full session list")
+
+    entries = log.data or []
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # Each session once, at its latest change in this page, as it looks now
+    latest = {entry["session_id"]: entry["change_seq"] for entry in entries}
+    session_ids = sorted(latest, key=latest.get)
+    extra = ("provider_id",) if provider_id and fields is not None and "provider_id" not in fields else ()
+    current = {}
+    for chunk in _chunks(session_ids, IN_FILTER_CHUNK_SIZE):
+        result = await db(SB.table("sessions").select(session_select(fields, *extra)).in_("id", chunk))
+        current.update((session["id"], session) for session in result.data or [])
+
+    changes, deleted = [], []
+    for session_id in session_ids:
+        session = current.get(session_id)
+        if session is None or (provider_id and session.get("provider_id") != provider_id):
+            deleted.append(session_id)
+            continue
+        for field in extra:
+            session.pop(field)
+        changes.append(session)
+
+    return {
+        "changes": changes,
+        "deleted": deleted,
+        "cursor": entries[-1]["change_seq"] if entries else since,
+        "has_more": has_more,
+    }
+
+@app.get("/api/sessions")
+async def get_sessions(
+    request: Request,
+    auth: Optional[AuthContext] = Depends(get_auth_context),
+    impersonated_role: str = Cookie(None),
+    limit: int = SESSIONS_PAGE_LIMIT,
+    cursor: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    billing_status: Optional[str] = None,
+    note_submitted: Optional[bool] = None,
+    provider_id: Optional[str] = None,
+    payer_id: Optional[str] = None,
+    since: Optional[int] = None,
+    fields: Optional[str] = None,
+    format: str = "rows",
+):
+    """
+    Get sessions with role-based filtering, newest first.
+    Pages with a keyset cursor on (session_date, id): pass the
+    X-Next-Cursor response header back as ?cursor= for the next page.
+    Conditional: repeat reads with If-None-Match get 304 until sessions change.
+
+    Delta sync: full lists carry an X-Change-Cursor header; ?since=<cursor>
+    returns {changes, deleted, cursor, has_more} - only what was written or
+    deleted after it (410 once the cursor is too old to serve).
+
+    ?fields=id,session_date,clients returns only those fields (see
+    SESSION_LIST_FIELDS); ?format=columnar returns {count, columns,
+    dictionary} with one array per field.
+    """
+    if not SB:
+        logger.error("Database connection not available")
+        raise HTTPException(status_code=500, detail="Database connection error")
+
+    if limit < 1 or limit > SESSIONS_PAGE_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {SESSIONS_PAGE_LIMIT}")
+
+    if format not in SESSION_LIST_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(SESSION_LIST_FORMATS)}")
+
+    try:
+        requested_fields = parse_session_fields(fields)
+        effective_role, scoped_provider_id, visible = resolve_session_scope(auth, impersonated_role)
+        no_changes = {"changes": [], "deleted": [], "cursor": since, "has_more": False}
+        if not visible:
+            return [] if since is None else no_changes
+
+        # Providers only ever see their own sessions
+        if scoped_provider_id:
+            if provider_id and provider_id != scoped_provider_id:
+                return [] if since is None else no_changes
+            provider_id = scoped_provider_id
+
+        if since is not None:
+            # Not conditional - a delta must reflect writes made outside this process straight away
+            return await fetch_session_changes(since, limit, provider_id, requested_fields)
+
+        query = SB.table("sessions").select(session_select(requested_fields))
+        query = apply_session_filters(
+            query, date_from, date_to, billing_status, note_submitted, provider_id, payer_id
+        )
+
+        if cursor:
+            query = apply_session_cursor(query, *decode_session_cursor(cursor))
+
+        async def build():
+            headers = {}
+            # Read the change cursor first, so changes racing this read are picked up by the next delta
+            try:
+                headers["X-Change-Cursor"] = str((await read_session_change_cursor())["cursor"])
+            except Exception as e:
+                logger.error(f"Could not read the session change cursor: {e}")
+
+            # Fetch one extra row to know whether another page exists
+            result = await db(order_sessions(query).limit(limit + 1))
+            sessions = result.data or []
+
+            if len(sessions) > limit:
+                sessions = sessions[:limit]
+                headers["X-Next-Cursor"] = encode_session_cursor(sessions[-1])
+
+            logger.info(f"Found {len(sessions)} sessions for role: {effective_role}")
+            if format == "columnar":
+                return columnar_sessions(sessions, requested_fields or list(SESSION_LIST_FIELDS)), headers
+            if requested_fields:
+                # Drop the cursor fields when they weren't asked for
+                sessions = [{f: session.get(f) for f in requested_fields} for session in sessions]
+            return sessions, headers
+
+        return await conditional_json(request, ("sessions",), (effective_role, provider_id), build)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching sessions: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+# --- Change feed -----------------------------------------------------------
+
+# Seconds between checks of the session change cursor while anyone listens on /api/events
+CHANGE_FEED_POLL_SECONDS = int(os.environ.get("CHANGE_FEED_POLL_SECONDS", "10"))
+
+# Seconds between keep-alive comments on an idle event stream
+CHANGE_FEED_HEARTBEAT_SECONDS = 15
+
+# Events buffered per listener
+CHANGE_FEED_QUEUE_SIZE = 100
+
+class ChangeFeed:
+    """
+    Fans events out to this process's /api/events streams. Imports publish
+    when they finish; session writes made anywhere else are noticed by one
+    poll of the change cursor per process, however many tabs listen.
+    """
+
+    def __init__(self):
+        self.listeners: set = set()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.cursor: Optional[int] = None  # Latest cursor announced
+        self.poller: Optional[asyncio.Task] = None
+
+    @contextlib.asynccontextmanager
+    async def listen(self):
+        queue: asyncio.Queue = asyncio.Queue(CHANGE_FEED_QUEUE_SIZE)
+        self.loop = asyncio.get_running_loop()
+        self.listeners.add(queue)
+        if self.poller is None:
+            self.poller = asyncio.create_task(self._poll())
+        try:
+            yield queue
+        finally:
+            self.listeners.discard(queue)
+
+    def publish(self, event: str, data: Dict[str, Any]):
+        """Queue an event for every listener - safe to call from worker threads"""
+        if not self.listeners or self.loop is None:
+            return
+        if data.get("cursor") is not None:
+            self.cursor = max(self.cursor or 0, data["cursor"])
+        self.loop.call_soon_threadsafe(self._deliver, event, data)
+
+    def _deliver(self, event: str, data: Dict[str, Any]):
+        for queue in list(self.listeners):
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                pass  # Every event carries the cursor - the listener catches up on the next one
+
+    async def _poll(self):
+        try:
+            while self.listeners:
+                await asyncio.sleep(CHANGE_FEED_POLL_SECONDS)
+                try:
+                    cursor = (await read_session_change_cursor())["cursor"]
+                except Exception as e:
+                    logger.error(f"Change feed could not read the session change cursor: {e}")
+                    continue
+                if self.cursor is not None and cursor > self.cursor:
+                    self._deliver("sessions-changed", {"cursor": cursor})
+                self.cursor = max(self.cursor or 0, cursor)
+        finally:
+            self.poller = None
+
+CHANGE_FEED = ChangeFeed()
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    cursor = data.get("cursor")
+    return (f"id: {cursor}\n" if cursor is not None else "") + f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.get("/api/events")
+async def stream_events(request: Request, auth: AuthContext = Depends(require_user)):
+    """
+    Server-sent events: "ready" with the current change cursor, then
+    "import-completed" and "sessions-changed" carrying the new cursor.
+    Clients fetch GET /api/sessions?since=<their cursor> on each event.
+    """
+    if not SB:
+        logger.error("Database connection not available")
+        raise HTTPException(status_code=500, detail="Database connection error")
+
+    try:
+        cursor = (await read_session_change_cursor())["cursor"]
+    except Exception as e:
+        logger.error(f"Error starting event stream: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def stream():
+        async with CHANGE_FEED.listen() as queue:
+            if CHANGE_FEED.cursor is None:
+                CHANGE_FEED.cursor = cursor
+            # Browsers reconnect 5s after a dropped stream
+            yield "retry: 5000\n" + sse_event("ready", {"cursor": cursor})
+            while not await request.is_disconnected():
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), CHANGE_FEED_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield sse_event(event, data)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        # Don't let proxies buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Columns read by GET /api/sessions/export
+SESSION_EXPORT_COLUMNS = (
+    "id, session_date, client_id, provider_id, payer_id, minutes, note_submitted, "
+    "billing_status, amount_billed, amount_paid, date_submitted, date_paid, "
+    "clients(name), providers(name), payers(name)"
+)
+
+# Export columns, in file order - the joined names are flattened next to their ids
+SESSION_EXPORT_FIELDS = [
+    "id", "session_date", "client_id", "client_name", "provider_id", "provider_name",
+    "payer_id", "payer_name", "minutes", "note_submitted", "billing_status",
+    "amount_billed", "amount_paid", "date_submitted", "date_paid",
+]
+
+# format -> (media type, file extension)
+SESSION_EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+def flatten_export_session(session: Dict[str, Any]) -> Dict[str, Any]:
+    """One export record: the session with its embedded client/provider/payer names pulled up"""
+    record = {field: session.get(field) for field in SESSION_EXPORT_FIELDS}
+    for embed, field in (("clients", "client_name"), ("providers", "provider_name"), ("payers", "payer_name")):
+        record[field] = (session.get(embed) or {}).get("name")
+    return record
+
+async def iter_session_pages(build_query, page_size: int = SESSIONS_PAGE_LIMIT) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Walk every session matching build_query() in list order, one keyset page
+    at a time. build_query is called per page since query builders are single-use.
+    """
+    after = None
+    while True:
+        query = build_query()
+        if after:
+            query = apply_session_cursor(query, *after)
+        result = await db(order_sessions(query).limit(page_size))
+        page = result.data or []
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        after = (page[-1]["session_date"], page[-1]["id"])
+
+def encode_export_page(sessions: List[Dict[str, Any]], export_format: str) -> bytes:
+    """Serialize one page of sessions as CSV rows (no header) or NDJSON lines"""
+    records = [flatten_export_session(s) for s in sessions]
+    if export_format == "ndjson":
+        return "".join(json.dumps(r, default=str) + "\n" for r in records).encode("utf-8")
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=SESSION_EXPORT_FIELDS, lineterminator="\n")
+    writer.writerows(records)
+    return buffer.getvalue().encode("utf-8")
+
+@app.get("/api/sessions/export")
+async def export_sessions(
+    auth: Optional[AuthContext] = Depends(get_auth_context),
+    impersonated_role: str = Cookie(None),
+    format: str = "csv",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    billing_status: Optional[str] = None,
+    note_submitted: Optional[bool] = None,
+    provider_id: Optional[str] = None,
+    payer_id: Optional[str] = None,
+):
+    """
+    Stream every session matching the /api/sessions filters as CSV or NDJSON,
+    newest first, with client, provider and payer names. Reads one keyset
+    page at a time so memory use doesn't grow with the export.
+    """
+    if not SB:
+        logger.error("Database connection not available")
+        raise HTTPException(status_code=500, detail="Database connection error")
+
+    if format not in SESSION_EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {list(SESSION_EXPORT_FORMATS)}")
+    media_type, extension = SESSION_EXPORT_FORMATS[format]
+
+    try:
+        effective_role, scoped_provider_id, visible = resolve_session_scope(auth, impersonated_role)
+
+        # Providers only ever see their own sessions
+        if scoped_provider_id:
+            if provider_id and provider_id != scoped_provider_id:
+                visible = False
+            provider_id = scoped_provider_id
+
+        def build_query():
+            query = SB.table("sessions").select(SESSION_EXPORT_COLUMNS)
+            return apply_session_filters(
+                query, date_from, date_to, billing_status, note_submitted, provider_id, payer_id
+            )
+
+        pages = iter_session_pages(build_query)
+
+        # Read the first page up front so bad filters and database errors
+        # still surface as a proper error status instead of a truncated file
+        first_page = await anext(pages, []) if visible else []
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error exporting sessions: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def stream() -> AsyncIterator[bytes]:
+        exported = len(first_page)
+        if format == "csv":
+            yield (",".join(SESSION_EXPORT_FIELDS) + "\n").encode("utf-8")
+        if first_page:
+            yield encode_export_page(first_page, format)
+            try:
+                async for page in pages:
+                    exported += len(page)
+                    yield encode_export_page(page, format)
+            except Exception as e:
+                # Headers are already sent - all we can do is cut the download short
+                logger.error(f"✗ Session export failed after {exported} rows: {e}")
+                raise
+        logger.info(f"✓ Exported {exported} sessions as {format} for role: {effective_role}")
+
+    period = f"{_parse_date_param(date_from, 'date_from') or 'start'}-to-{_parse_date_param(date_to, 'date_to') or 'latest'}"
+    headers = {"Content-Disposition": f'attachment; filename="sessions-{period}.{extension}"'}
+    return StreamingResponse(stream(), media_type=media_type, headers=headers)
+
+# Breakdowns session_summary() supports
+SUMMARY_GROUP_BY = ("provider", "payer")
+
+def _summary_row(row: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Normalize one session_summary() row, filling zeros for an empty period"""
+    row = row or {}
+    return {
+        "total_sessions": row.get("total_sessions") or 0,
+        "notes_submitted": row.get("notes_submitted") or 0,
+        "notes_pending": row.get("notes_pending") or 0,
+        "flagged": row.get("flagged") or 0,
+        "status_counts": row.get("status_counts") or {},
+        "amount_billed": float(row.get("amount_billed") or 0),
+        "outstanding_amount": float(row.get("outstanding_amount") or 0),
+        "total_collected": float(row.get("total_collected") or 0),
+        "avg_days_to_payment": float(row["avg_days_to_payment"]) if row.get("avg_days_to_payment") is not None else None,
+    }
+
+@app.get("/api/sessions/summary")
+async def get_sessions_summary(
+    request: Request,
+    auth: Optional[AuthContext] = Depends(get_auth_context),
+    impersonated_role: str = Cookie(None),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    group_by: Optional[str] = None,
+):
+    """
+    Role-scoped session KPIs for a period, computed in SQL by session_summary():
+    counts per billing_status, money totals and average days to payment,
+    optionally broken down by provider or payer.
+    """
     if not SB:
         logger.error("Database connection not available")
         raise HTTPException(status_code=500, detail="Database connection error")
 
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
+    if group_by and group_by not in SUMMARY_GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"Invalid group_by. Must be one of: {list(SUMMARY_GROUP_BY)}")
+
+    date_from = _parse_date_param(date_from, "date_from")
+    date_to = _parse_date_param(date_to, "date_to")
 
     try:
-        # Extract token
-        token = authorization.replace("Bearer ", "")
+        effective_role, scoped_provider_id, visible = resolve_session_scope(auth, impersonated_role)
 
-        # Verify token with Supabase
-        auth_response = SB.auth.get_user(token)
-        if not auth_response or not auth_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
+        summary = {
+            "role": effective_role,
+            "date_from": date_from,
+            "date_to": date_to,
+            "group_by": group_by,
+            "totals": _summary_row(None),
+            "groups": [],
+        }
+        if not visible:
+            return summary
+
+        params = {
+            "p_date_from": date_from,
+            "p_date_to": date_to,
+            "p_provider_id": scoped_provider_id,
+        }
+
+        async def build():
+            calls = [db(SB.rpc("session_summary", {**params, "p_group_by": None}))]
+            if group_by:
+                calls.append(db(SB.rpc("session_summary", {**params, "p_group_by": group_by})))
+            results = await asyncio.gather(*calls)
+
+            totals = results[0].data or []
+            summary["totals"] = _summary_row(totals[0] if totals else None)
+
+            if group_by:
+                summary["groups"] = [
+                    {"id": row.get("group_id"), "name": row.get("group_name"), **_summary_row(row)}
+                    for row in results[1].data or []
+                ]
+            return summary, {}
+
+        return await conditional_json(request, ("sessions",), (effective_role, scoped_provider_id), build)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching session summary: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Biweekly payroll: cycles are 14-day windows counted from this anchor (a cycle start)
+PAYROLL_ANCHOR_DATE = date.fromisoformat(os.environ.get("PAYROLL_ANCHOR_DATE", "2025-09-23"))
+PAYROLL_CYCLE_DAYS = 14
+PAYROLL_CYCLE_STATUSES = ("draft", "sent", "approved", "paid")
+
+# Cycles listed by GET /api/payroll/cycles when no date range is given
+PAYROLL_HISTORY_CYCLES = int(os.environ.get("PAYROLL_HISTORY_CYCLES", "12"))
+
+def payroll_cycle_start(day: date) -> date:
+    """First day of the cycle containing day - mirrors payroll_cycle_start() in SQL"""
+    offset = (day - PAYROLL_ANCHOR_DATE).days // PAYROLL_CYCLE_DAYS * PAYROLL_CYCLE_DAYS
+    return PAYROLL_ANCHOR_DATE + timedelta(days=offset)
+
+def _parse_cycle_start(value: str) -> date:
+    try:
+        start = date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cycle. Use its start date, YYYY-MM-DD")
+    if payroll_cycle_start(start) != start:
+        raise HTTPException(status_code=404, detail=f"No payroll cycle starts on {value}")
+    return start
+
+def _payroll_cycle(start: date, snapshot: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """A cycle as the API returns it - frozen totals when closed, zeros for an open cycle to fill in"""
+    snapshot = snapshot or {}
+    return {
+        "id": start.isoformat(),
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(days=PAYROLL_CYCLE_DAYS - 1)).isoformat(),
+        "status": snapshot.get("status", "draft"),
+        "closed": bool(snapshot),
+        "closed_at": snapshot.get("closed_at"),
+        "total_sessions": snapshot.get("total_sessions") or 0,
+        "total_minutes": snapshot.get("total_minutes") or 0,
+        "total_amount": float(snapshot.get("total_amount") or 0),
+    }
+
+def _payroll_provider_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "provider_id": row.get("provider_id"),
+        "provider_name": row.get("provider_name"),
+        "session_count": row.get("session_count") or 0,
+        "total_minutes": row.get("total_minutes") or 0,
+        "total_amount": float(row.get("total_amount") or 0),
+    }
+
+async def _payroll_summary(date_from: date, date_to: date, provider_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Live per-cycle, per-provider totals from payroll_summary()"""
+    result = await db(SB.rpc("payroll_summary", {
+        "p_anchor": PAYROLL_ANCHOR_DATE.isoformat(),
+        "p_date_from": date_from.isoformat(),
+        "p_date_to": date_to.isoformat(),
+        "p_provider_id": provider_id,
+    }))
+    return result.data or []
+
+async def _payroll_snapshots(starts: List[date]) -> Dict[str, Dict[str, Any]]:
+    """Closed cycles among the given starts, keyed by start_date"""
+    result = await db(
+        SB.table("payroll_cycles")
+        .select("id, start_date, status, total_sessions, total_minutes, total_amount, closed_at")
+        .gte("start_date", min(starts).isoformat())
+        .lte("start_date", max(starts).isoformat())
+    )
+    return {row["start_date"]: row for row in result.data or []}
+
+def _require_payroll_viewer(auth: Optional[AuthContext], impersonated_role: Optional[str]) -> Optional[str]:
+    """Provider scope for payroll reads; 403 for callers who may not see payroll at all"""
+    effective_role, scoped_provider_id, visible = resolve_session_scope(auth, impersonated_role)
+    if not visible:
+        raise HTTPException(status_code=403, detail="No payroll access for this account")
+    return scoped_provider_id
+
+@app.get("/api/payroll/cycles")
+async def get_payroll_cycles(
+    auth: Optional[AuthContext] = Depends(get_auth_context),
+    impersonated_role: str = Cookie(None),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+):
+    """
+    Biweekly payroll cycles overlapping a period, newest first (default: the
+    last PAYROLL_HISTORY_CYCLES up to the current one). Closed cycles are read
+    from their snapshot; open ones are aggregated by payroll_summary() in one call.
+    """
+    if not SB:
+        logger.error("Database connection not available")
+        raise HTTPException(status_code=500, detail="Database connection error")
+
+    scoped_provider_id = _require_payroll_viewer(auth, impersonated_role)
+
+    today = date.today()
+    last_start = payroll_cycle_start(date.fromisoformat(_parse_date_param(date_to, "date_to") or today.isoformat()))
+    first = _parse_date_param(date_from, "date_from")
+    first_start = payroll_cycle_start(date.fromisoformat(first)) if first else (
+        last_start - timedelta(days=PAYROLL_CYCLE_DAYS * (PAYROLL_HISTORY_CYCLES - 1))
+    )
+    if first_start > last_start:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+
+    starts = []
+    start = last_start
+    while start >= first_start:
+        starts.append(start)
+        start -= timedelta(days=PAYROLL_CYCLE_DAYS)
+
+    try:
+        snapshots = await _payroll_snapshots(starts)
+        cycles = {start: _payroll_cycle(start, snapshots.get(start.isoformat())) for start in starts}
+
+        # Providers only see their own share, even of closed cycles
+        if scoped_provider_id and snapshots:
+            shares = await db(
+                SB.table("payroll_cycle_providers")
+                .select("cycle_id, session_count, total_minutes, total_amount")
+                .eq("provider_id", scoped_provider_id)
+                .in_("cycle_id", [row["id"] for row in snapshots.values()])
+            )
+            by_cycle_id = {row["cycle_id"]: row for row in shares.data or []}
+            for start, cycle in cycles.items():
+                if cycle["closed"]:
+                    share = _payroll_provider_row(by_cycle_id.get(snapshots[start.isoformat()]["id"], {}))
+                    cycle.update({k: share[k] for k in ("total_minutes", "total_amount")},
+                                 total_sessions=share["session_count"])
+
+        # Aggregate the open cycles live, in a single grouped query
+        open_starts = [start for start, cycle in cycles.items() if not cycle["closed"]]
+        if open_starts:
+            live_to = max(open_starts) + timedelta(days=PAYROLL_CYCLE_DAYS - 1)
+            for row in await _payroll_summary(min(open_starts), live_to, scoped_provider_id):
+                cycle = cycles.get(date.fromisoformat(row["cycle_start"]))
+                if not cycle or cycle["closed"]:
+                    continue
+                cycle["total_sessions"] += row.get("session_count") or 0
+                cycle["total_minutes"] += row.get("total_minutes") or 0
+                cycle["total_amount"] += float(row.get("total_amount") or 0)
+
+        return list(cycles.values())
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching payroll cycles: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/payroll/cycles/{cycle_start}")
+async def get_payroll_cycle(
+    cycle_start: str,
+    auth: Optional[AuthContext] = Depends(get_auth_context),
+    impersonated_role: str = Cookie(None),
+):
+    """One cycle with its per-provider breakdown (sessions, minutes, amount billed)"""
+    if not SB:
+        logger.error("Database connection not available")
+        raise HTTPException(status_code=500, detail="Database connection error")
+
+    scoped_provider_id = _require_payroll_viewer(auth, impersonated_role)
+    start = _parse_cycle_start(cycle_start)
+
+    try:
+        snapshot = (await _payroll_snapshots([start])).get(start.isoformat())
+        cycle = _payroll_cycle(start, snapshot)
+
+        if snapshot:
+            query = (
+                SB.table("payroll_cycle_providers")
+                .select("provider_id, provider_name, session_count, total_minutes, total_amount")
+                .eq("cycle_id", snapshot["id"])
+            )
+            if scoped_provider_id:
+                query = query.eq("provider_id", scoped_provider_id)
+            rows = (await db(query.order("provider_name"))).data or []
+        else:
+            end = start + timedelta(days=PAYROLL_CYCLE_DAYS - 1)
+            rows = await _payroll_summary(start, end, scoped_provider_id)
+
+        providers = [_payroll_provider_row(row) for row in rows]
+        cycle.update(
+            total_sessions=sum(p["session_count"] for p in providers),
+            total_minutes=sum(p["total_minutes"] for p in providers),
+            total_amount=sum(p["total_amount"] for p in providers),
+            providers=providers,
+        )
+        return cycle
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching payroll cycle {cycle_start}: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.put("/api/payroll/cycles/{cycle_start}/status")
+async def update_payroll_cycle_status(
+    cycle_start: str,
+    status_data: dict,
+    auth: AuthContext = Depends(require_user),
+    impersonated_role: str = Cookie(None),
+):
+    """
+    Move a cycle through draft -> sent -> approved -> paid. Leaving draft
+    closes the cycle, freezing its totals; setting it back to draft reopens it.
+    """
+    if not SB:
+        logger.error("Database connection not available")
+        raise HTTPException(status_code=500, detail="Database connection error")
+
+    # Check the requesting user may run payroll (as the role they're acting as)
+    if auth.effective_role(impersonated_role) not in ("admin", "billing"):
+        raise HTTPException(status_code=403, detail="Only admin and billing users can update payroll")
+
+    new_status = status_data.get("status")
+    if new_status not in PAYROLL_CYCLE_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {list(PAYROLL_CYCLE_STATUSES)}")
+
+    start = _parse_cycle_start(cycle_start)
+    if new_status != "draft" and start + timedelta(days=PAYROLL_CYCLE_DAYS) > date.today():
+        raise HTTPException(status_code=400, detail="Cycle hasn't ended yet")
+
+    try:
+        snapshot = (await _payroll_snapshots([start])).get(start.isoformat())
+
+        if new_status == "draft":
+            if snapshot:
+                await db(SB.table("payroll_cycles").delete().eq("id", snapshot["id"]))
+                logger.info(f"Reopened payroll cycle {cycle_start}")
+            return _payroll_cycle(start)
+
+        if snapshot:
+            result = await db(
+                SB.table("payroll_cycles")
+                .update({"status": new_status, "updated_at": datetime.now(timezone.utc).isoformat()})
+                .eq("id", snapshot["id"])
+            )
+        else:
+            result = await db(SB.rpc("close_payroll_cycle", {
+                "p_anchor": PAYROLL_ANCHOR_DATE.isoformat(),
+                "p_start_date": start.isoformat(),
+                "p_status": new_status,
+                "p_closed_by": auth.user_id,
+            }))
+            logger.info(f"✓ Closed payroll cycle {cycle_start}")
+
+        rows = result.data or []
+        logger.info(f"Updated payroll cycle {cycle_start} status to {new_status}")
+        return _payroll_cycle(start, rows[0] if rows else {"status": new_status})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error updating payroll cycle {cycle_start}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Age brackets aging_summary() returns, in report order
+AGING_BRACKETS = ("Not Submitted", "0-30 days", "31-60 days", "61-90 days", "90+ days")
+
+# Period lengths revenue_summary() can group by
+REVENUE_INTERVALS = ("day", "week", "month")
+
+def _aging_row(bracket: str, row: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    row = row or {}
+    return {
+        "age_bracket": bracket,
+        "session_count": row.get("session_count") or 0,
+        "amount_billed": float(row.get("amount_billed") or 0),
+        "amount_paid": float(row.get("amount_paid") or 0),
+        "outstanding_amount": float(row.get("outstanding_amount") or 0),
+    }
+
+def _aging_brackets(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Every bracket in order, zero-filled where no sessions fall in it"""
+    by_bracket = {row["age_bracket"]: row for row in rows}
+    return [_aging_row(bracket, by_bracket.get(bracket)) for bracket in AGING_BRACKETS]
+
+@app.get("/api/reports/aging")
+async def get_aging_report(
+    request: Request,
+    auth: Optional[AuthContext] = Depends(get_auth_context),
+    impersonated_role: str = Cookie(None),
+    payer_id: Optional[str] = None,
+    group_by: Optional[str] = None,
+):
+    """
+    Unpaid sessions by age bracket, optionally broken down by provider or
+    payer. Read from the billing_rollups buckets, so cost doesn't grow with
+    the number of sessions.
+    """
+    if not SB:
+        logger.error("Database connection not available")
+        raise HTTPException(status_code=500, detail="Database connection error")
+
+    if group_by and group_by not in SUMMARY_GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"Invalid group_by. Must be one of: {list(SUMMARY_GROUP_BY)}")
+
+    try:
+        effective_role, scoped_provider_id, visible = resolve_session_scope(auth, impersonated_role)
+
+        report = {"as_of": date.today().isoformat(), "group_by": group_by, "brackets": _aging_brackets([]), "groups": []}
+        if not visible:
+            return report
+
+        params = {"p_provider_id": scoped_provider_id, "p_payer_id": payer_id}
+
+        async def build():
+            calls = [db(SB.rpc("aging_summary", {**params, "p_group_by": None}))]
+            if group_by:
+                calls.append(db(SB.rpc("aging_summary", {**params, "p_group_by": group_by})))
+            results = await asyncio.gather(*calls)
+
+            report["brackets"] = _aging_brackets(results[0].data or [])
+
+            if group_by:
+                groups: Dict[Optional[str], Dict[str, Any]] = {}
+                for row in results[1].data or []:
+                    group = groups.setdefault(row.get("group_id"), {"id": row.get("group_id"), "name": row.get("group_name"), "rows": []})
+                    group["rows"].append(row)
+                report["groups"] = sorted(
+                    ({"id": g["id"], "name": g["name"], "brackets": _aging_brackets(g["rows"])} for g in groups.values()),
+                    key=lambda g: -sum(b["outstanding_amount"] for b in g["brackets"])
+                )
+            return report, {}
+
+        # Brackets move with the calendar, so the date is part of the scope
+        return await conditional_json(
+            request, ("sessions", "billing_rollups"), (effective_role, scoped_provider_id, report["as_of"]), build
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching aging report: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/reports/revenue")
+async def get_revenue_report(
+    request: Request,
+    auth: Optional[AuthContext] = Depends(get_auth_context),
+    impersonated_role: str = Cookie(None),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    interval: str = "month",
+    payer_id: Optional[str] = None,
+    group_by: Optional[str] = None,
+):
+    """
+    Sessions, amounts billed and collected per day, week or month of service,
+    optionally broken down by provider or payer. Read from billing_rollups.
+    """
+    if not SB:
+        logger.error("Database connection not available")
+        raise HTTPException(status_code=500, detail="Database connection error")
+
+    if interval not in REVENUE_INTERVALS:
+        raise HTTPException(status_code=400, detail=f"Invalid interval. Must be one of: {list(REVENUE_INTERVALS)}")
+    if group_by and group_by not in SUMMARY_GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"Invalid group_by. Must be one of: {list(SUMMARY_GROUP_BY)}")
+
+    date_from = _parse_date_param(date_from, "date_from")
+    date_to = _parse_date_param(date_to, "date_to")
+
+    try:
+        effective_role, scoped_provider_id, visible = resolve_session_scope(auth, impersonated_role)
+
+        report = {"date_from": date_from, "date_to": date_to, "interval": interval, "group_by": group_by, "periods": []}
+        if not visible:
+            return report
+
+        async def build():
+            result = await db(SB.rpc("revenue_summary", {
+                "p_date_from": date_from,
+                "p_date_to": date_to,
+                "p_interval": interval,
+                "p_provider_id": scoped_provider_id,
+                "p_payer_id": payer_id,
+                "p_group_by": group_by,
+            }))
+
+            report["periods"] = [
+                {
+                    "period": row.get("period"),
+                    **({"id": row.get("group_id"), "name": row.get("group_name")} if group_by else {}),
+                    "session_count": row.get("session_count") or 0,
+                    "total_minutes": row.get("total_minutes") or 0,
+                    "amount_billed": float(row.get("amount_billed") or 0),
+                    "amount_paid": float(row.get("amount_paid") or 0),
+                    "status_counts": row.get("status_counts") or {},
+                }
+                for row in result.data or []
+            ]
+            return report, {}
+
+        return await conditional_json(
+            request, ("sessions", "billing_rollups"), (effective_role, scoped_provider_id), build
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching revenue report: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/reports/rollups/rebuild")
+async def rebuild_billing_rollups(auth: AuthContext = Depends(require_user)):
+    """Recompute billing_rollups from sessions now instead of waiting for the nightly job"""
+    if not SB:
+        logger.error("Database connection not available")
+        raise HTTPException(status_code=500, detail="Database connection error")
+
+    # Check if the requesting user is an admin
+    if auth.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can rebuild report rollups")
+
+    try:
+        started = time.perf_counter()
+        result = await db(SB.rpc("rebuild_billing_rollups"))
+        drifted = result.data or 0
+        logger.info(f"✓ Rebuilt billing rollups in {time.perf_counter() - started:.2f}s ({drifted} buckets had drifted)")
+        return {"success": True, "drifted_buckets": drifted}
+    except Exception as e:
+        logger.error(f"Error rebuilding billing rollups: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/user/profile")
+async def get_user_profile(
+    auth: AuthContext = Depends(require_user),
+    impersonated_role: str = Cookie(None)
+):
+    """Get user profile with role information"""
+    email = auth.email
+
+    if not auth.has_profile:
+        # No profile found, return default
+        logger.warning(f"No profile found for user {auth.user_id}, returning defaults")
+        return {
+            "id": auth.user_id,
+            "email": email,
+            "role": "billing",  # Default role
+            "name": email.split("@")[0] if email else "User"
+        }
+
+    return {
+        "id": auth.user_id,
+        "email": email,
+        # If user is admin and has impersonated role, return that role
+        "role": auth.effective_role(impersonated_role),
+        "name": auth.full_name if auth.full_name is not None else (email or "").split("@")[0]
+    }
+
+@app.get("/api/imports/history")
+async def get_import_history(request: Request, auth: AuthContext = Depends(require_user)):
+    """Get recent import runs with statistics (conditional - 304 until an import starts or finishes)"""
+    if not SB:
+        logger.error("Database connection not available")
+        raise HTTPException(status_code=500, detail="Database connection error")
+
+    async def build():
+        # Query import_runs table, get last 20 imports
+        result = await db(SB.table("import_runs").select(
+            "id, source, file_name, started_at, finished_at, parent_run_id, "
+            "total_rows, inserted_rows, updated_rows, flagged_rows, skipped_rows, errors"
+        ).order("started_at", desc=True).limit(20))
+
+        logger.info(f"Found {len(result.data) if result.data else 0} import runs")
+        return result.data or [], {}
+
+    try:
+        # Every signed-in user sees the same history
+        return await conditional_json(request, ("import_runs",), None, build)
+    except Exception as e:
+        logger.error(f"Error fetching import history: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Check if the requesting user is an admin
-        requesting_user_id = auth_response.user.id
-        profile_result = SB.table("profiles").select("role").eq("id", requesting_user_id).limit(1).execute()
+@app.put("/api/users/{user_id}/role")
+async def update_user_role(
+    user_id: str,
+    role_data: dict,
+    auth: AuthContext = Depends(require_user)
+):
+    """Update user role"""
+    if not SB:
+        logger.error("Database connection not available")
+        raise HTTPException(status_code=500, detail="Database connection error")
 
-        if not profile_result.data or profile_result.data[0].get("role") != "admin":
-            raise HTTPException(status_code=403, detail="Only admins can update user roles")
+    # Check if the requesting user is an admin
+    if auth.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can update user roles")
 
+    try:
         # Validate role
         new_role = role_data.get("role")
         valid_roles = ["admin", "billing", "manager", "provider"]
@@ -741,10 +3994,11 @@ async def update_user_role(
             raise HTTPException(status_code=400, detail=f"Invalid role. Must be one of: {valid_roles}")
 
         # Update user role in profiles table
-        update_result = SB.table("profiles").update({"role": new_role}).eq("id", user_id).execute()
+        update_result = await db(SB.table("profiles").update({"role": new_role}).eq("id", user_id))
 
         if update_result.data:
             logger.info(f"Updated user {user_id} role to {new_role}")
+            invalidate_auth_context(user_id)
             return {"success": True, "message": f"User role updated to {new_role}"}
         else:
             raise HTTPException(status_code=404, detail="User not found")
@@ -755,70 +4009,130 @@ async def update_user_role(
         logger.error(f"Error updating user role: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Page size for GET /api/users and for the auth admin list-users sweep
+USERS_PAGE_SIZE = int(os.environ.get("USERS_PAGE_SIZE", "100"))
+AUTH_LIST_USERS_PAGE_SIZE = 1000
+
+# Concurrent per-user lookups allowed when the bulk sweep is unavailable
+USER_EMAIL_LOOKUP_CONCURRENCY = int(os.environ.get("USER_EMAIL_LOOKUP_CONCURRENCY", "8"))
+
+# user id -> email from the last admin list-users sweep, plus users looked up since
+USER_EMAIL_CACHE = TTLCache(1, float(os.environ.get("USER_EMAIL_CACHE_TTL_SECONDS", "60")))
+
+def _list_user_emails() -> Dict[str, Optional[str]]:
+    """Page through every auth user once and map id -> email"""
+    emails: Dict[str, Optional[str]] = {}
+    page = 1
+    while True:
+        users = SB.auth.admin.list_users(page=page, per_page=AUTH_LIST_USERS_PAGE_SIZE)
+        for user in users:
+            emails[user.id] = user.email
+        if len(users) < AUTH_LIST_USERS_PAGE_SIZE:
+            return emails
+        page += 1
+
+async def _lookup_user_emails(user_ids: List[str]) -> Dict[str, Optional[str]]:
+    """Fallback: fetch emails one user at a time with bounded concurrency"""
+    semaphore = asyncio.Semaphore(USER_EMAIL_LOOKUP_CONCURRENCY)
+
+    async def lookup(user_id: str):
+        async with semaphore:
+            try:
+                auth_user = await run_db(SB.auth.admin.get_user_by_id, user_id)
+                if auth_user and auth_user.user:
+                    return user_id, auth_user.user.email
+            except Exception as e:
+                logger.warning(f"Could not get email for user {user_id}: {e}")
+            return user_id, None
+
+    return dict(await asyncio.gather(*(lookup(user_id) for user_id in user_ids)))
+
 @app.get("/api/users")
-async def get_users(authorization: str = Header(None)):
-    """Get all users with their roles"""
+async def get_users(
+    response: Response,
+    auth: AuthContext = Depends(require_user),
+    page: int = 1,
+    per_page: int = USERS_PAGE_SIZE
+):
+    """
+    Get users with their roles, one page of profiles at a time.
+    Emails come from a single paged auth sweep (cached briefly) rather than
+    one auth call per user; users newer than the cached sweep are looked up
+    individually. The total is returned in X-Total-Count.
+    """
     if not SB:
         logger.error("Database connection not available")
         raise HTTPException(status_code=500, detail="Database connection error")
 
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
-
-    try:
-        # Extract token
-        token = authorization.replace("Bearer ", "")
-
-        # Verify token with Supabase
-        auth_response = SB.auth.get_user(token)
-        if not auth_response or not auth_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
+    # Check if the requesting user is an admin
+    if auth.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can view all users")
 
-        # Check if the requesting user is an admin
-        requesting_user_id = auth_response.user.id
-        profile_result = SB.table("profiles").select("role").eq("id", requesting_user_id).limit(1).execute()
+    if page < 1:
+        raise HTTPException(status_code=400, detail="page must be 1 or greater")
+    if per_page < 1 or per_page > AUTH_LIST_USERS_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"per_page must be between 1 and {AUTH_LIST_USERS_PAGE_SIZE}")
 
-        if not profile_result.data or profile_result.data[0].get("role") != "admin":
-            raise HTTPException(status_code=403, detail="Only admins can view all users")
-
-        # Get all users from profiles table
-        users_result = SB.table("profiles").select("id, role, full_name, created_at").execute()
+    try:
+        # Get one page of users from profiles table
+        start = (page - 1) * per_page
+        users_result = await db(
+            SB.table("profiles")
+            .select("id, role, full_name, created_at", count="exact")
+            .order("created_at")
+            .order("id")
+            .range(start, start + per_page - 1)
+        )
+        if users_result.count is not None:
+            response.headers["X-Total-Count"] = str(users_result.count)
 
-        if users_result.data:
-            # Get email addresses from auth users
-            users_with_emails = []
-            for user in users_result.data:
-                try:
-                    # Get user email from auth
-                    auth_user = SB.auth.admin.get_user_by_id(user["id"])
-                    if auth_user and auth_user.user:
-                        users_with_emails.append({
-                            "id": user["id"],
-                            "email": auth_user.user.email,
-                            "full_name": user.get("full_name", "Unknown"),
-                            "role": user.get("role", "provider"),
-                            "created_at": user.get("created_at", "")
-                        })
-                except Exception as e:
-                    logger.warning(f"Could not get email for user {user['id']}: {e}")
-                    # Add user without email
-                    users_with_emails.append({
-                        "id": user["id"],
-                        "email": "unknown@example.com",
-                        "full_name": user.get("full_name", "Unknown"),
-                        "role": user.get("role", "provider"),
-                        "created_at": user.get("created_at", "")
-                    })
+        profiles = users_result.data or []
+        if not profiles:
+            return []
 
-            return users_with_emails
+        # Get email addresses from auth users in bulk
+        emails = USER_EMAIL_CACHE.get("emails")
+        if emails is None:
+            try:
+                emails = await run_db(_list_user_emails)
+                USER_EMAIL_CACHE.set("emails", emails)
+            except Exception as e:
+                logger.warning(f"Bulk auth user listing failed, looking up emails per user: {e}")
+                emails = await _lookup_user_emails([user["id"] for user in profiles])
         else:
-            return []
+            # Users who signed up since the cached sweep aren't in it yet
+            missing = [user["id"] for user in profiles if user["id"] not in emails]
+            if missing:
+                emails.update(await _lookup_user_emails(missing))
+
+        return [
+            {
+                "id": user["id"],
+                "email": emails.get(user["id"]) or "unknown@example.com",
+                "full_name": user.get("full_name", "Unknown"),
+                "role": user.get("role", "provider"),
+                "created_at": user.get("created_at", "")
+            }
+            for user in profiles
+        ]
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error fetching users: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/metrics")
+async def metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus scrape endpoint"""
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+    lines: List[str] = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return Response(content="\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
 @app.get("/api/imports/test-connection")
 async def test_database_connection():
     """Test database connection and return status"""
@@ -827,13 +4141,13 @@ async def test_database_connection():
 
     try:
         # Test connection by querying providers table
-        result = SB.table("providers").select("count").limit(1).execute()
+        result = await db(SB.table("providers").select("count").limit(1))
 
         # Test all required tables
         tables_status = {}
         for table in ["providers", "clients", "sessions", "payers", "import_runs"]:
             try:
-                SB.table(table).select("count").limit(1).execute()
+                await db(SB.table(table).select("count").limit(1))
                 tables_status[table] = "✅ Available"
             except Exception as e:
                 tables_status[table] = f"❌ Error: {str(e)}"
@@ -849,6 +4163,103 @@ async def test_database_connection():
             "message": f"Database connection failed: {str(e)}"
         }
 
+@app.get("/api/imports/{run_id}")
+async def get_import_status(run_id: str, auth: AuthContext = Depends(require_user)):
+    """Progress of a queued or running import, or the recorded outcome of a finished one"""
+    job = IMPORT_JOBS.get(run_id)
+    if job:
+        return job.progress()
+
+    if not SB:
+        logger.error("Database connection not available")
+        raise HTTPException(status_code=500, detail="Database connection error")
+
+    try:
+        result = await db(SB.table("import_runs").select(
+            "id, source, file_name, started_at, finished_at, "
+            "total_rows, inserted_rows, updated_rows, flagged_rows, error_rows, errors"
+        ).eq("id", run_id).limit(1))
+    except Exception as e:
+        logger.error(f"Error fetching import run {run_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Import run not found")
+
+    run = result.data[0]
+    errors = run.get("errors") or []
+    # Not tracked by this process - either finished, or lost with a previous worker
+    status = recorded_run_status(run)
+    response = {
+        "run_id": run["id"],
+        "status": status,
+        "file_name": run.get("file_name"),
+        "rows_processed": run.get("total_rows") or 0,
+        "inserted": run.get("inserted_rows") or 0,
+        "updated": run.get("updated_rows") or 0,
+        "flagged": run.get("flagged_rows") or 0,
+        "errors": run.get("error_rows") if run.get("error_rows") is not None else len(errors),
+        "started_at": run.get("started_at"),
+        "finished_at": run.get("finished_at"),
+    }
+    if status == "failed":
+        # Same shape as a failed ImportResult, for pollers that stop on it
+        failure = next((e["error"] for e in errors if "row" not in e), "Import failed")
+        response.update(success=False, message=f"Import failed: {failure}")
+    return response
+
+def recorded_run_status(run: Dict[str, Any]) -> str:
+    """
+    Outcome of an import_runs row: a finished run failed when its totals were
+    never recorded or it carries a run-level error (row errors carry a row number)
+    """
+    if not run.get("finished_at"):
+        return "unknown"
+    errors = run.get("errors") or []
+    if run.get("total_rows") is None or any("row" not in error for error in errors):
+        return "failed"
+    return "completed"
+
+# Chunk size when inflating a report for clients that don't accept gzip
+REPORT_STREAM_CHUNK_BYTES = 64 * 1024
+
+@app.get("/api/imports/{run_id}/report")
+async def get_import_report(
+    run_id: str,
+    accept_encoding: Optional[str] = Header(None),
+    auth: AuthContext = Depends(require_user)
+):
+    """
+    Every rejected, flagged and duplicate row of an import as NDJSON.
+    Sent gzip-encoded as stored; inflated on the fly for clients that
+    don't accept gzip.
+    """
+    job = IMPORT_JOBS.get(run_id)
+    if job and job.status in ("queued", "running"):
+        raise HTTPException(status_code=409, detail="Import is still running")
+
+    if not SB:
+        logger.error("Database connection not available")
+        raise HTTPException(status_code=500, detail="Database connection error")
+
+    try:
+        data = await run_db(SB.storage.from_(IMPORT_REPORTS_BUCKET).download, import_report_path(run_id))
+    except Exception as e:
+        logger.warning(f"No import report for run {run_id}: {e}")
+        raise HTTPException(status_code=404, detail="No report for this import run")
+
+    headers = {"Content-Disposition": f'attachment; filename="import-{run_id}-report.ndjson"'}
+    if "gzip" in (accept_encoding or "").lower():
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=data, media_type="application/x-ndjson", headers=headers)
+
+    def inflate() -> Iterator[bytes]:
+        with gzip.GzipFile(fileobj=io.BytesIO(data)) as report:
+            while chunk := report.read(REPORT_STREAM_CHUNK_BYTES):
+                yield chunk
+
+    return StreamingResponse(inflate(), media_type="application/x-ndjson", headers=headers)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,33 @@
+"""
+Fixtures that run backend/main.py against the in-memory Supabase fake in
+scripts/fake_supabase.py - no network or credentials needed.
+
+Run from backend/:  python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(TESTS_DIR)
+SCRIPTS_DIR = os.path.join(BACKEND_DIR, "..", "scripts")
+
+# Never talk to a real project, whatever the environment says
+os.environ["SUPABASE_URL"] = ""
+os.environ["SUPABASE_SERVICE_ROLE_KEY"] = ""
+sys.path[:0] = [BACKEND_DIR, SCRIPTS_DIR]
+
+import main  # noqa: E402
+from fake_supabase import FakeSupabase  # noqa: E402
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    """A fresh fake client installed as main.SB"""
+    client = FakeSupabase()
+    monkeypatch.setattr(main, "SB", client)
+    monkeypatch.setattr(main, "STORAGE_HTTP", client.http_client())
+    main.IMPORT_JOBS.clear()
+    return client
+
@@ -0,0 +1,52 @@
+"""
+Scratch Postgres databases for testing sql/essential migrations. Set
+TEST_DATABASE_URL to a server where tests may create (and drop) databases;
+tests using these helpers are skipped otherwise.
+"""
+import contextlib
+import os
+import uuid
+
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+
+DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "sql", "essential")
+
+requires_database = pytest.mark.skipif(not DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+# The Supabase roles the migrations grant to and revoke from
+ROLES = """
+    DO $$ BEGIN
+      IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'service_role') THEN
+        CREATE ROLE service_role;
+      END IF;
+      IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'anon') THEN
+        CREATE ROLE anon;
+      END IF;
+      IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'authenticated') THEN
+        CREATE ROLE authenticated;
+      END IF;
+    END $$;
+"""
+
+
+@contextlib.contextmanager
+def scratch_database(schema: str, *migrations: str):
+    """Conninfo for a fresh database with `schema` and then each migration file applied"""
+    name = f"scratch_{uuid.uuid4().hex[:12]}"
+    with psycopg.connect(DATABASE_URL, autocommit=True) as admin:
+        admin.execute(f"CREATE DATABASE {name}")
+    info = psycopg.conninfo.make_conninfo(DATABASE_URL, dbname=name)
+    try:
+        with psycopg.connect(info, autocommit=True) as conn:
+            conn.execute(ROLES)
+            conn.execute(schema)
+            for migration in migrations:
+                with open(os.path.join(MIGRATIONS_DIR, migration)) as fh:
+                    conn.execute(fh.read())
+        yield info
+    finally:
+        with psycopg.connect(DATABASE_URL, autocommit=True) as admin:
+            admin.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
@@ -0,0 +1,33 @@
+"""Helpers for building SimplePractice uploads and running imports in tests"""
+import asyncio
+import csv
+import io
+
+import main
+from gen_simplepractice_csv import ACTUAL_HEADER
+from starlette.datastructures import UploadFile
+
+
+def export_rows(clients=20, sessions_per_client=140, providers=3):
+    """An export in the current layout where every row is a distinct session"""
+    rows = []
+    for client in range(clients):
+        for day in range(sessions_per_client):
+            rows.append([
+                f"{1 + day % 12:02d}/{1 + day // 12:02d}/2025 10:00", f"Client {client}",
+                f"Clinician {client % providers}", "90837 ", "Aetna (80954)", "", "160.0 ", "1 ",
+                "160.0", "PAID", "38.0", "0.0", "38.0", "0.0", "PAID", "122.0", "0.0", "0.0",
+            ])
+    return rows
+
+
+def csv_upload(rows, filename="export.csv"):
+    text = io.StringIO()
+    csv.writer(text).writerows([ACTUAL_HEADER, *rows])
+    return UploadFile(io.BytesIO(text.getvalue().encode("utf-8")), filename=filename)
+
+
+def import_rows(rows, filename="export.csv", force=False):
+    """POST /api/imports/simplepractice?wait=true with these rows"""
+    return asyncio.run(main.import_simplepractice(csv_upload(rows, filename), wait=True, force=force,
+                                                  dry_run=False, auth=None))
@@ -0,0 +1,45 @@
+"""Local bearer token verification (get_auth_context)"""
+import asyncio
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+
+import main
+
+
+class FailingJWKClient:
+    def __init__(self, error):
+        self.error = error
+
+    def get_signing_key_from_jwt(self, token):
+        raise self.error
+
+
+@pytest.fixture
+def rs256_token(fake, monkeypatch):
+    monkeypatch.setenv("SUPABASE_URL", "https://project.supabase.co")
+    main.AUTH_CACHE.clear()
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    claims = {"sub": "user-1", "aud": "authenticated", "exp": int(time.time()) + 300}
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": "rotated-away"})
+
+
+def auth_status(token):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.get_auth_context(f"Bearer {token}"))
+    return error.value.status_code
+
+
+def test_unknown_signing_key_is_unauthorized(rs256_token, monkeypatch):
+    monkeypatch.setattr(main, "_jwks_client", FailingJWKClient(
+        jwt.PyJWKClientError('Unable to find a signing key that matches: "rotated-away"')))
+    assert auth_status(rs256_token) == 401
+
+
+def test_unreachable_jwks_is_unavailable(rs256_token, monkeypatch):
+    monkeypatch.setattr(main, "_jwks_client", FailingJWKClient(
+        jwt.PyJWKClientConnectionError("Fail to fetch data from the url, err: timed out")))
+    assert auth_status(rs256_token) == 503
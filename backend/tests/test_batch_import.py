@@ -0,0 +1,75 @@
+"""Batch imports: several exports parsed in worker processes, written as one parent run"""
+import asyncio
+import os
+from concurrent.futures import Future
+
+import pytest
+
+import main
+from support import csv_upload, export_rows
+
+
+def import_batch(files):
+    """POST /api/imports/simplepractice/batch?wait=true with these (filename, rows) files"""
+    uploads = [csv_upload(rows, filename) for filename, rows in files]
+    return asyncio.run(main.import_simplepractice_batch(uploads, wait=True, force=False, auth=None))
+
+
+@pytest.fixture(params=[1, 2], ids=["inline", "processes"])
+def parse_processes(request, monkeypatch):
+    monkeypatch.setattr(main, "IMPORT_PARSE_PROCESSES", request.param)
+    return request.param
+
+
+def test_batch_counts_rows_across_files(fake, parse_processes):
+    rows = export_rows()
+    bad = list(rows[0])
+    bad[0] = "not a date"
+    files = [
+        ("january.csv", rows[:1200]),
+        ("february.csv", rows[1000:2000] + [bad]),  # 200 rows repeated from january
+        ("march.csv", rows[2000:]),
+    ]
+
+    result = import_batch(files)
+
+    assert result.success
+    assert (result.total, result.inserted, result.errors) == (3001, 2800, 1)
+    assert result.duplicates == 200
+    assert [child["total"] for child in result.child_runs] == [1200, 1001, 800]
+    assert len(fake.rows("sessions")) == 2800
+
+
+def staged(path, chunk_size):
+    """stage_parsed_file run in this process, wrapped like a pool result"""
+    future = Future()
+    future.set_result(main.stage_parsed_file(path, chunk_size))
+    return future
+
+
+@pytest.fixture
+def export_path(tmp_path):
+    path = tmp_path / "export.csv"
+    path.write_bytes(csv_upload(export_rows(clients=5, sessions_per_client=50)).file.read())
+    return str(path)
+
+
+def test_parsed_files_come_back_in_bounded_chunks(export_path):
+    future = staged(export_path, chunk_size=100)
+    stream = main.read_staged_file(future)
+
+    header = next(stream)
+    chunks = list(stream)
+
+    assert header[:2] == ["Date of Service", "Client"]
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+    assert [row_num for row_num, *_ in chunks[0]][:2] == [2, 3]
+    assert not os.path.exists(future.result())
+
+
+def test_abandoned_staged_file_is_removed(export_path):
+    future = staged(export_path, chunk_size=100)
+    stream = main.read_staged_file(future)
+    next(stream)
+    stream.close()
+    assert not os.path.exists(future.result())
@@ -0,0 +1,66 @@
+"""
+sql/essential/2026-10-18-billing-rollups.sql against a real Postgres
+(TEST_DATABASE_URL, see sql_support.py).
+"""
+import uuid
+
+import pytest
+
+from sql_support import psycopg, requires_database, scratch_database
+
+pytestmark = requires_database
+
+# Signed-in users read and update sessions directly (billing status changes
+# from the frontend) but have no access to billing_rollups
+SCHEMA = """
+    CREATE TABLE public.providers (id uuid PRIMARY KEY, name text);
+    CREATE TABLE public.payers (id uuid PRIMARY KEY, name text);
+    CREATE TABLE public.sessions (
+      id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+      provider_id uuid,
+      payer_id uuid,
+      session_date date,
+      date_submitted timestamptz,
+      billing_status text,
+      minutes integer,
+      amount_billed numeric,
+      amount_paid numeric
+    );
+    ALTER TABLE public.sessions ENABLE ROW LEVEL SECURITY;
+    CREATE POLICY "Signed-in users manage sessions" ON public.sessions
+      FOR ALL TO authenticated USING (true) WITH CHECK (true);
+    GRANT SELECT, INSERT, UPDATE, DELETE ON public.sessions TO authenticated;
+"""
+
+
+@pytest.fixture
+def conninfo():
+    with scratch_database(SCHEMA, "2026-10-18-billing-rollups.sql") as info:
+        yield info
+
+
+def buckets(conn):
+    return conn.execute(
+        "SELECT billing_status, session_count, amount_billed FROM public.billing_rollups "
+        "WHERE session_count <> 0 ORDER BY billing_status"
+    ).fetchall()
+
+
+def test_status_change_by_signed_in_user_updates_rollups(conninfo):
+    session = uuid.uuid4()
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        conn.execute(
+            "INSERT INTO public.sessions (id, session_date, billing_status, amount_billed) "
+            "VALUES (%s, '2026-03-02', 'pending', 160), (DEFAULT, '2026-03-02', 'pending', 40)",
+            (session,)
+        )
+
+        conn.execute("SET ROLE authenticated")
+        conn.execute("UPDATE public.sessions SET billing_status = 'billed' WHERE id = %s", (session,))
+        conn.execute("DELETE FROM public.sessions WHERE id <> %s", (session,))
+        with pytest.raises(psycopg.errors.InsufficientPrivilege):
+            conn.execute("SELECT 1 FROM public.billing_rollups")
+        conn.execute("RESET ROLE")
+
+        assert buckets(conn) == [("billed", 1, 160)]
+        assert conn.execute("SELECT public.rebuild_billing_rollups()").fetchone()[0] == 0
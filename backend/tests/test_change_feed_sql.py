@@ -0,0 +1,91 @@
+"""
+sql/essential/2026-10-18-session-change-feed.sql against a real Postgres
+(TEST_DATABASE_URL, see sql_support.py).
+"""
+import uuid
+
+import pytest
+
+from sql_support import psycopg, requires_database, scratch_database
+
+pytestmark = requires_database
+
+
+@pytest.fixture
+def conninfo():
+    """A scratch database with a minimal sessions table and the migration applied"""
+    with scratch_database("""
+        CREATE TABLE public.sessions (
+          id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+          provider_id uuid,
+          session_date date
+        );
+        GRANT SELECT, INSERT, UPDATE, DELETE ON public.sessions TO authenticated;
+    """, "2026-10-18-session-change-feed.sql") as info:
+        yield info
+
+
+def change_cursor(conn):
+    return conn.execute("SELECT cursor FROM public.session_change_cursor()").fetchone()[0]
+
+
+def changes_after(conn, cursor):
+    return conn.execute(
+        "SELECT session_id, provider_id, old_provider_id, deleted FROM public.session_changes "
+        "WHERE change_seq > %s ORDER BY change_seq", (cursor,)
+    ).fetchall()
+
+
+def test_cursor_never_passes_a_change_still_in_flight(conninfo):
+    provider, first, second = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    with psycopg.connect(conninfo) as slow, psycopg.connect(conninfo) as fast, \
+            psycopg.connect(conninfo, autocommit=True) as reader:
+        # Two imports: the first writes before the second but commits after it
+        slow.execute("INSERT INTO public.sessions (id, provider_id) VALUES (%s, %s)", (first, provider))
+        fast.execute("INSERT INTO public.sessions (id, provider_id) VALUES (%s, %s)", (second, provider))
+        fast.commit()
+
+        cursor = change_cursor(reader)
+        assert [row[0] for row in changes_after(reader, 0)] == [second]
+
+        slow.commit()
+
+        # A client that synced up to `cursor` still gets the late commit
+        assert [row[0] for row in changes_after(reader, cursor)] == [first]
+        assert change_cursor(reader) > cursor
+
+
+def test_reassignments_and_deletes_name_the_old_provider(conninfo):
+    old, new, session = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        conn.execute("INSERT INTO public.sessions (id, provider_id) VALUES (%s, %s)", (session, old))
+        conn.execute("UPDATE public.sessions SET provider_id = %s WHERE id = %s", (new, session))
+        conn.execute("DELETE FROM public.sessions WHERE id = %s", (session,))
+
+        assert changes_after(conn, 0) == [
+            (session, old, None, False),
+            (session, new, old, False),
+            (session, None, new, True),
+        ]
+
+
+def test_pruned_cursor_is_reported(conninfo):
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        conn.execute("INSERT INTO public.sessions (provider_id) VALUES (NULL), (NULL)")
+        latest = change_cursor(conn)
+        assert conn.execute("SELECT public.prune_session_changes(interval '0')").fetchone()[0] == latest
+        assert conn.execute("SELECT * FROM public.session_change_cursor()").fetchone() == (latest, latest)
+
+
+def test_signed_in_users_writes_are_logged(conninfo):
+    # The frontend writes sessions directly; only the trigger may write the log
+    session, provider = uuid.uuid4(), uuid.uuid4()
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        conn.execute("SET ROLE authenticated")
+        conn.execute("INSERT INTO public.sessions (id, provider_id) VALUES (%s, %s)", (session, provider))
+        conn.execute("UPDATE public.sessions SET session_date = '2026-03-02' WHERE id = %s", (session,))
+        with pytest.raises(psycopg.errors.InsufficientPrivilege):
+            conn.execute("SELECT 1 FROM public.session_changes")
+        conn.execute("RESET ROLE")
+
+        assert changes_after(conn, 0) == [(session, provider, None, False), (session, provider, provider, False)]
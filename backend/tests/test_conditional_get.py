@@ -0,0 +1,55 @@
+"""ETags and the response cache follow data versions read from the database"""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def client(fake, monkeypatch):
+    versions = {"sessions": 7, "import_runs": 3}
+    fake.versions = versions
+    fake.rpc_handlers["data_versions"] = lambda client, params: [
+        {"table_name": table, "version": version} for table, version in versions.items()
+    ]
+    fake.seed("import_runs", [{"file_name": "march.csv", "started_at": "2026-03-01T00:00:00Z"}])
+    monkeypatch.setattr(main, "RESPONSE_CACHE", main.TTLCache(16, 300))
+    main.app.dependency_overrides[main.require_user] = lambda: main.AuthContext("user-1", None, "admin")
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
+
+
+def test_unchanged_versions_answer_304(client):
+    first = client.get("/api/imports/history")
+    assert first.status_code == 200
+    again = client.get("/api/imports/history", headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+
+
+def test_write_made_elsewhere_changes_the_etag(client, fake):
+    first = client.get("/api/imports/history")
+    assert [run["file_name"] for run in first.json()] == ["march.csv"]
+
+    # Another instance records a run: the database bumps the version, not us
+    fake.seed("import_runs", [{"file_name": "april.csv", "started_at": "2026-04-01T00:00:00Z"}])
+    fake.versions["import_runs"] += 1
+
+    second = client.get("/api/imports/history", headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert second.headers["etag"] != first.headers["etag"]
+    assert [run["file_name"] for run in second.json()] == ["april.csv", "march.csv"]
+
+
+def test_other_tables_leave_the_etag_alone(client, fake):
+    first = client.get("/api/imports/history")
+    fake.versions["sessions"] += 1
+    again = client.get("/api/imports/history", headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+
+
+def test_unreadable_versions_serve_fresh_untagged_body(client, fake):
+    fake.failures[("rpc", "data_versions")] = RuntimeError("connection reset")
+    response = client.get("/api/imports/history")
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+    assert [run["file_name"] for run in response.json()] == ["march.csv"]
@@ -0,0 +1,60 @@
+"""
+sql/essential/2026-10-18-data-versions.sql against a real Postgres
+(TEST_DATABASE_URL, see sql_support.py).
+"""
+import pytest
+
+from sql_support import psycopg, requires_database, scratch_database
+
+pytestmark = requires_database
+
+SCHEMA = """
+    CREATE TABLE public.providers (id uuid PRIMARY KEY, name text);
+    CREATE TABLE public.payers (id uuid PRIMARY KEY, name text);
+    CREATE TABLE public.sessions (
+      id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+      provider_id uuid,
+      payer_id uuid,
+      session_date date,
+      date_submitted timestamptz,
+      billing_status text,
+      minutes integer,
+      amount_billed numeric,
+      amount_paid numeric
+    );
+    CREATE TABLE public.import_runs (
+      id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+      file_name text
+    );
+    GRANT SELECT, INSERT, UPDATE, DELETE ON public.sessions, public.import_runs TO authenticated;
+"""
+
+
+@pytest.fixture
+def conninfo():
+    with scratch_database(SCHEMA, "2026-10-18-billing-rollups.sql", "2026-10-18-session-change-feed.sql",
+                          "2026-10-18-data-versions.sql") as info:
+        yield info
+
+
+def versions(conn):
+    return dict(conn.execute("SELECT * FROM public.data_versions()").fetchall())
+
+
+def test_writes_by_signed_in_users_bump_versions(conninfo):
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        before = versions(conn)
+
+        conn.execute("SET ROLE authenticated")
+        conn.execute("INSERT INTO public.import_runs (file_name) VALUES ('march.csv'), ('april.csv')")
+        conn.execute("INSERT INTO public.sessions (session_date, billing_status) VALUES ('2026-03-02', 'pending')")
+        with pytest.raises(psycopg.errors.InsufficientPrivilege):
+            conn.execute("SELECT 1 FROM public.table_versions")
+        conn.execute("RESET ROLE")
+
+        after = versions(conn)
+        assert after["import_runs"] == before.get("import_runs", 0) + 1  # one per statement
+        assert after["sessions"] > before["sessions"]
+
+        conn.execute("SELECT public.rebuild_billing_rollups()")
+        assert versions(conn)["billing_rollups"] == before.get("billing_rollups", 0) + 1
@@ -0,0 +1,33 @@
+"""GET /api/imports/{run_id} for runs this process no longer tracks"""
+import asyncio
+
+from postgrest.exceptions import APIError
+
+import main
+from support import export_rows, import_rows
+
+
+def recorded_status(run_id):
+    main.IMPORT_JOBS.clear()  # as after a restart, or on another worker
+    return asyncio.run(main.get_import_status(run_id, auth=None))
+
+
+def test_failed_run_is_reported_as_failed(fake):
+    fake.failures[("sessions", "upsert")] = APIError({"message": "canceling statement due to statement timeout", "code": "57014"})
+    result = import_rows(export_rows(clients=2, sessions_per_client=10))
+
+    status = recorded_status(result.run_id)
+
+    assert status["status"] == "failed" and status["success"] is False
+    assert "statement timeout" in status["message"]
+
+
+def test_run_with_row_errors_is_reported_as_completed(fake):
+    rows = export_rows(clients=2, sessions_per_client=10)
+    rows[3][0] = "2025-13-01 10:00"  # invalid date - a row error, not a failed run
+    result = import_rows(rows)
+
+    status = recorded_status(result.run_id)
+
+    assert status["status"] == "completed" and "success" not in status
+    assert (status["inserted"], status["errors"]) == (19, 1)
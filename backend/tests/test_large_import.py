@@ -0,0 +1,83 @@
+"""
+Memory stays flat however large the upload: rows stream through the importer,
+the upload is copied to storage in chunks and duplicate-check keys spill to disk.
+
+The big import is marked slow; run it from backend/ with  python -m pytest -m slow
+(LARGE_IMPORT_MB sets the generated file's size).
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import main
+from fake_supabase import FakeSupabase
+from gen_simplepractice_csv import write_csv
+from support import export_rows, import_rows
+from starlette.datastructures import UploadFile
+
+LARGE_IMPORT_MB = int(os.environ.get("LARGE_IMPORT_MB", "200"))
+ROWS_PER_MB = 7300  # generated rows in the current layout average ~137 bytes
+
+# Peak RSS growth allowed during the import - roughly the batch buffers, the
+# in-memory share of duplicate-check keys and a practice's reference data
+RSS_GROWTH_LIMIT_MB = 64
+
+
+def test_duplicates_are_found_after_keys_spill_to_disk(fake, monkeypatch):
+    monkeypatch.setattr(main, "SEEN_RECORDS_IN_MEMORY", 100)
+    rows = export_rows(clients=5, sessions_per_client=100)
+
+    result = import_rows(rows + rows[:50])
+
+    assert (result.inserted, result.duplicates) == (500, 50)
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB elsewhere
+
+
+def import_measuring_rss(path: str):
+    """Import `path` against a fake that keeps no session rows; returns counts, RSS growth and the stored copy's size"""
+    logging.disable(logging.WARNING)
+    fake = FakeSupabase(write_only=("sessions", "import_row_fingerprints", "import_staging"))
+    main.SB = fake
+    main.STORAGE_HTTP = fake.http_client()
+
+    before = peak_rss_mb()
+    with open(path, "rb") as fh:
+        upload = UploadFile(fh, filename=os.path.basename(path))
+        result = asyncio.run(main.import_simplepractice(upload, wait=True, force=False, dry_run=False, auth=None))
+    growth = peak_rss_mb() - before
+
+    stored = fake.object_bytes(main.IMPORT_UPLOADS_BUCKET, main.import_upload_path(result.run_id), peek=True)
+    stored.seek(0, os.SEEK_END)
+    counts = (result.total, result.inserted + result.updated, result.duplicates, result.flagged, result.errors)
+    return result.status, counts, growth, stored.tell(), fake.calls[("storage", "upload")]
+
+
+@pytest.mark.slow
+def test_large_export_imports_in_flat_memory(tmp_path):
+    path = str(tmp_path / "large.csv")
+    rows = LARGE_IMPORT_MB * ROWS_PER_MB
+    write_csv(path, rows, clients=3000)
+
+    # A fresh interpreter, so the peak isn't left over from earlier tests
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        status, counts, growth, stored_bytes, uploads = pool.submit(import_measuring_rss, path).result()
+
+    total, written, duplicates, flagged, errors = counts
+    assert status == "completed"
+    assert total == rows and written + duplicates + flagged + errors == total
+    assert duplicates > 0
+    assert growth < RSS_GROWTH_LIMIT_MB, f"RSS grew {growth:.0f} MB importing a {LARGE_IMPORT_MB} MB file"
+
+    # The upload was copied to storage (for resuming) in one streamed request
+    assert stored_bytes == os.path.getsize(path)
+    assert uploads == 2  # the upload, then the run's report
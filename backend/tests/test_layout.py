@@ -0,0 +1,17 @@
+"""Compiled SimplePractice column layouts"""
+import pytest
+
+import main
+from gen_simplepractice_csv import ACTUAL_HEADER
+
+
+def test_short_row_reports_the_width_checked():
+    layout = main.SimplePracticeLayout(ACTUAL_HEADER)
+    # The last column the importer reads is Primary Insurance, the 5th of 18
+    assert layout.width == 5
+
+    with pytest.raises(ValueError, match="Row has 2 columns, expected at least 5"):
+        layout.extract(["01/02/2025 10:00", "Client 1"])
+
+    # Trailing columns the importer ignores may be missing
+    assert layout.extract(["01/02/2025 10:00", "Client 1", "Clinician 1", "90837", "Aetna (80954)"])
@@ -0,0 +1,38 @@
+"""Payer matching against a payers table larger than one PostgREST page"""
+import pytest
+
+import main
+from support import export_rows, import_rows
+
+
+@pytest.fixture
+def many_payers(fake, monkeypatch):
+    fake.max_rows = 1000
+    monkeypatch.setattr(main, "_payer_resolver", None)
+    fake.seed("payers", [{"name": f"Payer {i}", "external_id": str(10000 + i)} for i in range(1500)])
+    # Past the first page when ordered by id
+    fake.seed("payers", [{"name": "Aetna", "external_id": "80954"}])
+    return fake
+
+
+def test_import_matches_payers_beyond_the_row_cap(many_payers):
+    result = import_rows(export_rows(clients=2, sessions_per_client=10))
+
+    assert (result.inserted, result.flagged) == (20, 0)
+    # Matched, not created a second time
+    assert len(many_payers.rows("payers")) == 1501
+    assert many_payers.calls[("payers", "insert")] == 0
+
+
+def test_find_or_create_payer_reuses_its_index(many_payers):
+    aetna = main.find_or_create_payer("Aetna (80954)")
+    assert main.find_or_create_payer("AETNA (80954)") == aetna
+    assert main.find_or_create_payer("Payer 7 (10007)") is not None
+    assert many_payers.calls[("payers", "select")] == 2  # one load, two pages
+    assert len(many_payers.rows("payers")) == 1501
+
+    # Unknown to the index: reloaded before creating, so a payer added elsewhere is found
+    many_payers.seed("payers", [{"name": "Cigna", "external_id": "62308"}])
+    cigna = main.find_or_create_payer("Cigna (62308)")
+    assert cigna == next(p["id"] for p in many_payers.rows("payers") if p["name"] == "Cigna")
+    assert len(many_payers.rows("payers")) == 1502
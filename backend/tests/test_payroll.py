@@ -0,0 +1,32 @@
+"""Payroll cycle status changes go by the role the caller is acting as"""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+def client_as(role):
+    main.app.dependency_overrides[main.require_user] = lambda: main.AuthContext("user-1", None, role)
+    return TestClient(main.app)
+
+
+@pytest.fixture(autouse=True)
+def clear_overrides():
+    yield
+    main.app.dependency_overrides.clear()
+
+
+def reopen(client, **cookies):
+    client.cookies.update(cookies)
+    return client.put(f"/api/payroll/cycles/{main.PAYROLL_ANCHOR_DATE.isoformat()}/status", json={"status": "draft"})
+
+
+def test_billing_user_reopens_a_cycle(fake):
+    response = reopen(client_as("billing"))
+    assert response.status_code == 200
+    assert response.json()["status"] == "draft"
+
+
+def test_admin_acting_as_provider_may_not_change_payroll(fake):
+    assert reopen(client_as("admin"), impersonated_role="provider").status_code == 403
+    assert reopen(client_as("admin"), impersonated_role="billing").status_code == 200
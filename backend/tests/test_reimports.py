@@ -0,0 +1,42 @@
+"""Idempotent re-imports: whole-file and per-row fingerprints"""
+from postgrest.exceptions import APIError
+
+from support import export_rows, import_rows
+
+
+def test_identical_file_is_not_imported_twice(fake):
+    rows = export_rows(clients=5, sessions_per_client=10)
+    first = import_rows(rows)
+    again = import_rows(rows)
+
+    assert again.already_imported and again.run_id == first.run_id
+    assert len(fake.rows("sessions")) == 50
+    assert fake.calls[("sessions", "upsert")] == 1
+
+
+def test_file_whose_run_had_errors_is_imported_again(fake):
+    rows = export_rows(clients=5, sessions_per_client=10)
+    rows[7][0] = "2025-13-01 10:00"  # invalid date - a row error
+    first = import_rows(rows)
+    assert (first.inserted, first.errors) == (49, 1)
+
+    again = import_rows(rows)
+
+    # Not short-circuited: the bad row is tried again, the written ones are skipped by fingerprint
+    assert not again.already_imported
+    assert (again.skipped, again.errors) == (49, 1)
+    assert len(fake.rows("sessions")) == 49
+
+
+def test_file_whose_run_failed_is_imported_again(fake):
+    rows = export_rows(clients=5, sessions_per_client=10)
+    fake.failures[("sessions", "upsert")] = APIError({"message": "canceling statement due to statement timeout", "code": "57014"})
+    first = import_rows(rows)
+    assert first.status == "failed" and not fake.rows("sessions")
+
+    del fake.failures[("sessions", "upsert")]
+    again = import_rows(rows)
+
+    assert not again.already_imported
+    assert (again.inserted, again.errors) == (50, 0)
+    assert len(fake.rows("sessions")) == 50
@@ -0,0 +1,76 @@
+"""Checkpointed imports resumed after a fatal Supabase error"""
+import asyncio
+
+from postgrest.exceptions import APIError
+
+import main
+from support import export_rows, import_rows
+
+
+def fail_nth_upsert(fake, monkeypatch, table, n):
+    """Make the n-th upsert into table fail, as a Supabase outage mid-import would"""
+    round_trip = fake.round_trip
+
+    def flaky(target, op):
+        round_trip(target, op)
+        if (target, op) == (table, "upsert") and fake.calls[(table, "upsert")] == n:
+            raise APIError({"message": "upstream connect error", "code": "503"})
+
+    monkeypatch.setattr(fake, "round_trip", flaky)
+    return lambda: monkeypatch.setattr(fake, "round_trip", round_trip)
+
+
+def test_failed_write_fails_the_run_and_resume_finishes_it(fake, monkeypatch):
+    monkeypatch.setattr(main, "IMPORT_CHECKPOINT_ROWS", 1000)
+    rows = export_rows()  # 2800 rows, written 500 per upsert
+
+    restore = fail_nth_upsert(fake, monkeypatch, "sessions", 4)
+    failed = import_rows(rows)
+    restore()
+
+    assert failed.status == "failed"
+    run = fake.rows("import_runs")[0]
+    assert run.get("total_rows") is None
+    assert run["checkpoint"]["row"] == 1001  # header is row 1
+    assert len(fake.rows("sessions")) == 1500
+
+    fake.calls.clear()
+    resumed = asyncio.run(main.resume_import(failed.run_id, wait=True, auth=None))
+
+    assert resumed.success and resumed.run_id == failed.run_id
+    assert (resumed.total, resumed.errors) == (2800, 0)
+    # Rows the failed attempt wrote after the checkpoint aren't rewritten, and still count as inserted
+    assert (resumed.inserted, resumed.unchanged, resumed.skipped) == (2800, 0, 0)
+    assert fake.calls[("sessions", "upsert")] == 3
+    assert len(fake.rows("sessions")) == 2800
+    assert fake.rows("import_runs")[0]["total_rows"] == 2800
+
+
+def test_run_failing_before_its_first_checkpoint_resumes_with_full_counts(fake, monkeypatch):
+    rows = export_rows()  # default checkpoint interval is past 2800 rows
+
+    restore = fail_nth_upsert(fake, monkeypatch, "sessions", 3)
+    failed = import_rows(rows)
+    restore()
+    assert len(fake.rows("sessions")) == 1000
+
+    resumed = asyncio.run(main.resume_import(failed.run_id, wait=True, auth=None))
+
+    assert resumed.success
+    assert (resumed.total, resumed.inserted, resumed.skipped) == (2800, 2800, 0)
+    assert len(fake.rows("sessions")) == 2800
+
+
+def test_rows_from_other_runs_are_still_skipped_on_resume(fake, monkeypatch):
+    rows = export_rows()
+    import_rows(rows[:600], filename="earlier.csv")
+
+    # The earlier run used 2 upserts; this one writes 500 rows, then fails
+    restore = fail_nth_upsert(fake, monkeypatch, "sessions", 4)
+    failed = import_rows(rows)
+    restore()
+    assert len(fake.rows("sessions")) == 1100
+
+    resumed = asyncio.run(main.resume_import(failed.run_id, wait=True, auth=None))
+
+    assert (resumed.total, resumed.inserted, resumed.skipped) == (2800, 2200, 600)
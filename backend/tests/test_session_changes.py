@@ -0,0 +1,70 @@
+"""Delta sync: GET /api/sessions?since= (fetch_session_changes)"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import main
+
+PROVIDER_A = "00000000-0000-0000-0000-00000000000a"
+PROVIDER_B = "00000000-0000-0000-0000-00000000000b"
+
+
+@pytest.fixture
+def feed(fake):
+    """Sessions plus the change log the session_changes trigger would have written"""
+    fake.rpc_handlers["session_change_cursor"] = lambda client, params: [{
+        "cursor": max((c["change_seq"] for c in client.rows("session_changes")), default=0),
+        "pruned_through": 0,
+    }]
+    log = []
+
+    def change(session_id, provider_id, old_provider_id=None, deleted=False):
+        log.append(session_id)
+        fake.seed("session_changes", [{"id": f"change-{len(log)}", "change_seq": len(log), "session_id": session_id,
+                                       "provider_id": provider_id, "old_provider_id": old_provider_id,
+                                       "deleted": deleted}])
+
+    fake.seed("sessions", [
+        {"id": "s1", "session_date": "2025-03-01", "provider_id": PROVIDER_A, "minutes": 50},
+        {"id": "s2", "session_date": "2025-03-02", "provider_id": PROVIDER_B, "minutes": 45},
+    ])
+    change("s1", PROVIDER_A)
+    change("s2", PROVIDER_A)
+    change("s2", PROVIDER_B, old_provider_id=PROVIDER_A)  # reassigned A -> B
+    change("s3", None, old_provider_id=PROVIDER_A, deleted=True)
+    return fake
+
+
+def changes(since, limit=100, provider_id=None, fields=None):
+    return asyncio.run(main.fetch_session_changes(since, limit, provider_id, fields))
+
+
+def test_all_changes_oldest_first(feed):
+    delta = changes(0)
+    assert [s["id"] for s in delta["changes"]] == ["s1", "s2"]
+    assert delta["deleted"] == ["s3"]
+    assert (delta["cursor"], delta["has_more"]) == (4, False)
+
+
+def test_sessions_reassigned_away_arrive_as_removals(feed):
+    delta = changes(0, provider_id=PROVIDER_A, fields=["minutes"])
+    assert delta["changes"] == [{"id": "s1", "session_date": "2025-03-01", "minutes": 50}]
+    assert delta["deleted"] == ["s2", "s3"]
+
+    delta = changes(0, provider_id=PROVIDER_B)
+    assert [s["id"] for s in delta["changes"]] == ["s2"] and delta["deleted"] == []
+
+
+def test_pages_follow_the_log(feed):
+    first = changes(0, limit=2)
+    assert ([s["id"] for s in first["changes"]], first["cursor"], first["has_more"]) == (["s1", "s2"], 2, True)
+
+    rest = changes(first["cursor"], limit=2)
+    assert ([s["id"] for s in rest["changes"]], rest["deleted"], rest["has_more"]) == (["s2"], ["s3"], False)
+
+
+def test_provider_id_must_be_a_uuid(feed):
+    with pytest.raises(HTTPException) as error:
+        changes(0, provider_id="x,provider_id.neq.null")
+    assert error.value.status_code == 400
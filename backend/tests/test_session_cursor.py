@@ -0,0 +1,36 @@
+"""Keyset cursors for GET /api/sessions"""
+import base64
+
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+def raw_cursor(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    session = {"session_date": "2025-03-04", "id": "6f1c7a52-3a5e-4b8e-9d0e-4c1f2b3a4d5e"}
+    assert main.decode_session_cursor(main.encode_session_cursor(session)) == (session["session_date"], session["id"])
+
+
+@pytest.mark.parametrize("raw", [
+    "2025-03-04|x),provider_id.neq.null,or(id.gt.0",  # filter syntax in the id
+    "2025-03-04|6f1c7a52-3a5e-4b8e-9d0e-4c1f2b3a4d5e,id.gt.0",
+    "2025-03-04),id.gt.(0|6f1c7a52-3a5e-4b8e-9d0e-4c1f2b3a4d5e",  # ...or in the date
+    "2025-03-04|",
+    "no separator",
+])
+def test_crafted_cursor_is_rejected(raw):
+    with pytest.raises(HTTPException) as error:
+        main.decode_session_cursor(raw_cursor(raw))
+    assert error.value.status_code == 400
+
+
+def test_cursor_values_are_normalized():
+    # Alternative spellings come back in the canonical form that goes into the filter
+    session_date, session_id = main.decode_session_cursor(
+        raw_cursor("20250304|{6F1C7A52-3A5E-4B8E-9D0E-4C1F2B3A4D5E}"))
+    assert (session_date, session_id) == ("2025-03-04", "6f1c7a52-3a5e-4b8e-9d0e-4c1f2b3a4d5e")
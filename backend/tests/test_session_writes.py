@@ -0,0 +1,51 @@
+"""Batched session upserts (SessionBatchWriter) against a row-capped PostgREST"""
+import random
+
+from support import export_rows, import_rows
+
+
+def test_reimport_finds_existing_sessions_past_the_row_cap(fake):
+    # 20 clients x 140 sessions - one lookup chunk matches 2800 rows, more than a response holds
+    fake.max_rows = 1000
+    rows = export_rows()
+    first = import_rows(rows)
+    assert (first.inserted, first.errors) == (2800, 0)
+
+    # Same sessions in another order; forget the row fingerprints so every row reaches the writer
+    random.Random(7).shuffle(rows)
+    fake.tables.pop("import_row_fingerprints")
+    fake.calls.clear()
+    second = import_rows(rows, filename="shuffled.csv")
+
+    assert (second.inserted, second.updated, second.errors) == (0, 0, 0)
+    assert len(fake.rows("sessions")) == 2800
+    assert fake.calls[("sessions", "upsert")] == 0
+
+
+def test_shuffled_reimport_leaves_every_session_unchanged(fake):
+    fake.max_rows = 1000
+    rows = export_rows()
+    import_rows(rows)
+    stored = {row["id"]: dict(row) for row in fake.rows("sessions")}
+
+    random.Random(11).shuffle(rows)
+    fake.tables.pop("import_row_fingerprints")
+    result = import_rows(rows, filename="shuffled.csv")
+
+    assert result.unchanged == result.total == 2800
+    assert {row["id"]: row for row in fake.rows("sessions")} == stored
+
+
+def test_reimport_rewrites_only_changed_sessions(fake):
+    fake.max_rows = 1000
+    rows = export_rows()
+    import_rows(rows)
+
+    random.Random(3).shuffle(rows)
+    for row in rows[:25]:
+        row[0] = row[0].replace("10:00", "14:00")  # new start time, same session
+    fake.tables.pop("import_row_fingerprints")
+    result = import_rows(rows, filename="rescheduled.csv")
+
+    assert (result.inserted, result.updated, result.unchanged) == (0, 25, 2775)
+    assert sum(row["start_time"].startswith("14") for row in fake.rows("sessions")) == 25
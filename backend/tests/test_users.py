@@ -0,0 +1,51 @@
+"""GET /api/users: emails from the cached auth sweep"""
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+class FakeAuthAdmin:
+    def __init__(self):
+        self.emails = {}
+        self.calls = []
+
+    def list_users(self, page=1, per_page=50):
+        self.calls.append("list_users")
+        users = [SimpleNamespace(id=user_id, email=email) for user_id, email in self.emails.items()]
+        return users[(page - 1) * per_page:page * per_page]
+
+    def get_user_by_id(self, user_id):
+        self.calls.append("get_user_by_id")
+        return SimpleNamespace(user=SimpleNamespace(id=user_id, email=self.emails[user_id]))
+
+
+@pytest.fixture
+def auth_admin(fake, monkeypatch):
+    admin = FakeAuthAdmin()
+    fake.auth = SimpleNamespace(admin=admin)
+    monkeypatch.setattr(main, "USER_EMAIL_CACHE", main.TTLCache(1, 60))
+    main.app.dependency_overrides[main.require_user] = lambda: main.AuthContext("admin-1", None, "admin")
+    yield admin
+    main.app.dependency_overrides.clear()
+
+
+def add_user(fake, auth_admin, user_id, email, created_at):
+    auth_admin.emails[user_id] = email
+    fake.seed("profiles", [{"id": user_id, "role": "provider", "full_name": email.split("@")[0],
+                            "created_at": created_at}])
+
+
+def test_user_created_after_the_cached_sweep_gets_their_email(fake, auth_admin):
+    client = TestClient(main.app)
+    add_user(fake, auth_admin, "user-1", "ana@example.com", "2026-01-01T00:00:00Z")
+    assert [user["email"] for user in client.get("/api/users").json()] == ["ana@example.com"]
+
+    add_user(fake, auth_admin, "user-2", "ben@example.com", "2026-02-01T00:00:00Z")
+    emails = [user["email"] for user in client.get("/api/users").json()]
+    client.get("/api/users")
+
+    assert emails == ["ana@example.com", "ben@example.com"]
+    assert auth_admin.calls == ["list_users", "get_user_by_id"]
@@ -0,0 +1,142 @@
+import { api } from './api';
+import { supabase } from './supabaseClient';
+
+export type SessionDelta<T> = {
+  changes: T[];
+  deleted: string[];
+  cursor: number;
+  has_more: boolean;
+};
+
+type Row = { id: string; session_date: string };
+
+// Newest first, as GET /api/sessions returns them
+const byNewest = (a: Row, b: Row) =>
+  b.session_date.localeCompare(a.session_date) || b.id.localeCompare(a.id);
+
+export function applySessionDelta<T extends Row>(rows: T[], delta: SessionDelta<T>): T[] {
+  const gone = new Set([...delta.deleted, ...delta.changes.map((s) => s.id)]);
+  return [...rows.filter((r) => !gone.has(r.id)), ...delta.changes].sort(byNewest);
+}
+
+/**
+ * Bearer header for the current Supabase session, or null when signed out.
+ * Read per request - supabase-js refreshes the token as it expires, so a
+ * token captured when the page loaded stops working within the hour.
+ */
+async function authHeaders(): Promise<Record<string, string> | null> {
+  const { data: { session } } = await supabase.auth.getSession();
+  return session?.access_token ? { Authorization: `Bearer ${session.access_token}` } : null;
+}
+
+/**
+ * Bring rows up to date from `cursor` via GET /api/sessions?since=.
+ * Returns null when the cursor is too old and the list has to be reloaded.
+ */
+export async function syncSessions<T extends Row>(rows: T[], cursor: number) {
+  while (true) {
+    const headers = await authHeaders();
+    if (!headers) throw new Error('Not signed in');
+    const res = await fetch(api(`/api/sessions?since=${cursor}`), { headers });
+    if (res.status === 410) return null;
+    if (!res.ok) throw new Error((await res.text()) || res.statusText);
+
+    const delta: SessionDelta<T> = await res.json();
+    rows = applySessionDelta(rows, delta);
+    cursor = delta.cursor;
+    if (!delta.has_more) return { rows, cursor };
+  }
+}
+
+/**
+ * Listen on /api/events (import-completed, sessions-changed), calling
+ * onChange with each event's cursor until the signal aborts. fetch rather
+ * than EventSource so the bearer token can be sent; reconnects on drops
+ * with a fresh token.
+ */
+export async function watchSessionChanges(onChange: (cursor: number) => void, signal: AbortSignal) {
+  while (!signal.aborted) {
+    try {
+      const headers = await authHeaders();
+      if (!headers) throw new Error('Not signed in');
+      const res = await fetch(api('/api/events'), {
+        headers: { ...headers, Accept: 'text/event-stream' },
+        signal
+      });
+      if (!res.ok || !res.body) throw new Error(res.statusText);
+
+      const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+      let buffer = '';
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += value;
+        const events = buffer.split('\n\n');
+        buffer = events.pop() ?? '';
+        for (const event of events) {
+          const data = event.split('\n').find((line) => line.startsWith('data: '));
+          const cursor = data ? JSON.parse(data.slice(6)).cursor : null;
+          if (typeof cursor === 'number') onChange(cursor);
+        }
+      }
+    } catch (err) {
+      if (signal.aborted) return;
+      console.error('Change feed dropped:', err);
+    }
+    await new Promise((resolve) => setTimeout(resolve, 5000));
+  }
+}
+
+/**
+ * Load GET /api/sessions into setRows, then keep it current: each newer
+ * cursor from the change feed is applied as a delta, and an expired cursor
+ * reloads the list. Returns false when signed out. Runs until the signal
+ * aborts.
+ */
+export async function followSessions<T extends Row>(setRows: (rows: T[]) => void, signal: AbortSignal) {
+  let rows: T[] = [];
+  let cursor: number | null = null; // Change cursor of the loaded rows
+  let latestCursor = 0;
+  let syncing = false;
+
+  async function load() {
+    const headers = await authHeaders();
+    if (!headers) return false;
+    const res = await fetch(api('/api/sessions'), { headers });
+    if (!res.ok) throw new Error((await res.text()) || res.statusText);
+
+    const header = res.headers.get('X-Change-Cursor');
+    cursor = header ? Number(header) : null;
+    rows = await res.json();
+    setRows(rows);
+    return true;
+  }
+
+  async function apply(latest: number) {
+    latestCursor = Math.max(latestCursor, latest);
+    if (syncing) return;
+    syncing = true;
+    try {
+      // Events that arrive mid-sync raise latestCursor and get another pass
+      let target = cursor ?? latestCursor;
+      while (cursor !== null && latestCursor > target && !signal.aborted) {
+        target = latestCursor;
+        const synced = await syncSessions(rows, cursor);
+        if (!synced) {
+          await load();
+          break;
+        }
+        ({ rows, cursor } = synced);
+        setRows(rows);
+      }
+    } catch (error) {
+      console.error('Error syncing sessions:', error);
+    } finally {
+      syncing = false;
+    }
+  }
+
+  if (!(await load())) return false;
+  watchSessionChanges(apply, signal);
+  return true;
+}
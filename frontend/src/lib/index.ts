@@ -1,3 +1,4 @@
 // place files you want to import through the `$lib` alias in this folder.
 export * from './api';
 export * from './supabaseClient';
+export * from './changeFeed';
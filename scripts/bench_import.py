@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Offline benchmark for the SimplePractice importer.
+
+Runs `import_simplepractice` from backend/main.py against synthetic exports
+(scripts/gen_simplepractice_csv.py) with the Supabase client replaced by the
+in-memory fake in scripts/fake_supabase.py. No network or credentials needed.
+
+For each scenario it reports rows per second, Supabase round trips per row,
+peak RSS and the importer's per-stage timings. Each scenario runs in a fresh
+process so RSS numbers don't bleed into each other.
+
+Results are compared against scripts/bench_baseline.json when it exists; the
+script exits 1 if throughput drops or round trips grow beyond the tolerance.
+
+Usage:
+  python3 scripts/bench_import.py                      # default scenarios vs baseline
+  python3 scripts/bench_import.py --rows 1000000       # one large run per layout
+  python3 scripts/bench_import.py --latency-ms 5       # model a 5ms round trip
+  python3 scripts/bench_import.py --save-baseline      # record new baseline
+
+Notes:
+- Throughput depends on the machine; re-record the baseline when switching hosts.
+- Round trips per row are deterministic for a given seed and batch size.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(SCRIPTS_DIR, "..", "backend")
+BASELINE_PATH = os.path.join(SCRIPTS_DIR, "bench_baseline.json")
+
+sys.path.insert(0, SCRIPTS_DIR)
+
+# (name, layout, rows, reimport) - reimport runs the same file twice and
+# measures the second, forced run
+DEFAULT_SCENARIOS = [
+    ("actual-1k", "actual", 1_000, False),
+    ("actual-10k", "actual", 10_000, False),
+    ("mock-10k", "mock", 10_000, False),
+    ("actual-100k", "actual", 100_000, False),
+    ("actual-10k-reimport", "actual", 10_000, True),
+]
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_scenario(name, layout, rows, reimport, latency_ms, batch_size, seed):
+    """Run one import in this (fresh) process and return its measurements"""
+    # Never talk to a real project, whatever backend/.env says
+    os.environ["SUPABASE_URL"] = ""
+    os.environ["SUPABASE_SERVICE_ROLE_KEY"] = ""
+    os.environ["IMPORT_BATCH_SIZE"] = str(batch_size)
+    sys.path.insert(0, BACKEND_DIR)
+
+    logging.disable(logging.CRITICAL)
+    import main
+    from fake_supabase import FakeSupabase
+    from gen_simplepractice_csv import write_csv
+    from starlette.datastructures import UploadFile
+
+    with tempfile.TemporaryFile(mode="w+b") as csv_file:
+        text = io.TextIOWrapper(csv_file, encoding="utf-8", newline="")
+        write_csv(text, rows, layout=layout, seed=seed)
+        text.flush()
+        text.detach()
+        file_bytes = csv_file.tell()
+
+        fake = FakeSupabase(latency_seconds=latency_ms / 1000)
+        main.SB = fake
+
+        def import_once():
+            csv_file.seek(0)
+            upload = UploadFile(csv_file, filename=f"{name}.csv")
+            return asyncio.run(main.import_simplepractice(upload, wait=True, force=True, auth=None))
+
+        if reimport:
+            import_once()
+            fake.calls.clear()
+
+        rss_before = peak_rss_mb()
+        started = time.perf_counter()
+        result = import_once()
+        elapsed = time.perf_counter() - started
+
+    if not result.success:
+        raise RuntimeError(f"{name}: import failed: {result.message}")
+
+    importer = main.IMPORT_JOBS[result.run_id].importer
+    return {
+        "name": name,
+        "layout": layout,
+        "rows": rows,
+        "reimport": reimport,
+        "latency_ms": latency_ms,
+        "batch_size": batch_size,
+        "file_mb": round(file_bytes / (1024 * 1024), 2),
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(result.total / elapsed, 1),
+        "round_trips": fake.round_trips,
+        "round_trips_per_row": round(fake.round_trips / max(1, result.total), 4),
+        "calls": {f"{target}.{op}": count for (target, op), count in sorted(fake.calls.items())},
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+        "stage_seconds": {stage: round(seconds, 3) for stage, seconds in importer.stage_timings.items()},
+        "counts": {
+            "total": result.total, "inserted": result.inserted, "updated": result.updated,
+            "unchanged": result.unchanged, "skipped": result.skipped, "flagged": result.flagged,
+            "duplicates": result.duplicates, "errors": result.errors,
+        },
+    }
+
+
+def run_isolated(scenario, args):
+    # A fresh interpreter per scenario keeps peak RSS and caches independent
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(run_scenario, *scenario, args.latency_ms, args.batch_size, args.seed).result()
+
+
+def print_results(results):
+    print(f"{'scenario':<22}{'rows':>9}{'rows/s':>11}{'trips/row':>11}{'peak MB':>9}  stages (s)")
+    for r in results:
+        stages = " ".join(f"{stage}={seconds:.2f}" for stage, seconds in r["stage_seconds"].items())
+        print(f"{r['name']:<22}{r['rows']:>9}{r['rows_per_second']:>11,.0f}"
+              f"{r['round_trips_per_row']:>11.4f}{r['peak_rss_mb']:>9.0f}  {stages}")
+
+
+def compare(results, baseline, tolerance):
+    """Regressions against the baseline, as human-readable lines"""
+    previous = {r["name"]: r for r in baseline.get("results", [])}
+    problems = []
+    for r in results:
+        before = previous.get(r["name"])
+        if not before or before["latency_ms"] != r["latency_ms"] or before["batch_size"] != r["batch_size"]:
+            continue
+        if r["rows_per_second"] < before["rows_per_second"] * (1 - tolerance):
+            problems.append(f"{r['name']}: {r['rows_per_second']:,.0f} rows/s vs baseline {before['rows_per_second']:,.0f}")
+        if r["round_trips_per_row"] > before["round_trips_per_row"] * 1.05:
+            problems.append(f"{r['name']}: {r['round_trips_per_row']} round trips/row vs baseline {before['round_trips_per_row']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="*", help="custom row counts (run for both layouts)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated latency per Supabase round trip")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed rows/s drop vs baseline (fraction)")
+    parser.add_argument("--json", help="also write results to this path")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write results to {os.path.relpath(BASELINE_PATH)}")
+    args = parser.parse_args()
+
+    scenarios = DEFAULT_SCENARIOS
+    if args.rows:
+        scenarios = [(f"{layout}-{rows}", layout, rows, False) for rows in args.rows for layout in ("actual", "mock")]
+
+    results = []
+    for scenario in scenarios:
+        print(f"Running {scenario[0]}...", file=sys.stderr)
+        results.append(run_isolated(scenario, args))
+
+    print_results(results)
+
+    report = {"python": sys.version.split()[0], "results": results}
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w") as fh:
+            json.dump(report, fh, indent=2)
+            fh.write("\n")
+        print(f"Saved baseline to {BASELINE_PATH}")
+        return
+
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as fh:
+            problems = compare(results, json.load(fh), args.tolerance)
+        if problems:
+            print("\nRegressions against baseline:")
+            for problem in problems:
+                print("  " + problem)
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
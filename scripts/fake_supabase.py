@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""In-memory stand-in for the Supabase client, for offline benchmarks.
+
+Implements the slice of the supabase-py / postgrest query builder the backend
+uses (table().select/insert/upsert/update/delete with eq, neq, in_, ilike,
+gt/gte/lt/lte, is_, not_.is_, flat or_, order, limit, range, count="exact"), plus
+rpc() handlers and storage uploads/downloads. Uploads given as file objects are
+copied to temp files chunk by chunk, and signed URLs are served by the httpx
+client from http_client(), so streamed transfers never hold an object in memory.
+
+Every request that would cross the network is counted in `calls`, keyed by
+(table, operation), and can be slowed down by `latency_seconds` to model the
+round trip to Supabase. `max_rows` caps the rows one select returns, like
+PostgREST's db-max-rows setting, `failures` maps (table, operation) to an
+exception raised in place of that request, and tables named in `write_only`
+answer inserts and upserts without keeping the rows, so an import bigger than
+memory can run against the fake.
+
+Usage:
+  from fake_supabase import FakeSupabase
+  fake = FakeSupabase(latency_seconds=0.005)
+  main.SB = fake
+"""
+import itertools
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+
+import httpx
+
+SIGNED_URL_PREFIX = "http://fake-storage/"
+
+
+class FakeResponse(SimpleNamespace):
+    """Mimics postgrest's APIResponse (data + count)"""
+
+
+class FakeTable:
+    """Rows of one table plus hash indexes on the columns queries filter by"""
+
+    def __init__(self):
+        self.keep = True  # False: rows are given ids and returned but not stored
+        self.rows = {}  # id -> row
+        self.indexes = {}  # column -> {value: set of ids}
+        self.unique = {}  # conflict columns -> {values: id}
+        self.ids = itertools.count(1)
+
+    def index(self, column):
+        if column not in self.indexes:
+            index = defaultdict(set)
+            for row_id, row in self.rows.items():
+                index[row.get(column)].add(row_id)
+            self.indexes[column] = index
+        return self.indexes[column]
+
+    def unique_index(self, columns):
+        if columns not in self.unique:
+            self.unique[columns] = {
+                tuple(row.get(c) for c in columns): row_id for row_id, row in self.rows.items()
+            }
+        return self.unique[columns]
+
+    def add(self, row):
+        if "id" not in row:
+            # Sequential UUIDs - cheaper than uuid4() and stable across runs
+            row["id"] = str(uuid.UUID(int=next(self.ids)))
+        if not self.keep:
+            return row
+        self.rows[row["id"]] = row
+        for column, index in self.indexes.items():
+            index[row.get(column)].add(row["id"])
+        for columns, index in self.unique.items():
+            index[tuple(row.get(c) for c in columns)] = row["id"]
+        return row
+
+    def change(self, row, values):
+        for column, index in self.indexes.items():
+            if column in values and values[column] != row.get(column):
+                index[row.get(column)].discard(row["id"])
+                index[values[column]].add(row["id"])
+        for columns, index in self.unique.items():
+            if any(c in values for c in columns):
+                index.pop(tuple(row.get(c) for c in columns), None)
+                index[tuple(values.get(c, row.get(c)) for c in columns)] = row["id"]
+        row.update(values)
+
+    def remove(self, row):
+        for column, index in self.indexes.items():
+            index[row.get(column)].discard(row["id"])
+        for columns, index in self.unique.items():
+            index.pop(tuple(row.get(c) for c in columns), None)
+        del self.rows[row["id"]]
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table_name = table
+        self.table = client.tables[table]
+        self.op = "select"
+        self.payload = None
+        self.filters = []
+        self.lookup = None  # (column, values) answered from an index
+        self.ordering = []
+        self.bounds = None
+        self.count = None
+        self.on_conflict = ""
+        self.ignore_duplicates = False
+
+    # --- operations -----------------------------------------------------
+
+    def select(self, columns="*", count=None):
+        self.op, self.count = "select", count
+        return self
+
+    def insert(self, payload, **kwargs):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict="", ignore_duplicates=False, **kwargs):
+        self.op, self.payload = "upsert", payload
+        self.on_conflict, self.ignore_duplicates = on_conflict, ignore_duplicates
+        return self
+
+    def update(self, payload):
+        self.op, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    # --- filters --------------------------------------------------------
+
+    def _filter(self, predicate):
+        self.filters.append(predicate)
+        return self
+
+    def eq(self, column, value):
+        if self.lookup is None:
+            self.lookup = (column, [value])
+        return self._filter(lambda row: row.get(column) == value)
+
+    def in_(self, column, values):
+        values = list(values)
+        if self.lookup is None:
+            self.lookup = (column, values)
+        wanted = set(values)
+        return self._filter(lambda row: row.get(column) in wanted)
+
+    def neq(self, column, value):
+        return self._filter(lambda row: row.get(column) != value)
+
+    def ilike(self, column, pattern):
+        pattern = pattern.lower().replace("%", "")
+        return self._filter(lambda row: pattern in str(row.get(column) or "").lower())
+
+    def gt(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and str(row.get(column)) > str(value))
+
+    def gte(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and str(row.get(column)) >= str(value))
+
+    def lt(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and str(row.get(column)) < str(value))
+
+    def lte(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and str(row.get(column)) <= str(value))
+
+    def is_(self, column, value):
+        return self._filter(lambda row: row.get(column) is None)
+
+    def or_(self, filters):
+        """Comma-separated column.op.value conditions; nested and()/or() aren't supported"""
+        compare = {
+            "eq": lambda a, b: a == b, "neq": lambda a, b: a != b,
+            "lt": lambda a, b: a < b, "lte": lambda a, b: a <= b,
+            "gt": lambda a, b: a > b, "gte": lambda a, b: a >= b,
+        }
+        conditions = []
+        for condition in filters.split(","):
+            column, op, value = condition.split(".", 2)
+            if op not in compare:
+                raise NotImplementedError(f"or_ condition {condition!r}")
+            conditions.append((column, compare[op], value))
+        return self._filter(lambda row: any(
+            row.get(column) is not None and test(str(row.get(column)), value)
+            for column, test, value in conditions
+        ))
+
+    @property
+    def not_(self):
+        query = self
+
+        class Not:
+            def is_(self, column, value):
+                return query._filter(lambda row: row.get(column) is not None)
+
+        return Not()
+
+    def order(self, column, desc=False, **kwargs):
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, size):
+        self.bounds = (0, size - 1)
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    # --- execution ------------------------------------------------------
+
+    def _matches(self):
+        if self.lookup:
+            column, values = self.lookup
+            index = self.table.index(column)
+            ids = set()
+            for value in values:
+                ids |= index.get(value, set())
+            candidates = [self.table.rows[row_id] for row_id in ids]
+        else:
+            candidates = list(self.table.rows.values())
+        return [row for row in candidates if all(predicate(row) for predicate in self.filters)]
+
+    def execute(self):
+        self.client.round_trip(self.table_name, self.op)
+        with self.client.lock:
+            return getattr(self, f"_execute_{self.op}")()
+
+    def _execute_select(self):
+        rows = self._matches()
+        total = len(rows)
+        for column, desc in reversed(self.ordering):
+            rows.sort(key=lambda row: (row.get(column) is None, str(row.get(column))), reverse=desc)
+        if self.bounds:
+            rows = rows[self.bounds[0]:self.bounds[1] + 1]
+        if self.client.max_rows is not None:
+            rows = rows[:self.client.max_rows]
+        return FakeResponse(data=[dict(row) for row in rows], count=total if self.count else None)
+
+    def _execute_insert(self):
+        items = self.payload if isinstance(self.payload, list) else [self.payload]
+        return FakeResponse(data=[dict(self.table.add(dict(item))) for item in items], count=None)
+
+    def _execute_upsert(self):
+        items = self.payload if isinstance(self.payload, list) else [self.payload]
+        keys = tuple(self.on_conflict.split(",") if self.on_conflict else ["id"])
+        index = self.table.unique_index(keys)
+        out = []
+        for item in items:
+            match_id = index.get(tuple(item.get(k) for k in keys))
+            match = self.table.rows[match_id] if match_id is not None else None
+            if match is None:
+                out.append(dict(self.table.add(dict(item))))
+            elif not self.ignore_duplicates:
+                self.table.change(match, item)
+                out.append(dict(match))
+        return FakeResponse(data=out, count=None)
+
+    def _execute_update(self):
+        rows = self._matches()
+        for row in rows:
+            self.table.change(row, self.payload)
+        return FakeResponse(data=[dict(row) for row in rows], count=None)
+
+    def _execute_delete(self):
+        rows = self._matches()
+        for row in rows:
+            self.table.remove(row)
+        return FakeResponse(data=[dict(row) for row in rows], count=None)
+
+
+class FakeRpc:
+    def __init__(self, client, name, params):
+        self.client, self.name, self.params = client, name, params
+
+    def execute(self):
+        self.client.round_trip("rpc", self.name)
+        handler = self.client.rpc_handlers.get(self.name)
+        return FakeResponse(data=handler(self.client, self.params) if handler else [], count=None)
+
+
+class FakeBucket:
+    def __init__(self, client, name):
+        self.client, self.name = client, name
+
+    def upload(self, path, data, file_options=None):
+        self.client.round_trip("storage", "upload")
+        if hasattr(data, "read"):
+            stored = tempfile.TemporaryFile()
+            shutil.copyfileobj(data, stored)
+            data = stored
+        else:
+            data = bytes(data)
+        self.client.objects[(self.name, path)] = data
+        return SimpleNamespace(path=path)
+
+    def download(self, path, *args, **kwargs):
+        self.client.round_trip("storage", "download")
+        return self.client.object_bytes(self.name, path)
+
+    def create_signed_url(self, path, expires_in, options=None):
+        self.client.round_trip("storage", "create_signed_url")
+        self.client.object_bytes(self.name, path, peek=True)
+        url = f"{SIGNED_URL_PREFIX}{self.name}/{path}"
+        return {"signedURL": url, "signedUrl": url}
+
+    def remove(self, paths):
+        self.client.round_trip("storage", "remove")
+        for path in paths:
+            self.client.objects.pop((self.name, path), None)
+        return []
+
+
+class FakeStorage:
+    def __init__(self, client):
+        self.client = client
+
+    def from_(self, name):
+        return FakeBucket(self.client, name)
+
+
+class FakeSupabase:
+    """Drop-in for the module-level `SB` client in backend/main.py"""
+
+    def __init__(self, latency_seconds=0.0, max_rows=None, write_only=()):
+        self.latency_seconds = latency_seconds
+        self.max_rows = max_rows
+        self.failures = {}  # (target, op) -> exception to raise instead
+        self.tables = defaultdict(FakeTable)
+        for name in write_only:
+            self.tables[name].keep = False
+        self.objects = {}
+        self.calls = Counter()
+        self.rpc_handlers = {}
+        self.storage = FakeStorage(self)
+        self.lock = threading.Lock()
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return FakeRpc(self, name, params or {})
+
+    def round_trip(self, target, op):
+        self.calls[(target, op)] += 1
+        if (target, op) in self.failures:
+            raise self.failures[(target, op)]
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    @property
+    def round_trips(self):
+        return sum(self.calls.values())
+
+    def object_bytes(self, bucket, path, peek=False):
+        try:
+            stored = self.objects[(bucket, path)]
+        except KeyError:
+            raise Exception(f"Object not found: {bucket}/{path}")
+        if peek or isinstance(stored, bytes):
+            return stored
+        stored.seek(0)
+        return stored.read()
+
+    def http_client(self):
+        """httpx client serving signed URLs from stored objects, streamed in chunks"""
+        def handle(request):
+            bucket, _, path = str(request.url)[len(SIGNED_URL_PREFIX):].partition("/")
+            stored = self.objects.get((bucket, path))
+            if stored is None:
+                return httpx.Response(404)
+            if isinstance(stored, bytes):
+                return httpx.Response(200, content=stored)
+            stored.seek(0)
+            return httpx.Response(200, content=iter(lambda: stored.read(64 * 1024), b""))
+
+        return httpx.Client(transport=httpx.MockTransport(handle))
+
+    def seed(self, table, rows):
+        for row in rows:
+            self.tables[table].add(dict(row))
+
+    def rows(self, table):
+        return list(self.tables[table].rows.values())
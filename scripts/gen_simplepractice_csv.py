@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Seeded generator of synthetic SimplePractice exports for benchmarks.
+
+Writes either header layout the importer understands:
+  actual - the current export ("Date of Service", "Clinician", "Primary Insurance", ...)
+           like backend/sample_data/simplepractice_actual.csv
+  mock   - the older export ("Date added", "Primary clinician", "Start time", ...)
+           like backend/sample_data/simplepractice_mock.csv
+
+Cardinality follows a small practice: a few dozen clinicians, one client per
+~12 sessions, a fixed roster of payers plus self-pay. A share of rows are
+exact repeats, and a share are bad (missing client/clinician, invalid date,
+truncated line).
+
+Usage:
+  python3 scripts/gen_simplepractice_csv.py --rows 100000 --layout actual -o /tmp/sp_100k.csv
+"""
+import argparse
+import csv
+import random
+import sys
+from datetime import date, timedelta
+
+ACTUAL_HEADER = [
+    "Date of Service", "Client", "Clinician", "Billing Code", "Primary Insurance",
+    "Secondary Insurance", "Rate per Unit", "Units", "Total Fee", "Client Payment Status",
+    "Charge", "Uninvoiced", "Paid", "Unpaid", "Insurance Payment Status", "Charge", "Paid", "Unpaid",
+]
+
+MOCK_HEADER = [
+    "Client", "Client type", "Date added", "Primary clinician", "Start time", "End time",
+    "Minutes", "Primary insurance", "Billing route", "Status", "Notes",
+]
+
+PAYERS = [
+    "Aetna (80954)", "Horizon NJ Health (22356)", "AmeriHealth (22110)", "United Healthcare (77102)",
+    "Tricare East (99727)", "Cigna (62308)", "Horizon BCBS (22099)", "Medicaid NJ (77002)",
+    "Magellan (01260)", "Optum (87726)", "Oxford (06111)", "WellCare (14163)",
+]
+
+FIRST_NAMES = [
+    "Alex", "Brianna", "Carlos", "Diana", "Ethan", "Fatima", "Gabe", "Hana", "Isaac", "Jada",
+    "Kofi", "Lena", "Mateo", "Nora", "Omar", "Priya", "Quinn", "Rosa", "Sam", "Tara",
+]
+
+LAST_NAMES = [
+    "Johnson", "Smith", "Mendez", "Patel", "Brooks", "Nguyen", "Rivera", "Chen", "Kim", "Okafor",
+    "Garcia", "Lopez", "Singh", "Cohen", "Walsh", "Ali", "Rossi", "Haddad", "Moreau", "Silva",
+]
+
+STATUSES = ["completed", "submitted", "finalized", "in progress", ""]
+
+SESSION_MINUTES = [30, 45, 50, 53, 60]
+
+
+def person(number):
+    """Deterministic full name for a client/clinician number"""
+    first = FIRST_NAMES[number % len(FIRST_NAMES)]
+    last = LAST_NAMES[(number // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    return f"{first} {last} {number}"
+
+
+def generate_rows(rows, layout="actual", seed=42, providers=None, clients=None,
+                  duplicate_rate=0.02, bad_rate=0.01, start=date(2025, 1, 1), days=365):
+    """Yield CSV rows (header first) for the given layout"""
+    rng = random.Random(seed)
+    providers = providers or max(3, min(60, rows // 2000 + 5))
+    clients = clients or max(5, rows // 12)
+
+    provider_names = [person(10_000 + n) for n in range(providers)]
+    # Each client sees one clinician and has one payer (or self-pay)
+    client_plans = [
+        (person(n), rng.randrange(providers), rng.choice(PAYERS) if rng.random() < 0.85 else "")
+        for n in range(clients)
+    ]
+
+    yield ACTUAL_HEADER if layout == "actual" else MOCK_HEADER
+
+    previous = None
+    for _ in range(rows):
+        if previous is not None and rng.random() < duplicate_rate:
+            yield previous
+            continue
+
+        client, provider_index, payer = client_plans[rng.randrange(clients)]
+        provider = provider_names[provider_index]
+        service_day = start + timedelta(days=rng.randrange(days))
+        hour = rng.randint(8, 19)
+        minute = rng.choice([0, 15, 30, 45])
+        minutes = rng.choice(SESSION_MINUTES)
+
+        bad = rng.random() < bad_rate
+        problem = rng.choice(["client", "provider", "date", "short"]) if bad else None
+        if problem == "client":
+            client = ""
+        elif problem == "provider":
+            provider = ""
+
+        if layout == "actual":
+            service = service_day.strftime("%m/%d/%Y") + f" {hour}:{minute:02d}"
+            if problem == "date":
+                service = f"{service_day.year}-13-{service_day.day:02d}"
+            fee = "160.0"
+            row = [
+                service, client, provider, rng.choice(["90837 ", "90834 ", "90791 "]), payer, "",
+                "160.0 ", "1 ", fee, rng.choice(["PAID", "UNPAID"]), "38.0", "0.0", "38.0", "0.0",
+                rng.choice(["PAID", "UNPAID", "PENDING"]), "122.0", "0.0", "0.0",
+            ]
+        else:
+            service = service_day.strftime("%m/%d/%Y")
+            if problem == "date":
+                service = f"{service_day.year}-13-{service_day.day:02d}"
+            end_hour, end_minute = divmod(hour * 60 + minute + minutes, 60)
+            row = [
+                client, rng.choice(["Adult", "Minor"]), service, provider,
+                f"{(hour - 1) % 12 + 1:02d}:{minute:02d} {'AM' if hour < 12 else 'PM'}",
+                f"{(end_hour - 1) % 12 + 1:02d}:{end_minute:02d} {'AM' if end_hour < 12 else 'PM'}",
+                str(minutes), payer, rng.choice(["simplepractice", "portal"]), rng.choice(STATUSES), "",
+            ]
+
+        if problem == "short":
+            row = row[:2]
+
+        previous = row
+        yield row
+
+
+def write_csv(path_or_file, rows, **options):
+    """Write a generated export to a path (or an open text file)"""
+    if hasattr(path_or_file, "write"):
+        csv.writer(path_or_file).writerows(generate_rows(rows, **options))
+        return
+    with open(path_or_file, "w", newline="", encoding="utf-8") as fh:
+        csv.writer(fh).writerows(generate_rows(rows, **options))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--layout", choices=["actual", "mock"], default="actual")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--providers", type=int, default=None, help="distinct clinicians (default scales with rows)")
+    parser.add_argument("--clients", type=int, default=None, help="distinct clients (default rows / 12)")
+    parser.add_argument("--duplicate-rate", type=float, default=0.02)
+    parser.add_argument("--bad-rate", type=float, default=0.01)
+    parser.add_argument("-o", "--output", default="-", help="output path (default stdout)")
+    args = parser.parse_args()
+
+    options = dict(layout=args.layout, seed=args.seed, providers=args.providers, clients=args.clients,
+                   duplicate_rate=args.duplicate_rate, bad_rate=args.bad_rate)
+    if args.output == "-":
+        write_csv(sys.stdout, args.rows, **options)
+    else:
+        write_csv(args.output, args.rows, **options)
+        print(f"Wrote {args.rows} {args.layout} rows to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+-- Daily billing rollups behind GET /api/reports/aging and /api/reports/revenue.
+-- One row per session date, aging date, provider, payer and billing_status
+-- with counts and amounts. Triggers on sessions apply deltas on every write
+-- (importer upserts and status changes alike), and rebuild_billing_rollups()
+-- recomputes the table from scratch nightly to reconcile any drift.
+--
+-- Age brackets are not stored: they are derived at read time from age_date
+-- (date submitted, else date of service), so rows never go stale as days pass.
+-- Requires PostgreSQL 15+ (NULLS NOT DISTINCT).
+
+CREATE TABLE IF NOT EXISTS public.billing_rollups (
+  session_date date NOT NULL,
+  age_date date NOT NULL,
+  submitted boolean NOT NULL,
+  provider_id uuid,
+  payer_id uuid,
+  billing_status text NOT NULL,
+  session_count integer NOT NULL DEFAULT 0,
+  total_minutes bigint NOT NULL DEFAULT 0,
+  amount_billed numeric NOT NULL DEFAULT 0,
+  amount_paid numeric NOT NULL DEFAULT 0,
+  CONSTRAINT billing_rollups_key UNIQUE NULLS NOT DISTINCT
+    (session_date, age_date, submitted, provider_id, payer_id, billing_status)
+);
+
+CREATE INDEX IF NOT EXISTS billing_rollups_age_idx
+  ON public.billing_rollups (age_date) WHERE billing_status <> 'paid';
+
+ALTER TABLE public.billing_rollups ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Service role manages billing rollups" ON public.billing_rollups;
+CREATE POLICY "Service role manages billing rollups" ON public.billing_rollups
+  FOR ALL TO service_role USING (true) WITH CHECK (true);
+
+-- Apply the change in sessions from one statement as +/- deltas per bucket.
+-- Runs as the owner: sessions is also written directly by signed-in users
+-- (e.g. billing status changes from the frontend), who can't write
+-- billing_rollups themselves.
+CREATE OR REPLACE FUNCTION public.apply_billing_rollup_delta()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public, pg_temp
+AS $$
+BEGIN
+  CREATE TEMP TABLE IF NOT EXISTS pg_temp.billing_rollup_changes (
+    sign integer, session_date date, age_date date, submitted boolean,
+    provider_id uuid, payer_id uuid, billing_status text,
+    minutes integer, amount_billed numeric, amount_paid numeric
+  ) ON COMMIT DROP;
+
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    INSERT INTO pg_temp.billing_rollup_changes
+    SELECT 1, n.session_date, COALESCE(n.date_submitted::date, n.session_date), n.date_submitted IS NOT NULL,
+           n.provider_id, n.payer_id, COALESCE(n.billing_status::text, 'unknown'),
+           n.minutes, n.amount_billed, n.amount_paid
+    FROM new_rows n
+    WHERE n.session_date IS NOT NULL;
+  END IF;
+
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    INSERT INTO pg_temp.billing_rollup_changes
+    SELECT -1, o.session_date, COALESCE(o.date_submitted::date, o.session_date), o.date_submitted IS NOT NULL,
+           o.provider_id, o.payer_id, COALESCE(o.billing_status::text, 'unknown'),
+           o.minutes, o.amount_billed, o.amount_paid
+    FROM old_rows o
+    WHERE o.session_date IS NOT NULL;
+  END IF;
+
+  INSERT INTO public.billing_rollups AS r
+    (session_date, age_date, submitted, provider_id, payer_id, billing_status,
+     session_count, total_minutes, amount_billed, amount_paid)
+  SELECT session_date, age_date, submitted, provider_id, payer_id, billing_status,
+         SUM(sign), SUM(sign * COALESCE(minutes, 0)),
+         SUM(sign * COALESCE(amount_billed, 0)), SUM(sign * COALESCE(amount_paid, 0))
+  FROM pg_temp.billing_rollup_changes
+  GROUP BY session_date, age_date, submitted, provider_id, payer_id, billing_status
+  -- Updates that touch no rollup column cancel out - skip those buckets
+  HAVING SUM(sign) <> 0
+      OR SUM(sign * COALESCE(minutes, 0)) <> 0
+      OR SUM(sign * COALESCE(amount_billed, 0)) <> 0
+      OR SUM(sign * COALESCE(amount_paid, 0)) <> 0
+  -- Lock buckets in key order so concurrent imports touching the same
+  -- buckets wait on each other instead of deadlocking
+  ORDER BY session_date, age_date, submitted, provider_id, payer_id, billing_status
+  ON CONFLICT ON CONSTRAINT billing_rollups_key DO UPDATE SET
+    session_count = r.session_count + EXCLUDED.session_count,
+    total_minutes = r.total_minutes + EXCLUDED.total_minutes,
+    amount_billed = r.amount_billed + EXCLUDED.amount_billed,
+    amount_paid = r.amount_paid + EXCLUDED.amount_paid;
+
+  DELETE FROM pg_temp.billing_rollup_changes;
+  RETURN NULL;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.apply_billing_rollup_delta() FROM PUBLIC, anon, authenticated;
+
+-- Transition tables need one trigger per event
+DROP TRIGGER IF EXISTS sessions_billing_rollup_insert ON public.sessions;
+CREATE TRIGGER sessions_billing_rollup_insert
+  AFTER INSERT ON public.sessions
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.apply_billing_rollup_delta();
+
+DROP TRIGGER IF EXISTS sessions_billing_rollup_update ON public.sessions;
+CREATE TRIGGER sessions_billing_rollup_update
+  AFTER UPDATE ON public.sessions
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.apply_billing_rollup_delta();
+
+DROP TRIGGER IF EXISTS sessions_billing_rollup_delete ON public.sessions;
+CREATE TRIGGER sessions_billing_rollup_delete
+  AFTER DELETE ON public.sessions
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION public.apply_billing_rollup_delta();
+
+-- Recompute every bucket from sessions. Returns the number of buckets that
+-- had drifted from the incremental totals.
+CREATE OR REPLACE FUNCTION public.rebuild_billing_rollups()
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_drifted integer;
+BEGIN
+  LOCK TABLE public.billing_rollups IN EXCLUSIVE MODE;
+
+  DROP TABLE IF EXISTS billing_rollups_rebuilt;
+  CREATE TEMP TABLE billing_rollups_rebuilt ON COMMIT DROP AS
+  SELECT s.session_date,
+         COALESCE(s.date_submitted::date, s.session_date) AS age_date,
+         s.date_submitted IS NOT NULL AS submitted,
+         s.provider_id, s.payer_id,
+         COALESCE(s.billing_status::text, 'unknown') AS billing_status,
+         COUNT(*)::integer AS session_count,
+         COALESCE(SUM(s.minutes), 0)::bigint AS total_minutes,
+         COALESCE(SUM(s.amount_billed), 0) AS amount_billed,
+         COALESCE(SUM(s.amount_paid), 0) AS amount_paid
+  FROM public.sessions s
+  WHERE s.session_date IS NOT NULL
+  GROUP BY 1, 2, 3, 4, 5, 6;
+
+  SELECT COUNT(*) INTO v_drifted FROM (
+    SELECT * FROM billing_rollups_rebuilt
+    EXCEPT
+    SELECT session_date, age_date, submitted, provider_id, payer_id, billing_status,
+           session_count, total_minutes, amount_billed, amount_paid
+    FROM public.billing_rollups
+    WHERE session_count <> 0
+  ) d;
+
+  DELETE FROM public.billing_rollups;
+  INSERT INTO public.billing_rollups
+    (session_date, age_date, submitted, provider_id, payer_id, billing_status,
+     session_count, total_minutes, amount_billed, amount_paid)
+  SELECT * FROM billing_rollups_rebuilt;
+
+  RETURN v_drifted;
+END;
+$$;
+
+-- Outstanding sessions by age bracket, read from the rollups. Brackets match
+-- the aging_report view: days since submission, or 'Not Submitted'.
+CREATE OR REPLACE FUNCTION public.aging_summary(
+  p_provider_id uuid DEFAULT NULL,
+  p_payer_id uuid DEFAULT NULL,
+  p_group_by text DEFAULT NULL  -- NULL, 'provider' or 'payer'
+)
+RETURNS TABLE (
+  age_bracket text,
+  group_id uuid,
+  group_name text,
+  session_count bigint,
+  amount_billed numeric,
+  amount_paid numeric,
+  outstanding_amount numeric
+)
+LANGUAGE sql
+STABLE
+AS $$
+  WITH bucketed AS (
+    SELECT
+      CASE
+        WHEN NOT r.submitted THEN 'Not Submitted'
+        WHEN CURRENT_DATE - r.age_date <= 30 THEN '0-30 days'
+        WHEN CURRENT_DATE - r.age_date <= 60 THEN '31-60 days'
+        WHEN CURRENT_DATE - r.age_date <= 90 THEN '61-90 days'
+        ELSE '90+ days'
+      END AS age_bracket,
+      CASE p_group_by
+        WHEN 'provider' THEN r.provider_id
+        WHEN 'payer' THEN r.payer_id
+      END AS group_id,
+      r.session_count, r.amount_billed, r.amount_paid
+    FROM public.billing_rollups r
+    WHERE r.billing_status <> 'paid'
+      AND (p_provider_id IS NULL OR r.provider_id = p_provider_id)
+      AND (p_payer_id IS NULL OR r.payer_id = p_payer_id)
+  )
+  SELECT
+    b.age_bracket,
+    b.group_id,
+    CASE p_group_by
+      WHEN 'provider' THEN pr.name
+      WHEN 'payer' THEN pa.name
+    END AS group_name,
+    SUM(b.session_count) AS session_count,
+    SUM(b.amount_billed) AS amount_billed,
+    SUM(b.amount_paid) AS amount_paid,
+    SUM(b.amount_billed - b.amount_paid) AS outstanding_amount
+  FROM bucketed b
+  LEFT JOIN public.providers pr ON p_group_by = 'provider' AND pr.id = b.group_id
+  LEFT JOIN public.payers pa ON p_group_by = 'payer' AND pa.id = b.group_id
+  GROUP BY b.age_bracket, b.group_id, pr.name, pa.name
+  HAVING SUM(b.session_count) > 0;
+$$;
+
+-- Billed and collected amounts per day, week or month of service, read
+-- from the rollups
+CREATE OR REPLACE FUNCTION public.revenue_summary(
+  p_date_from date DEFAULT NULL,
+  p_date_to date DEFAULT NULL,
+  p_interval text DEFAULT 'month',  -- 'day', 'week' or 'month'
+  p_provider_id uuid DEFAULT NULL,
+  p_payer_id uuid DEFAULT NULL,
+  p_group_by text DEFAULT NULL  -- NULL, 'provider' or 'payer'
+)
+RETURNS TABLE (
+  period date,
+  group_id uuid,
+  group_name text,
+  session_count bigint,
+  total_minutes bigint,
+  amount_billed numeric,
+  amount_paid numeric,
+  status_counts jsonb
+)
+LANGUAGE sql
+STABLE
+AS $$
+  WITH scoped AS (
+    SELECT
+      -- A bare date would be promoted to timestamptz, letting the session
+      -- time zone shift buckets; truncate it as a plain timestamp
+      date_trunc(p_interval, r.session_date::timestamp)::date AS period,
+      CASE p_group_by
+        WHEN 'provider' THEN r.provider_id
+        WHEN 'payer' THEN r.payer_id
+      END AS group_id,
+      r.*
+    FROM public.billing_rollups r
+    WHERE (p_date_from IS NULL OR r.session_date >= p_date_from)
+      AND (p_date_to IS NULL OR r.session_date <= p_date_to)
+      AND (p_provider_id IS NULL OR r.provider_id = p_provider_id)
+      AND (p_payer_id IS NULL OR r.payer_id = p_payer_id)
+  ),
+  by_status AS (
+    SELECT period, group_id, billing_status, SUM(session_count) AS n
+    FROM scoped
+    GROUP BY period, group_id, billing_status
+    HAVING SUM(session_count) > 0
+  )
+  SELECT
+    g.period,
+    g.group_id,
+    CASE p_group_by
+      WHEN 'provider' THEN pr.name
+      WHEN 'payer' THEN pa.name
+    END AS group_name,
+    SUM(g.session_count)::bigint AS session_count,
+    SUM(g.total_minutes)::bigint AS total_minutes,
+    SUM(g.amount_billed) AS amount_billed,
+    SUM(g.amount_paid) AS amount_paid,
+    (
+      SELECT jsonb_object_agg(b.billing_status, b.n)
+      FROM by_status b
+      WHERE b.period = g.period AND b.group_id IS NOT DISTINCT FROM g.group_id
+    ) AS status_counts
+  FROM scoped g
+  LEFT JOIN public.providers pr ON p_group_by = 'provider' AND pr.id = g.group_id
+  LEFT JOIN public.payers pa ON p_group_by = 'payer' AND pa.id = g.group_id
+  GROUP BY g.period, g.group_id, pr.name, pa.name
+  HAVING SUM(g.session_count) > 0
+  ORDER BY g.period DESC, session_count DESC;
+$$;
+
+-- Populate from existing sessions
+SELECT public.rebuild_billing_rollups();
+
+-- Nightly reconcile at 03:15 UTC where pg_cron is enabled
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('rebuild-billing-rollups', '15 3 * * *', 'SELECT public.rebuild_billing_rollups()');
+  END IF;
+END;
+$$;
@@ -0,0 +1,64 @@
+-- Data versions behind the ETags on read endpoints (conditional_json in
+-- backend/main.py). data_versions() returns one version per table, and a
+-- version changes whenever the table is written, whoever writes it: this
+-- backend, another instance, the SQL editor or a cron job.
+--
+-- sessions reuses the change cursor from the session change feed. Rollup
+-- deltas are applied in the same transaction as the session write, so that
+-- cursor covers billing_rollups too, except for rebuilds, which are counted
+-- here. import_runs is counted here on every statement that writes it.
+
+CREATE TABLE IF NOT EXISTS public.table_versions (
+  table_name text PRIMARY KEY,
+  version bigint NOT NULL DEFAULT 0
+);
+
+ALTER TABLE public.table_versions ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Service role manages table versions" ON public.table_versions;
+CREATE POLICY "Service role manages table versions" ON public.table_versions
+  FOR ALL TO service_role USING (true) WITH CHECK (true);
+
+-- Once per statement, not per row: a batch upsert is one version. Runs as
+-- the owner, since callers writing the tracked tables can't write table_versions.
+CREATE OR REPLACE FUNCTION public.bump_table_version()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public, pg_temp
+AS $$
+BEGIN
+  INSERT INTO public.table_versions AS v (table_name, version)
+  VALUES (TG_TABLE_NAME, 1)
+  ON CONFLICT (table_name) DO UPDATE SET version = v.version + 1;
+  RETURN NULL;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.bump_table_version() FROM PUBLIC, anon, authenticated;
+
+DROP TRIGGER IF EXISTS import_runs_bump_version ON public.import_runs;
+CREATE TRIGGER import_runs_bump_version
+  AFTER INSERT OR UPDATE OR DELETE ON public.import_runs
+  FOR EACH STATEMENT EXECUTE FUNCTION public.bump_table_version();
+
+-- Delta triggers only insert/update buckets; rebuilds (and manual cleanups)
+-- delete them
+DROP TRIGGER IF EXISTS billing_rollups_bump_version ON public.billing_rollups;
+CREATE TRIGGER billing_rollups_bump_version
+  AFTER DELETE OR TRUNCATE ON public.billing_rollups
+  FOR EACH STATEMENT EXECUTE FUNCTION public.bump_table_version();
+
+-- plpgsql so this file can run before the session change feed migration
+CREATE OR REPLACE FUNCTION public.data_versions()
+RETURNS TABLE (table_name text, version bigint)
+LANGUAGE plpgsql
+STABLE
+AS $$
+BEGIN
+  RETURN QUERY
+  SELECT 'sessions'::text, c.cursor FROM public.session_change_cursor() c
+  UNION ALL
+  SELECT v.table_name, v.version FROM public.table_versions v;
+END;
+$$;
@@ -0,0 +1,11 @@
+-- Batch imports.
+-- POST /api/imports/simplepractice/batch records one parent import_runs row
+-- for the whole upload (with the summed counters) and a child row per CSV
+-- pointing at it, so each file keeps its own result, report and SHA-256.
+
+ALTER TABLE public.import_runs
+  ADD COLUMN IF NOT EXISTS parent_run_id uuid REFERENCES public.import_runs(id) ON DELETE CASCADE;
+
+CREATE INDEX IF NOT EXISTS import_runs_parent_run_id_idx
+  ON public.import_runs (parent_run_id)
+  WHERE parent_run_id IS NOT NULL;
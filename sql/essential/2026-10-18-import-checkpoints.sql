@@ -0,0 +1,19 @@
+-- Resumable imports.
+-- Every IMPORT_CHECKPOINT_ROWS rows the importer commits what it has and
+-- records a checkpoint on its run: the last committed row plus the counters
+-- so far. The uploaded CSV is kept in the private import-uploads bucket
+-- (upload_path) for IMPORT_UPLOAD_RETENTION_DAYS, so
+-- POST /api/imports/{run_id}/resume can continue a failed or interrupted
+-- run after its checkpoint.
+
+ALTER TABLE public.import_runs
+  ADD COLUMN IF NOT EXISTS checkpoint jsonb,
+  ADD COLUMN IF NOT EXISTS upload_path text;
+
+CREATE INDEX IF NOT EXISTS import_runs_upload_path_idx
+  ON public.import_runs (started_at)
+  WHERE upload_path IS NOT NULL;
+
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('import-uploads', 'import-uploads', false)
+ON CONFLICT (id) DO NOTHING;
@@ -0,0 +1,24 @@
+-- Idempotent re-imports.
+-- import_runs records a SHA-256 of each uploaded file so an identical upload
+-- returns the earlier run's result, plus the counters needed to rebuild it.
+-- import_row_fingerprints holds a digest of every CSV row whose session was
+-- written, so overlapping exports only process rows not seen before.
+
+ALTER TABLE public.import_runs
+  ADD COLUMN IF NOT EXISTS file_sha256 text,
+  ADD COLUMN IF NOT EXISTS skipped_rows integer,
+  ADD COLUMN IF NOT EXISTS duplicate_rows integer,
+  ADD COLUMN IF NOT EXISTS error_rows integer;
+
+CREATE INDEX IF NOT EXISTS import_runs_file_sha256_idx
+  ON public.import_runs (file_sha256, finished_at DESC)
+  WHERE file_sha256 IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS public.import_row_fingerprints (
+  fingerprint text PRIMARY KEY,
+  run_id uuid REFERENCES public.import_runs(id) ON DELETE CASCADE,
+  created_at timestamptz NOT NULL DEFAULT now()
+);
+
+-- Backend only (service role); no client access
+ALTER TABLE public.import_row_fingerprints ENABLE ROW LEVEL SECURITY;
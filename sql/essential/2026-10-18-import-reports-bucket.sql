@@ -0,0 +1,7 @@
+-- Private storage bucket for per-run import reports (gzipped NDJSON of every
+-- rejected, flagged and duplicate row). Written and read by the backend with
+-- the service role key only.
+
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('import-reports', 'import-reports', false)
+ON CONFLICT (id) DO NOTHING;
@@ -0,0 +1,5 @@
+-- Seconds each import run spent per stage (parse, fingerprints, resolve,
+-- write, staging), as recorded by the backend importer.
+
+ALTER TABLE public.import_runs
+  ADD COLUMN IF NOT EXISTS stage_timings jsonb;
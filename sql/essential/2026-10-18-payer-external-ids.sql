@@ -0,0 +1,14 @@
+-- Payer matching on the external payer ID.
+-- SimplePractice insurance strings carry the payer's ID in parentheses,
+-- e.g. "Horizon NJ Health (22356)". Imports match payers on that ID first,
+-- then on a normalized name (case, whitespace and punctuation folded) with a
+-- similarity fallback (PAYER_MATCH_THRESHOLD), all in memory from one load
+-- of this table. New payers are created with their external_id, and
+-- existing ones matched by name get it filled in.
+
+ALTER TABLE public.payers
+  ADD COLUMN IF NOT EXISTS external_id text;
+
+CREATE UNIQUE INDEX IF NOT EXISTS payers_external_id_key
+  ON public.payers (external_id)
+  WHERE external_id IS NOT NULL;
@@ -0,0 +1,138 @@
+-- Biweekly payroll cycles used by the /api/payroll endpoints.
+-- Cycles are 14-day windows counted from an anchor date. Open cycles are
+-- aggregated live by payroll_summary(); closing a cycle freezes its totals
+-- into payroll_cycles / payroll_cycle_providers so history is read back
+-- instead of recomputed.
+
+CREATE TABLE IF NOT EXISTS public.payroll_cycles (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  start_date date NOT NULL UNIQUE,
+  end_date date NOT NULL,
+  status text NOT NULL DEFAULT 'sent' CHECK (status IN ('draft', 'sent', 'approved', 'paid')),
+  total_sessions integer NOT NULL DEFAULT 0,
+  total_minutes integer NOT NULL DEFAULT 0,
+  total_amount numeric NOT NULL DEFAULT 0,
+  closed_by uuid,
+  closed_at timestamptz NOT NULL DEFAULT now(),
+  updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS public.payroll_cycle_providers (
+  cycle_id uuid NOT NULL REFERENCES public.payroll_cycles(id) ON DELETE CASCADE,
+  provider_id uuid NOT NULL,
+  provider_name text,
+  session_count integer NOT NULL DEFAULT 0,
+  total_minutes integer NOT NULL DEFAULT 0,
+  total_amount numeric NOT NULL DEFAULT 0,
+  PRIMARY KEY (cycle_id, provider_id)
+);
+
+CREATE INDEX IF NOT EXISTS payroll_cycle_providers_provider_idx
+  ON public.payroll_cycle_providers (provider_id);
+
+ALTER TABLE public.payroll_cycles ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.payroll_cycle_providers ENABLE ROW LEVEL SECURITY;
+
+-- Only the backend (service role) reads and writes payroll snapshots
+DROP POLICY IF EXISTS "Service role manages payroll cycles" ON public.payroll_cycles;
+CREATE POLICY "Service role manages payroll cycles" ON public.payroll_cycles
+  FOR ALL TO service_role USING (true) WITH CHECK (true);
+
+DROP POLICY IF EXISTS "Service role manages payroll cycle providers" ON public.payroll_cycle_providers;
+CREATE POLICY "Service role manages payroll cycle providers" ON public.payroll_cycle_providers
+  FOR ALL TO service_role USING (true) WITH CHECK (true);
+
+-- First day of the 14-day cycle containing p_day
+CREATE OR REPLACE FUNCTION public.payroll_cycle_start(p_day date, p_anchor date)
+RETURNS date
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT p_anchor + (floor((p_day - p_anchor) / 14.0)::integer * 14);
+$$;
+
+-- Sessions per cycle and provider between two dates (inclusive), computed
+-- in one grouped scan over the session_date index
+CREATE OR REPLACE FUNCTION public.payroll_summary(
+  p_anchor date,
+  p_date_from date,
+  p_date_to date,
+  p_provider_id uuid DEFAULT NULL
+)
+RETURNS TABLE (
+  cycle_start date,
+  cycle_end date,
+  provider_id uuid,
+  provider_name text,
+  session_count bigint,
+  total_minutes bigint,
+  total_amount numeric
+)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    c.cycle_start,
+    c.cycle_start + 13 AS cycle_end,
+    s.provider_id,
+    pr.name AS provider_name,
+    COUNT(*) AS session_count,
+    COALESCE(SUM(s.minutes), 0) AS total_minutes,
+    COALESCE(SUM(s.amount_billed), 0) AS total_amount
+  FROM public.sessions s
+  CROSS JOIN LATERAL (SELECT public.payroll_cycle_start(s.session_date, p_anchor) AS cycle_start) c
+  LEFT JOIN public.providers pr ON pr.id = s.provider_id
+  WHERE s.session_date >= p_date_from
+    AND s.session_date <= p_date_to
+    AND s.provider_id IS NOT NULL
+    AND (p_provider_id IS NULL OR s.provider_id = p_provider_id)
+  GROUP BY c.cycle_start, s.provider_id, pr.name
+  ORDER BY c.cycle_start DESC, pr.name;
+$$;
+
+-- Freeze one cycle: snapshot its per-provider totals and record the cycle
+-- with the given status. Idempotent - an already closed cycle is returned as is.
+CREATE OR REPLACE FUNCTION public.close_payroll_cycle(
+  p_anchor date,
+  p_start_date date,
+  p_status text DEFAULT 'sent',
+  p_closed_by uuid DEFAULT NULL
+)
+RETURNS SETOF public.payroll_cycles
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_cycle_id uuid;
+BEGIN
+  IF p_start_date <> public.payroll_cycle_start(p_start_date, p_anchor) THEN
+    RAISE EXCEPTION 'Not a payroll cycle start date: %', p_start_date;
+  END IF;
+
+  INSERT INTO public.payroll_cycles (start_date, end_date, status, closed_by)
+  VALUES (p_start_date, p_start_date + 13, p_status, p_closed_by)
+  ON CONFLICT (start_date) DO NOTHING
+  RETURNING id INTO v_cycle_id;
+
+  IF v_cycle_id IS NOT NULL THEN
+    INSERT INTO public.payroll_cycle_providers
+      (cycle_id, provider_id, provider_name, session_count, total_minutes, total_amount)
+    SELECT v_cycle_id, p.provider_id, p.provider_name, p.session_count, p.total_minutes, p.total_amount
+    FROM public.payroll_summary(p_anchor, p_start_date, p_start_date + 13) p;
+
+    UPDATE public.payroll_cycles pc
+    SET total_sessions = t.session_count,
+        total_minutes = t.total_minutes,
+        total_amount = t.total_amount
+    FROM (
+      SELECT COALESCE(SUM(session_count), 0) AS session_count,
+             COALESCE(SUM(total_minutes), 0) AS total_minutes,
+             COALESCE(SUM(total_amount), 0) AS total_amount
+      FROM public.payroll_cycle_providers
+      WHERE cycle_id = v_cycle_id
+    ) t
+    WHERE pc.id = v_cycle_id;
+  END IF;
+
+  RETURN QUERY SELECT * FROM public.payroll_cycles WHERE start_date = p_start_date;
+END;
+$$;
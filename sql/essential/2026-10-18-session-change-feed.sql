@@ -0,0 +1,127 @@
+-- Change cursor for delta sync (GET /api/sessions?since=) and /api/events.
+-- Every insert, update or delete of a session appends a row to
+-- session_changes, numbered from session_change_seq. Clients keep the
+-- highest change_seq they have seen and ask only for what changed after it.
+--
+-- Numbers are handed out at commit, not when the row is written: a deferred
+-- trigger takes them under a transaction-level advisory lock, so they follow
+-- commit order. A reader that sees change N has therefore seen every change
+-- below N, and the latest visible change_seq is always a safe cursor - no
+-- transaction still in flight can commit a lower one later. (A number taken
+-- from the sequence at write time can't give that: a concurrent import may
+-- hold a lower number, uncommitted, while a higher one is already visible.)
+--
+-- Changes older than 30 days are pruned nightly; a cursor from before the
+-- prune point has to reload the full list.
+
+CREATE SEQUENCE IF NOT EXISTS public.session_change_seq;
+
+CREATE TABLE IF NOT EXISTS public.session_changes (
+  change_seq bigint PRIMARY KEY,
+  session_id uuid NOT NULL,
+  provider_id uuid,      -- provider after the change; NULL for deletes
+  old_provider_id uuid,  -- provider before it; NULL for inserts
+  deleted boolean NOT NULL DEFAULT false,
+  changed_at timestamptz NOT NULL DEFAULT now()
+);
+
+-- Provider-scoped deltas match either side of a reassignment
+CREATE INDEX IF NOT EXISTS session_changes_provider_idx
+  ON public.session_changes (provider_id, change_seq);
+CREATE INDEX IF NOT EXISTS session_changes_old_provider_idx
+  ON public.session_changes (old_provider_id, change_seq);
+
+-- Highest change_seq that has been pruned
+CREATE TABLE IF NOT EXISTS public.session_change_floor (
+  id boolean PRIMARY KEY DEFAULT true CHECK (id),
+  pruned_through bigint NOT NULL DEFAULT 0
+);
+
+INSERT INTO public.session_change_floor (id) VALUES (true)
+ON CONFLICT (id) DO NOTHING;
+
+ALTER TABLE public.session_changes ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.session_change_floor ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Service role manages session changes" ON public.session_changes;
+CREATE POLICY "Service role manages session changes" ON public.session_changes
+  FOR ALL TO service_role USING (true) WITH CHECK (true);
+
+DROP POLICY IF EXISTS "Service role manages session change floor" ON public.session_change_floor;
+CREATE POLICY "Service role manages session change floor" ON public.session_change_floor
+  FOR ALL TO service_role USING (true) WITH CHECK (true);
+
+-- Runs at commit (deferred); the advisory lock is held until the commit
+-- completes, so writers take their numbers one commit at a time. Runs as the
+-- owner: signed-in users write sessions directly but can't write the log.
+CREATE OR REPLACE FUNCTION public.log_session_change()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public, pg_temp
+AS $$
+BEGIN
+  PERFORM pg_advisory_xact_lock(hashtext('public.session_changes'));
+
+  INSERT INTO public.session_changes (change_seq, session_id, provider_id, old_provider_id, deleted)
+  VALUES (
+    nextval('public.session_change_seq'),
+    CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END,
+    CASE WHEN TG_OP = 'DELETE' THEN NULL ELSE NEW.provider_id END,
+    CASE WHEN TG_OP = 'INSERT' THEN NULL ELSE OLD.provider_id END,
+    TG_OP = 'DELETE'
+  );
+  RETURN NULL;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.log_session_change() FROM PUBLIC, anon, authenticated;
+
+DROP TRIGGER IF EXISTS sessions_log_change ON public.sessions;
+CREATE CONSTRAINT TRIGGER sessions_log_change
+  AFTER INSERT OR UPDATE OR DELETE ON public.sessions
+  DEFERRABLE INITIALLY DEFERRED
+  FOR EACH ROW EXECUTE FUNCTION public.log_session_change();
+
+-- Latest change cursor, and the oldest one deltas can still be served from
+CREATE OR REPLACE FUNCTION public.session_change_cursor()
+RETURNS TABLE (cursor bigint, pruned_through bigint)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    GREATEST((SELECT MAX(change_seq) FROM public.session_changes), f.pruned_through),
+    f.pruned_through
+  FROM public.session_change_floor f;
+$$;
+
+CREATE OR REPLACE FUNCTION public.prune_session_changes(p_keep interval DEFAULT interval '30 days')
+RETURNS bigint
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_through bigint;
+BEGIN
+  WITH pruned AS (
+    DELETE FROM public.session_changes
+    WHERE changed_at < now() - p_keep
+    RETURNING change_seq
+  )
+  SELECT MAX(change_seq) INTO v_through FROM pruned;
+
+  IF v_through IS NOT NULL THEN
+    UPDATE public.session_change_floor
+    SET pruned_through = GREATEST(pruned_through, v_through);
+  END IF;
+  RETURN v_through;
+END;
+$$;
+
+-- Nightly prune at 03:30 UTC where pg_cron is enabled
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule('prune-session-changes', '30 3 * * *', 'SELECT public.prune_session_changes()');
+  END IF;
+END;
+$$;
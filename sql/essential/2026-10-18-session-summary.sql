@@ -0,0 +1,68 @@
+-- Role-scoped session summary used by GET /api/sessions/summary.
+-- Counts per billing_status, money totals and average days to payment
+-- for a period, optionally grouped by provider or payer.
+
+CREATE OR REPLACE FUNCTION public.session_summary(
+  p_date_from date DEFAULT NULL,
+  p_date_to date DEFAULT NULL,
+  p_provider_id uuid DEFAULT NULL,
+  p_group_by text DEFAULT NULL  -- NULL, 'provider' or 'payer'
+)
+RETURNS TABLE (
+  group_id uuid,
+  group_name text,
+  total_sessions bigint,
+  notes_submitted bigint,
+  notes_pending bigint,
+  flagged bigint,
+  status_counts jsonb,
+  amount_billed numeric,
+  outstanding_amount numeric,
+  total_collected numeric,
+  avg_days_to_payment numeric
+)
+LANGUAGE sql
+STABLE
+AS $$
+  WITH scoped AS (
+    SELECT
+      s.*,
+      CASE p_group_by
+        WHEN 'provider' THEN s.provider_id
+        WHEN 'payer' THEN s.payer_id
+      END AS summary_group_id
+    FROM public.sessions s
+    WHERE (p_date_from IS NULL OR s.session_date >= p_date_from)
+      AND (p_date_to IS NULL OR s.session_date <= p_date_to)
+      AND (p_provider_id IS NULL OR s.provider_id = p_provider_id)
+  ),
+  by_status AS (
+    SELECT summary_group_id, COALESCE(billing_status::text, 'unknown') AS billing_status, COUNT(*) AS n
+    FROM scoped
+    GROUP BY summary_group_id, COALESCE(billing_status::text, 'unknown')
+  )
+  SELECT
+    g.summary_group_id AS group_id,
+    CASE p_group_by
+      WHEN 'provider' THEN pr.name
+      WHEN 'payer' THEN pa.name
+    END AS group_name,
+    COUNT(*) AS total_sessions,
+    COUNT(*) FILTER (WHERE g.note_submitted) AS notes_submitted,
+    COUNT(*) FILTER (WHERE NOT COALESCE(g.note_submitted, false)) AS notes_pending,
+    COUNT(*) FILTER (WHERE g.is_duplicate) AS flagged,
+    (
+      SELECT jsonb_object_agg(b.billing_status, b.n)
+      FROM by_status b
+      WHERE b.summary_group_id IS NOT DISTINCT FROM g.summary_group_id
+    ) AS status_counts,
+    COALESCE(SUM(g.amount_billed), 0) AS amount_billed,
+    COALESCE(SUM(g.amount_billed) FILTER (WHERE g.billing_status NOT IN ('paid', 'denied')), 0) AS outstanding_amount,
+    COALESCE(SUM(g.amount_paid), 0) AS total_collected,
+    ROUND(AVG(g.date_paid::date - g.date_submitted::date) FILTER (WHERE g.date_paid IS NOT NULL AND g.date_submitted IS NOT NULL), 1) AS avg_days_to_payment
+  FROM scoped g
+  LEFT JOIN public.providers pr ON p_group_by = 'provider' AND pr.id = g.summary_group_id
+  LEFT JOIN public.payers pa ON p_group_by = 'payer' AND pa.id = g.summary_group_id
+  GROUP BY g.summary_group_id, pr.name, pa.name
+  ORDER BY total_sessions DESC;
+$$;
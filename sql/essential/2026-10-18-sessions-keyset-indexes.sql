@@ -0,0 +1,11 @@
+-- Indexes for keyset pagination on GET /api/sessions.
+-- Pages walk (session_date, id) newest first; providers are always scoped to their own rows.
+
+CREATE INDEX IF NOT EXISTS sessions_date_id_idx
+  ON public.sessions (session_date DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS sessions_provider_date_id_idx
+  ON public.sessions (provider_id, session_date DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS sessions_status_date_idx
+  ON public.sessions (billing_status, session_date DESC);
@@ -0,0 +1,11 @@
+-- Natural key for sessions so the importer can upsert in batches.
+-- One session per provider, client and date of service.
+
+-- Check for existing duplicates first - the unique index cannot be built while these exist
+SELECT provider_id, client_id, session_date, COUNT(*) as copies
+FROM public.sessions
+GROUP BY provider_id, client_id, session_date
+HAVING COUNT(*) > 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS sessions_natural_key_idx
+  ON public.sessions (provider_id, client_id, session_date);
@@ -0,0 +1,9 @@
+-- Hash of the imported session fields, so re-imports can skip sessions whose
+-- data has not changed instead of rewriting them. Written only by the importer;
+-- NULL for sessions created before this column existed (they are updated once).
+
+ALTER TABLE public.sessions
+  ADD COLUMN IF NOT EXISTS row_hash text;
+
+ALTER TABLE public.import_runs
+  ADD COLUMN IF NOT EXISTS unchanged_rows integer;